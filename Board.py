@@ -1,15 +1,202 @@
-import math
+from render import format_board
+from tables import (DEFAULT_SIZE, DIRECTIONS, DIRECTION_OFFSETS,
+                    WORKER_OWNERS, get_tables)
+from zobrist import get_keys
 
 class Board:
-    def __init__(self, worker_positions):
+    def __init__(self, worker_positions, size=DEFAULT_SIZE, owners=None):
         """
         @brief Sets up the board, sets initial worker positions, hold the amount
                of building levels still available for each block
-        @param None
+        @param worker_positions: Dictionary mapping worker IDs to positions
+        @param size: The number of rows (and columns) of the board
+        @param owners: Dictionary mapping worker IDs to player IDs, defaults
+                       to A and B for white and Y and Z for blue
         @return None
         """
-        self.grid = [[0 for _ in range(5)] for _ in range(5)]
+        self.size = size
+        self.tables = get_tables(size)
+        self.keys = get_keys(size)
+        self.owners = owners if owners is not None else WORKER_OWNERS
+        self.grid = [[0 for _ in range(size)] for _ in range(size)]
         self.worker_positions = worker_positions
+        self.hash = self.compute_hash()
+        self.scores = self.compute_scores()
+        self.compute_mobility()
+
+    def compute_hash(self):
+        """
+        @brief Computes the Zobrist hash of the buildings and workers from
+               scratch. Moves and builds keep self.hash up to date without it.
+        @param None
+        @return: The 64-bit hash of the board
+        """
+        cell_of = self.tables.cell_of
+        board_hash = 0
+        for cell, (row, col) in enumerate(self.tables.positions):
+            level = self.get_building_level(row, col)
+            board_hash ^= self.keys.level[cell][level]
+        for worker_id, position in self.worker_positions.items():
+            board_hash ^= self.keys.worker[worker_id][cell_of(position)]
+        return board_hash
+
+    def compute_scores(self):
+        """
+        @brief Computes every player's height, center and distance scores from
+               scratch. Moves and builds keep self.scores up to date without it.
+        @param None
+        @return: Dictionary mapping player IDs to [height, center, distance]
+        """
+        cell_of = self.tables.cell_of
+        distance = self.tables.distance
+        scores = {}
+        # team_cells[player_id][worker_id] is the cell of each of its workers
+        self.team_cells = {}
+        for worker_id, position in self.worker_positions.items():
+            owner = self.owners[worker_id]
+            score = scores.setdefault(owner, [0, 0, 0])
+            score[0] += self.get_height(position)
+            score[1] += self.tables.centre[cell_of(position)]
+            self.team_cells.setdefault(owner, {})[worker_id] = cell_of(position)
+
+        for player_id, own in self.team_cells.items():
+            nearest = sum(min(distance[cell][opponent] for cell in own.values())
+                          for other_id, others in self.team_cells.items()
+                          if other_id != player_id
+                          for opponent in others.values())
+            scores[player_id][2] = self.tables.distance_base - nearest
+        self.scores = scores
+        return scores
+
+    def count_moves(self, cell):
+        """
+        @brief Counts the moves of a worker standing on a cell
+        @param cell: The cell index of the worker
+        @return: (number of cells it can move to, number of those on level 3)
+        """
+        positions = self.tables.positions
+        grid = self.grid
+        occupied = self.worker_positions.values()
+        row, col = positions[cell]
+        limit = min(grid[row][col] + 1, 3)
+        moves = climbs = 0
+        for target in self.tables.steps[cell]:
+            if target < 0:
+                continue
+            row, col = positions[target]
+            level = grid[row][col]
+            if level <= limit and positions[target] not in occupied:
+                moves += 1
+                if level == 3:
+                    climbs += 1
+        return moves, climbs
+
+    def compute_mobility(self):
+        """
+        @brief Counts every worker's moves and finds the winner from scratch.
+               Moves and builds keep them up to date without it.
+        @param None
+        @return: None
+        """
+        # moves[worker_id] and climbs[worker_id] are the number of cells the
+        # worker can move to, and how many of those moves would win. Changes
+        # only mark their cells in stale, and the next read recounts the
+        # workers next to them, so a search pays nothing for turns it undoes
+        # before looking.
+        self.moves = {}
+        self.climbs = {}
+        self.stale = 0
+        self.winner = None
+        for own in self.team_cells.values():
+            for worker_id, cell in own.items():
+                self.moves[worker_id], self.climbs[worker_id] = \
+                    self.count_moves(cell)
+                if self.get_height(self.tables.positions[cell]) == 3:
+                    self.winner = self.owners[worker_id]
+
+    def refresh_mobility(self):
+        """
+        @brief Counts the moves again of the workers on or next to a cell
+               that changed since the last count
+        @param None
+        @return: None
+        """
+        around = self.tables.around
+        stale = self.stale
+        self.stale = 0
+        for own in self.team_cells.values():
+            for worker_id, cell in own.items():
+                if around[cell] & stale:
+                    self.moves[worker_id], self.climbs[worker_id] = \
+                        self.count_moves(cell)
+
+    def worker_moves(self, worker_id):
+        """
+        @brief Obtains the number of cells a worker can move to
+        @param worker_id: The worker's ID
+        @return: The number of legal moves of the worker
+        """
+        if self.stale:
+            self.refresh_mobility()
+        return self.moves[worker_id]
+
+    def is_trapped(self, player_id):
+        """
+        @brief Checks if none of a player's workers can move
+        @param player_id: The player's ID
+        @return: True if the player has no legal turn and loses
+        """
+        if self.stale:
+            self.refresh_mobility()
+        moves = self.moves
+        for worker_id in self.team_cells[player_id]:
+            if moves[worker_id]:
+                return False
+        return True
+
+    def can_win(self, player_id):
+        """
+        @brief Checks if a player can move a worker up onto level 3
+        @param player_id: The player's ID
+        @return: True if the player has a winning turn
+        """
+        if self.stale:
+            self.refresh_mobility()
+        climbs = self.climbs
+        for worker_id in self.team_cells[player_id]:
+            if climbs[worker_id]:
+                return True
+        return False
+
+    def update_distance_scores(self, worker_id, old_cell, new_cell):
+        """
+        @brief Adjusts the distance scores for one worker's move. Only the
+               terms that involve the moved worker are looked up again.
+        @param worker_id: ID of the worker that moved
+        @param old_cell: The cell the worker left
+        @param new_cell: The cell the worker moved to
+        @return: None
+        """
+        distance = self.tables.distance
+        old_row = distance[old_cell]
+        new_row = distance[new_cell]
+        owner = self.owners[worker_id]
+        own = self.team_cells[owner]
+        own[worker_id] = new_cell
+        own_cells = own.values()
+
+        nearest = 0
+        for player_id, others in self.team_cells.items():
+            if player_id == owner:
+                continue
+            # The other player's distance to the moved worker changes...
+            cells = others.values()
+            self.scores[player_id][2] += (min([old_row[cell] for cell in cells])
+                                          - min([new_row[cell] for cell in cells]))
+            # ...and so does the mover's distance to each of its workers
+            for opponent in cells:
+                nearest += min([distance[cell][opponent] for cell in own_cells])
+        self.scores[owner][2] = self.tables.distance_base - nearest
 
     def get_building_level(self, row, col):
         """
@@ -26,21 +213,8 @@ class Board:
         @param None
         @return None
         """
-        print("+--+--+--+--+--+")
-        for row in range(5):
-            print("|", end="")
-            for col in range(5):
-                if (row, col) in self.worker_positions.values():
-                    # Prints out worker_id for each worker
-                    worker_id = [k for k, v in self.worker_positions.items() if v == (row, col)][0]
-                    print(f"{self.grid[row][col]}{worker_id}", end="")
-                else:
-                    # Prints out blankspace if there is not a worker here
-                    print(f"{self.grid[row][col]}", end=" ")
-
-                print("|", end="")
-
-            print("\n" + "+--+--+--+--+--+")
+        # The whole frame is built first and written in one call
+        print(format_board(self), end="")
     
     def update_worker_position(self, worker_id, new_position):
         """
@@ -49,7 +223,35 @@ class Board:
         @param new_position: The new position/building of the worker
         @return: None
         """
+        keys = self.keys.worker[worker_id]
+        centre = self.tables.centre
+        new_cell = self.tables.cell_of(new_position)
+
+        old_position = self.worker_positions.get(worker_id)
         self.worker_positions[worker_id] = new_position
+        if old_position is None:
+            # A newly placed worker changes every distance, start over
+            self.hash ^= keys[new_cell]
+            self.compute_scores()
+            self.compute_mobility()
+            return
+
+        old_cell = self.tables.cell_of(old_position)
+        self.hash ^= keys[old_cell] ^ keys[new_cell]
+        owner = self.owners[worker_id]
+        score = self.scores[owner]
+        new_height = self.get_height(new_position)
+        old_height = self.get_height(old_position)
+        score[0] += new_height - old_height
+        score[1] += centre[new_cell] - centre[old_cell]
+        self.update_distance_scores(worker_id, old_cell, new_cell)
+        self.stale |= 1 << old_cell | 1 << new_cell
+
+        # Only a move onto level 3, or its undo, changes the winner
+        if new_height == 3:
+            self.winner = owner
+        elif old_height == 3:
+            self.winner = None
     
     def is_position_occupied(self, position):
         """
@@ -69,6 +271,16 @@ class Board:
         row, col = position
         return self.grid[row][col]
 
+    def get_heights(self):
+        """
+        @brief Obtains the level of every cell, for callers that scan the
+               whole board
+        @param None
+        @return: A list of building levels indexed by cell, which callers
+                 must only read
+        """
+        return [level for row in self.grid for level in row]
+
     def get_distance(self, position1, position2):
         """
         @brief Calculates the Euclidean distance between two positions on board
@@ -76,7 +288,84 @@ class Board:
         @param position2: The second position (row, col)
         @return: The Euclidean distance between the two positions
         """
-        row1, col1 = position1
-        row2, col2 = position2
-        return int(math.sqrt((row1 - row2)**2 + (col1 - col2)**2))
-    
\ No newline at end of file
+        tables = self.tables
+        cell1 = tables.cell_of(position1)
+        cell2 = tables.cell_of(position2)
+        return tables.distance[cell1][cell2]
+
+    def get_neighbour(self, position, direction):
+        """
+        @brief Finds the cell one step away from a position in a direction
+        @param position: The starting position (row, col)
+        @param direction: The direction to step in (n, ne, e, se, s, sw, w, nw)
+        @return: The neighbouring position, or None if it is off the board
+        """
+        return self.tables.neighbour.get((position, direction))
+
+    def can_move(self, position, direction):
+        """
+        @brief Checks if a worker standing on position can move in a direction
+        @param position: The position of the worker (row, col)
+        @param direction: The direction to be checked
+        @return: True if the target is on the board, free, not domed and at
+                 most one level higher than position
+        """
+        target = self.get_neighbour(position, direction)
+        if target is None:
+            return False
+
+        target_level = self.get_height(target)
+        return (not self.is_position_occupied(target)
+                and target_level < 4
+                and target_level <= self.get_height(position) + 1)
+
+    def can_build(self, position, direction):
+        """
+        @brief Checks if a worker standing on position can build in a direction
+        @param position: The position of the worker (row, col)
+        @param direction: The direction to be checked
+        @return: True if the target is on the board, free and not domed
+        """
+        target = self.get_neighbour(position, direction)
+        if target is None:
+            return False
+
+        return (not self.is_position_occupied(target)
+                and self.get_height(target) < 4)
+
+    def has_moves(self, position):
+        """
+        @brief Checks if a worker standing on position can move anywhere
+        @param position: The position of the worker (row, col)
+        @return: True if at least one direction is a legal move
+        """
+        return any(self.can_move(position, direction)
+                   for direction in DIRECTIONS)
+
+    def add_level(self, position):
+        """
+        @brief Adds a level to the building at the given position
+        @param position: The position of the building (row, col)
+        @return: None
+        """
+        # Builds never land on a worker, so no player's score changes
+        row, col = position
+        level = self.grid[row][col]
+        keys = self.keys.level[self.tables.cell_of(position)]
+        self.hash ^= keys[level] ^ keys[level + 1]
+        self.grid[row][col] = level + 1
+        self.stale |= 1 << self.tables.cell_of(position)
+
+    def remove_level(self, position):
+        """
+        @brief Removes the top level of the building at the given position,
+               used to take back a build
+        @param position: The position of the building (row, col)
+        @return: None
+        """
+        row, col = position
+        level = self.grid[row][col]
+        keys = self.keys.level[self.tables.cell_of(position)]
+        self.hash ^= keys[level] ^ keys[level - 1]
+        self.grid[row][col] = level - 1
+        self.stale |= 1 << self.tables.cell_of(position)
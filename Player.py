@@ -1,17 +1,103 @@
 import random
-
+import time
+
+from bitboard import BitBoard
+from evaluation import HAVE_NUMPY, score_positions
+from mcts import MCTS
+from parallel import ParallelSearcher
+from ponder import Ponderer
+from render import TEXT_RENDERER
+from rules import legal_turns, turn_directions
+from search import WIN_THRESHOLD, Searcher, TranspositionTable
+from stats import NOT_TIMED
+from tables import DIRECTION_INDEX
 from worker import Worker
 
+# Weights of the height, center and distance scores in a player's evaluation
+SCORE_WEIGHTS = (3, 2, 1)
+
+# Seconds a turn may run past the time limit before it counts as a miss,
+# for the work after a search stops such as playing the turn
+DEADLINE_GRACE = 0.01
+
+# Moves the vectorized heuristic scores per NumPy call, between which it
+# reads the clock; a player has at most 16 moves
+BATCH_MOVES = 4
+
 class Player:
-    def __init__(self, player_id, workers):
+    def __init__(self, player_id, workers, rng=None):
         """
         @brief Makes a player with given ID
         @param player_id: ID for the given player.
         @param workers: A dictionary containing player's workers and positions
+        @param rng: A random.Random for the player's choices, or None to use
+                    the shared random module
         @return: None
         """
         self.player_id = player_id
         self.workers = workers
+        self.rng = rng if rng is not None else random
+        # An OpeningBook and an endgame Tablebase to play known positions
+        # from without searching, if any
+        self.book = None
+        self.tablebase = None
+        # A TurnStats to time the phases of make_move in, if any
+        self.stats = None
+        # Where display_move writes the turns, e.g. NULL_RENDERER
+        self.renderer = TEXT_RENDERER
+        # Whether to keep thinking while the opponent picks a turn, and the
+        # Ponderer running that thread
+        self.ponder = False
+        self.ponderer = None
+        # Seconds make_move may take, or None for no limit
+        self.time_limit = None
+
+    def timed(self, phase):
+        """
+        @brief Times a phase of make_move when stats are on
+        @param phase: A name from stats.MOVE_PHASES
+        @return: A context manager to run the phase in
+        """
+        if self.stats is None:
+            return NOT_TIMED
+        return self.stats.phase(phase)
+
+    def move_deadline(self):
+        """
+        @brief Starts the clock of a turn
+        @return: The perf_counter time make_move should return by, or None
+                 for no limit
+        """
+        if self.time_limit is None:
+            return None
+        return time.perf_counter() + self.time_limit
+
+    def time_left(self, deadline):
+        """
+        @brief Measures what is left of a turn's time
+        @param deadline: The turn's deadline from move_deadline, or None
+        @return: Seconds left, at least 0, or None for no limit
+        """
+        if deadline is None:
+            return None
+        return max(deadline - time.perf_counter(), 0.0)
+
+    def timed_move(self, score_flag, opponent_workers):
+        """
+        @brief Runs make_move and measures it against the time limit; the
+               player stops at its own deadline, so this only reports a turn
+               that ran past it by more than DEADLINE_GRACE
+        @param score_flag: 'on' to show the score after the move
+        @param opponent_workers: opponent player's workers
+        @return: (the (worker_id, move_direction, build_direction) played or
+                 None, seconds make_move took, True if it missed the limit)
+        """
+        start = time.perf_counter()
+        turn = self.make_move(score_flag, opponent_workers)
+        seconds = time.perf_counter() - start
+        missed = (self.time_limit is not None
+                  and seconds > self.time_limit + DEADLINE_GRACE)
+        return turn, seconds, missed
 
     def calculate_height_score(self, board):
         """
@@ -29,7 +115,7 @@ class Player:
         @param board: Current board of the game
         @return: An integer for the distance_score
         """
-        distance_score = 8 - sum(
+        distance_score = board.tables.distance_base - sum(
             min(board.get_distance(worker.position, opponent.position)
                 for worker in self.workers.values())
             for opponent in opponent_workers
@@ -42,15 +128,9 @@ class Player:
         @param board: Current board of the game
         @return: An integer for the center_score
         """
-        center_values = {
-            (0, 0): 0, (0, 1): 0, (0, 2): 0, (0, 3): 0, (0, 4): 0,
-            (1, 0): 0, (1, 1): 1, (1, 2): 1, (1, 3): 1, (1, 4): 0,
-            (2, 0): 0, (2, 1): 1, (2, 2): 2, (2, 3): 1, (2, 4): 0,
-            (3, 0): 0, (3, 1): 1, (3, 2): 1, (3, 3): 1, (3, 4): 0,
-            (4, 0): 0, (4, 1): 0, (4, 2): 0, (4, 3): 0, (4, 4): 0
-        }
-
-        center_score = sum(center_values[worker.position]
+        # Centre values are 0 on the edge and grow by one per ring inwards
+        tables = list(self.workers.values())[0].board.tables
+        center_score = sum(tables.centre[tables.cell_of(worker.position)]
                            for worker in self.workers.values())
         return center_score
 
@@ -64,6 +144,11 @@ class Player:
         """
         board = list(self.workers.values())[0].board
 
+        # The board keeps every player's scores up to date as workers move
+        scores = board.scores.get(self.player_id)
+        if scores is not None:
+            return tuple(scores)
+
         height_score = self.calculate_height_score(board)
         center_score = self.calculate_center_score()
         distance_score = self.calculate_distance_score(board, opponent_workers)
@@ -81,13 +166,74 @@ class Player:
         @param opponent_workers: opponent player's workers
         @return: None
         """
-        score = self.calculate_score(opponent_workers)
+        if not self.renderer.enabled:
+            return
 
+        score = None
         if score_flag == 'on':
-            print(f"{worker_id},{move_direction},{build_direction} {score}")
-        else:
-            print(f"{worker_id},{move_direction},{build_direction}")
+            score = self.calculate_score(opponent_workers)
+        self.renderer.move(worker_id, move_direction, build_direction, score)
     
+    def get_sides(self, opponent_workers):
+        """
+        @brief: Lists both players' worker IDs in turn order for a search
+        @param opponent_workers: opponent player's workers
+        @return: ([white worker IDs, blue worker IDs], this player's side)
+        """
+        own_ids = list(self.workers.keys())
+        opponent_ids = [worker.worker_id for worker in opponent_workers]
+        if self.player_id == 'white':
+            return [own_ids, opponent_ids], 0
+        return [opponent_ids, own_ids], 1
+
+    def play_cells(self, turn):
+        """
+        @brief: Plays a turn given as cells through the player's workers
+        @param turn: (worker_id, move_cell, build_cell)
+        @return: (worker_id, move_direction, build_direction)
+        """
+        worker_id, target, build = turn
+        worker = self.workers[worker_id]
+        tables = worker.board.tables
+        move_direction = tables.direction_between(
+            tables.cell_of(worker.position), target)
+        build_direction = tables.direction_between(target, build)
+
+        worker.move(move_direction)
+        worker.build(build_direction)
+        return worker_id, move_direction, build_direction
+
+    def known_turn(self, opponent_workers):
+        """
+        @brief: Looks the position up in the opening book and the endgame
+                tablebase, so searching it can be skipped
+        @param opponent_workers: opponent player's workers
+        @return: The book turn, or the tablebase turn that wins fastest or
+                 loses slowest, as (worker_id, move_cell, build_cell), or
+                 None if neither has the position
+        """
+        board = list(self.workers.values())[0].board
+        sides, side = self.get_sides(opponent_workers)
+
+        if self.book is not None:
+            turn = self.book.lookup(board, side)
+            if turn is not None:
+                return turn
+
+        if self.tablebase is None or not self.tablebase.covers(board):
+            return None
+        return self.tablebase.best_turn(BitBoard.from_board(board), sides,
+                                        side)
+
+    def stop_pondering(self):
+        """
+        @brief: Stops thinking on the opponent's time, if the player was
+        @return: True if a pondering thread was running
+        """
+        if self.ponderer is None:
+            return False
+        return self.ponderer.stop()
+
     def set_board(self, board):
         """
         @brief: Sets the board for the game
@@ -106,20 +252,41 @@ class HumanPlayer(Player):
         pass
 
 class HeuristicPlayer(Player):
+    def __init__(self, player_id, workers, rng=None, vectorized=HAVE_NUMPY):
+        """
+        @brief Makes a player that picks the move with the best score
+        @param player_id: ID for the given player.
+        @param workers: A dictionary containing player's workers and positions
+        @param rng: A random.Random for the player's choices, or None
+        @param vectorized: True to score the moves in NumPy calls
+        @return: None
+        """
+        super().__init__(player_id, workers, rng)
+        self.vectorized = vectorized
+
     def get_available_moves(self):
         """
         @brief Get all available moves for the player
         @return: A list of available moves, where each move is a tuple
-                (worker_id, move_direction, build_direction)
+                (worker_id, move_direction)
         """
-        available_moves = []
-
-        for worker_id, worker in self.workers.items():
-            for move_direction in worker.get_possible_moves():
-                move = (worker_id, move_direction)
-                available_moves.append(move)
+        return list(self.get_turns_by_move())
 
-        return available_moves
+    def get_turns_by_move(self):
+        """
+        @brief Groups the player's legal turns by their move
+        @return: A dictionary mapping each (worker_id, move_direction) move,
+                 in worker and direction order, to its legal build directions
+        """
+        worker_ids = list(self.workers)
+        board = list(self.workers.values())[0].board
+        builds = {}
+        for turn in legal_turns(board, worker_ids):
+            worker_id, move_direction, build_direction = turn_directions(
+                turn, worker_ids)
+            builds.setdefault((worker_id, move_direction),
+                              []).append(build_direction)
+        return builds
 
     def restore_board(self, worker_id, move_direction):
         """
@@ -128,123 +295,446 @@ class HeuristicPlayer(Player):
         @param move_direction: Direction of move to be reset
         @return: None
         """
-        if move_direction == 'n':
-            self.workers[worker_id].move('s')
-        elif move_direction == 'ne':
-            self.workers[worker_id].move('sw')
-        elif move_direction == 'e':
-            self.workers[worker_id].move('w')
-        elif move_direction == 'se':
-            self.workers[worker_id].move('nw')
-        elif move_direction == 's':
-            self.workers[worker_id].move('n')
-        elif move_direction == 'sw':
-            self.workers[worker_id].move('ne')
-        elif move_direction == 'w':
-            self.workers[worker_id].move('e')
-        elif move_direction == 'nw':
-            self.workers[worker_id].move('se')
-        
-
-    def make_move(self, score_flag, opponent_workers):
+        # Moving back in the opposite direction fails when the worker has
+        # stepped down more than one level, so put it back directly
+        worker = self.workers[worker_id]
+        reverse = {'n': 's', 'ne': 'sw', 'e': 'w', 'se': 'nw',
+                   's': 'n', 'sw': 'ne', 'w': 'e', 'nw': 'se'}
+        origin = worker.board.get_neighbour(worker.position,
+                                            reverse[move_direction])
+        worker.set_position(origin)
+
+    def best_move_scalar(self, available_moves, opponent_workers,
+                         deadline=None):
         """
-        @brief Implements the heuristic player move maker
-        @param: None
-        @return: None
+        @brief Scores each move by playing it, scoring the board and taking
+               it back
+        @param available_moves: The (worker_id, move_direction) moves to try
+        @param opponent_workers: opponent player's workers
+        @param deadline: The perf_counter time to stop scoring at, keeping
+                         the best move so far, or None
+        @return: The first move with the highest score, or None
         """
-        available_moves = self.get_available_moves()
-
-        if not available_moves:
-            return
-
         best_move = None
         best_score = float('-inf')
 
         for move in available_moves:
+            if (deadline is not None and best_move is not None
+                    and time.perf_counter() > deadline):
+                break
             worker_id, move_direction = move
-            
-            if not self.workers[worker_id].can_move_in_direction(move_direction):
-                continue
 
-            # Make the move
-            try:
-                self.workers[worker_id].move(move_direction)
+            # Make the move, which is known to be legal
+            self.workers[worker_id].move(move_direction)
 
-                # Calculate move scores for each move
-                c1, c2, c3 = 3, 2, 1
-                height, center, distance = self.calculate_score(opponent_workers)
-                move_score = c1 * height + c2 * center + c3 * distance
+            # Calculate move scores for each move
+            c1, c2, c3 = SCORE_WEIGHTS
+            height, center, distance = self.calculate_score(opponent_workers)
+            move_score = c1 * height + c2 * center + c3 * distance
 
-                # Update the best possible move
-                if move_score > best_score:
-                    best_move = move
-                    best_score = move_score
+            # Update the best possible move
+            if move_score > best_score:
+                best_move = move
+                best_score = move_score
 
-                # Revert the move
-                self.restore_board(worker_id, move_direction)
-            except Exception as e:
-                pass
+            # Revert the move
+            self.restore_board(worker_id, move_direction)
 
-        if best_move:
-            worker_id, move_direction = best_move
+        return best_move
 
-            # Make the best move
-            try:
-                self.workers[worker_id].move(move_direction)
-            except Exception as e:
-                pass
+    def best_move_batched(self, available_moves, opponent_workers,
+                          deadline=None):
+        """
+        @brief Scores the moves in NumPy calls of BATCH_MOVES moves each
+               without touching the board; picks the same move as
+               best_move_scalar
+        @param available_moves: The (worker_id, move_direction) moves to try
+        @param opponent_workers: opponent player's workers
+        @param deadline: The perf_counter time to stop scoring at, keeping
+                         the best move so far, or None
+        @return: The first move with the highest score, or None
+        """
+        if not available_moves:
+            return None
 
-            valid_dir = ['n', 'ne', 'e', 'se', 's', 'sw', 'w', 'nw']
+        board = list(self.workers.values())[0].board
+        tables = board.tables
+        cells = {worker_id: tables.cell_of(worker.position)
+                 for worker_id, worker in self.workers.items()}
+
+        # Each candidate is the moved worker's target plus the other workers
+        candidates = []
+        for worker_id, move_direction in available_moves:
+            steps = tables.steps[cells[worker_id]]
+            target = steps[DIRECTION_INDEX[move_direction]]
+            candidates.append([target] + [cell for other, cell in cells.items()
+                                          if other != worker_id])
+
+        opponent_cells = [tables.cell_of(worker.position)
+                          for worker in opponent_workers]
+        best_move = None
+        best_score = None
+        for first in range(0, len(candidates), BATCH_MOVES):
+            if (best_move is not None and deadline is not None
+                    and time.perf_counter() > deadline):
+                break
+            scores = score_positions(board,
+                                     candidates[first:first + BATCH_MOVES],
+                                     opponent_cells, SCORE_WEIGHTS)
+            # argmax returns the first of equal scores, and a later batch
+            # needs a strictly higher one, like the strict > in
+            # best_move_scalar
+            index = int(scores.argmax())
+            if best_score is None or scores[index] > best_score:
+                best_move = available_moves[first + index]
+                best_score = scores[index]
+
+        return best_move
+
+    def make_move(self, score_flag, opponent_workers):
+        """
+        @brief Implements the heuristic player move maker
+        @param: None
+        @return: The (worker_id, move_direction, build_direction) played, or
+                 None if the player has no legal turn
+        """
+        deadline = self.move_deadline()
+        with self.timed('lookup'):
+            turn = self.known_turn(opponent_workers)
+        if turn is not None:
+            worker_id, move_direction, build_direction = self.play_cells(turn)
+            self.display_move(worker_id, move_direction, build_direction,
+                              score_flag, opponent_workers)
+            return worker_id, move_direction, build_direction
+
+        with self.timed('generate'):
+            builds = self.get_turns_by_move()
+            available_moves = list(builds)
+        if self.stats is not None:
+            self.stats.count('turns_generated',
+                             sum(len(move_builds)
+                                 for move_builds in builds.values()))
 
-            while True:
-                build_direction = random.choice(valid_dir)
+        if not available_moves:
+            return
 
-                try:
-                    self.workers[worker_id].can_build_in_direction(build_direction)
-                    self.workers[worker_id].build(build_direction)
-                    break
-                except Exception:
-                    pass
+        with self.timed('evaluate'):
+            if self.vectorized:
+                best_move = self.best_move_batched(available_moves,
+                                                   opponent_workers, deadline)
+            else:
+                best_move = self.best_move_scalar(available_moves,
+                                                  opponent_workers, deadline)
+
+        # Make the best move and a random legal build
+        worker_id, move_direction = best_move
+        build_direction = self.rng.choice(builds[best_move])
+        self.workers[worker_id].move(move_direction)
+        self.workers[worker_id].build(build_direction)
 
         self.display_move(worker_id, move_direction, build_direction,
                           score_flag, opponent_workers)
+        return worker_id, move_direction, build_direction
 
 class RandomPlayer(Player):
     def make_move(self, score_flag, opponent_workers):
         """
         @brief: An iteration of the move for a random ai player
         @param: None
-        @return: None
+        @return: The (worker_id, move_direction, build_direction) played, or
+                 None if the player has no legal turn
         """
-        valid_dir = ['n', 'ne', 'e', 'se', 's', 'sw', 'w', 'nw']
-        workers = self.workers
-        
-        # Chooses a random worker of this player
-        worker_id = random.choice(list(workers.keys()))
+        # Every legal turn is equally likely
+        board = list(self.workers.values())[0].board
+        worker_ids = list(self.workers)
+        with self.timed('generate'):
+            turns = list(legal_turns(board, worker_ids))
+        if self.stats is not None:
+            self.stats.count('turns_generated', len(turns))
+        if not turns:
+            return
+        worker_id, move_direction, build_direction = turn_directions(
+            self.rng.choice(turns), worker_ids)
 
-        move_direction = None
-        build_direction = None
+        self.workers[worker_id].move(move_direction)
+        self.workers[worker_id].build(build_direction)
 
-        # Keeps choosing move and build direction as long as it's invalid
-        while True:
-            # Choose the move and build direction
-            move_direction = random.choice(valid_dir)
+        self.display_move(worker_id, move_direction, build_direction,
+                          score_flag, opponent_workers)
+        return worker_id, move_direction, build_direction
 
-            # If the move and build is valid, break the loop
-            try:
-                workers[worker_id].can_move_in_direction(move_direction)
-                workers[worker_id].move(move_direction)
+class SearchPlayer(Player):
+    def __init__(self, player_id, workers, max_depth=6, time_limit=1.0,
+                 table_bits=18, rng=None, root_processes=None):
+        """
+        @brief Makes a player that picks its turns with an alpha-beta search
+        @param player_id: ID for the given player.
+        @param workers: A dictionary containing player's workers and positions
+        @param max_depth: The deepest search to run, in turns
+        @param time_limit: Seconds to search each turn for
+        @param table_bits: log2 of the transposition table size
+        @param rng: A random.Random for the player's choices, or None
+        @param root_processes: Processes to split the root moves across, or
+                               None to search in this process
+        @return: None
+        """
+        super().__init__(player_id, workers, rng)
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.table = TranspositionTable(table_bits)
+        self.root_processes = root_processes
+        self.nodes_per_second = 0.0
+        # The last parallel search's speedup over running its jobs in one
+        # process, see parallel.py
+        self.speedup = 0.0
+        # The depth the last search completed, and the results of pondering
+        # keyed by the position hash after each opponent reply searched
+        self.last_depth = 0
+        self.pondered = {}
+        self.ponderer = Ponderer()
+
+    def ponder_replies(self, searcher, side, stop_event, deadline):
+        """
+        @brief Searches the position after every opponent reply, one depth
+               at a time across all of them, most likely reply first
+        @param searcher: A Searcher at the position, opponent to move
+        @param side: The opponent's side
+        @param stop_event: A threading.Event set when it should return
+        @param deadline: The perf_counter time to stop at regardless
+        @return: None
+        """
+        searcher.stop_event = stop_event
+        board = searcher.board
+        replies = searcher.generate(side)
+        # The opponent's best reply at a shallow depth is the likeliest
+        guess, _, _ = searcher.search(side, min(2, self.max_depth))
+        if guess in replies:
+            replies.remove(guess)
+            replies.insert(0, guess)
+
+        # A winning reply ends the game, so there is nothing to answer
+        replies = [reply for reply in replies if board.heights[reply[1]] != 3]
+        # The table keeps each reply's shallower results, so every pass
+        # only pays for its new depth
+        for max_depth in range(1, self.max_depth + 1):
+            for reply in replies:
+                if stop_event.is_set() or time.perf_counter() > deadline:
+                    return
+                origin = board.play_turn(reply)
+                try:
+                    key = board.hash ^ searcher.side_keys[1 - side]
+                    if key in self.pondered and (
+                            abs(self.pondered[key][1]) >= WIN_THRESHOLD):
+                        continue
+                    turn, score, depth = searcher.search(1 - side, max_depth)
+                finally:
+                    board.undo_turn(reply, origin)
+                if depth == max_depth:
+                    self.pondered[key] = (turn, score, depth)
+
+    def pondered_turn(self, board, side):
+        """
+        @brief Stops pondering and looks up its result for the position
+        @param board: The game's board
+        @param side: This player's side
+        @return: The pondered turn if it searched at least as deep as the
+                 last search did, or found a forced result; None otherwise
+        """
+        if not self.stop_pondering():
+            return None
+        pondered = self.pondered.get(board.hash ^ (board.keys.side if side
+                                                   else 0))
+        self.pondered = {}
+        if pondered is None:
+            return None
+        turn, score, depth = pondered
+        if (depth >= min(self.last_depth, self.max_depth)
+                or abs(score) >= WIN_THRESHOLD):
+            return turn
+        return None
 
-                build_direction = random.choice(valid_dir)
+    def make_move(self, score_flag, opponent_workers):
+        """
+        @brief Searches for the best move and build and plays it
+        @param score_flag: 'on' to show the score after the move
+        @param opponent_workers: opponent player's workers
+        @return: The (worker_id, move_direction, build_direction) played, or
+                 None if the player has no legal turn
+        """
+        deadline = self.move_deadline()
+        board = list(self.workers.values())[0].board
+        sides, side = self.get_sides(opponent_workers)
+
+        with self.timed('lookup'):
+            turn = self.pondered_turn(board, side)
+            if turn is not None and self.stats is not None:
+                self.stats.count('ponder_hits')
+            if turn is None:
+                turn = self.known_turn(opponent_workers)
+        if turn is None:
+            with self.timed('evaluate'):
+                if self.root_processes is not None:
+                    searcher = ParallelSearcher(board, sides, SCORE_WEIGHTS,
+                                                self.root_processes)
+                else:
+                    searcher = Searcher(board, sides, SCORE_WEIGHTS,
+                                        self.table)
+                # The search still returns its best guess when the lookups
+                # used up the time
+                turn, _, self.last_depth = searcher.search(
+                    side, self.max_depth, self.time_left(deadline))
+            self.nodes_per_second = searcher.nodes_per_second
+            if self.root_processes is not None:
+                self.speedup = searcher.speedup
+            if self.stats is not None:
+                elapsed_us = round(searcher.elapsed * 1e6)
+                self.stats.count('search_nodes', searcher.nodes)
+                self.stats.count('search_us', elapsed_us)
+                if self.root_processes is not None:
+                    self.stats.count('parallel_nodes', searcher.nodes)
+                    self.stats.count('parallel_search_us', elapsed_us)
+                    self.stats.count('parallel_cpu_us',
+                                     round(searcher.job_seconds * 1e6))
+
+        if turn is None:
+            return
 
-                try:
-                    workers[worker_id].can_build_in_direction(build_direction)
-                    workers[worker_id].build(build_direction)
-                    break
-                except Exception:
-                    pass
-            except Exception:
-                pass
+        worker_id, move_direction, build_direction = self.play_cells(turn)
+        self.display_move(worker_id, move_direction, build_direction,
+                          score_flag, opponent_workers)
+        if self.ponder:
+            # The search copies the board here, before the opponent moves
+            self.ponderer.start(self.ponder_replies,
+                                Searcher(board, sides, SCORE_WEIGHTS,
+                                         self.table), 1 - side)
+        return worker_id, move_direction, build_direction
+
+class MCTSPlayer(Player):
+    def __init__(self, player_id, workers, playouts=None, time_limit=1.0,
+                 exploration=1.4, rng=None):
+        """
+        @brief Makes a player that picks its turns by Monte Carlo Tree Search
+        @param player_id: ID for the given player.
+        @param workers: A dictionary containing player's workers and positions
+        @param playouts: Playouts to run each turn, or None to use time_limit
+        @param time_limit: Seconds to search each turn for, or None
+        @param exploration: The UCT exploration constant
+        @param rng: A random.Random for the player's choices, or None
+        @return: None
+        """
+        super().__init__(player_id, workers, rng)
+        self.playouts = playouts
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.tree = None
+        self.playouts_per_second = 0.0
+        self.ponderer = Ponderer()
+
+    def pondered_budget(self, board, side):
+        """
+        @brief Stops pondering and takes the playouts already in the subtree
+               of the opponent's actual reply off this turn's budget
+        @param board: The game's board
+        @param side: This player's side
+        @return: (playouts, time_limit) left for this turn's search
+        """
+        if not self.stop_pondering() or not self.tree.set_root(board, side):
+            return self.playouts, self.time_limit
+        visits = self.tree.root.visits
+        if visits and self.stats is not None:
+            self.stats.count('ponder_hits')
+        if self.playouts is not None:
+            return max(self.playouts - visits, 0), self.time_limit
+        if self.time_limit is None or not self.playouts_per_second:
+            return self.playouts, self.time_limit
+        return None, max(self.time_limit - visits / self.playouts_per_second,
+                         0.0)
 
+    def make_move(self, score_flag, opponent_workers):
+        """
+        @brief Grows the search tree, plays its most visited turn and keeps
+               that subtree for the next turn
+        @param score_flag: 'on' to show the score after the move
+        @param opponent_workers: opponent player's workers
+        @return: The (worker_id, move_direction, build_direction) played, or
+                 None if the player has no legal turn
+        """
+        deadline = self.move_deadline()
+        board = list(self.workers.values())[0].board
+        sides, side = self.get_sides(opponent_workers)
+        if self.tree is None:
+            self.tree = MCTS(sides, self.exploration, self.rng)
+
+        with self.timed('lookup'):
+            playouts, time_limit = self.pondered_budget(board, side)
+            turn = self.known_turn(opponent_workers)
+        if time_limit is not None:
+            time_limit = min(time_limit, self.time_left(deadline))
+        if turn is None:
+            with self.timed('evaluate'):
+                turn = self.tree.search(board, side, playouts, time_limit)
+            if self.tree.playouts:
+                # A turn fully paid for by pondering has no rate to keep
+                self.playouts_per_second = self.tree.playouts_per_second
+            if self.stats is not None:
+                self.stats.count('playouts', self.tree.playouts)
+
+        if turn is None:
+            return
+
+        if self.tree.root is not None:
+            self.tree.advance(turn)
+        worker_id, move_direction, build_direction = self.play_cells(turn)
         self.display_move(worker_id, move_direction, build_direction,
-                          score_flag, opponent_workers)
\ No newline at end of file
+                          score_flag, opponent_workers)
+        if self.ponder:
+            # The tree copies the board here, before the opponent moves
+            self.tree.set_root(board, 1 - side)
+            self.ponderer.start(self.tree.ponder, 1 - side)
+        return worker_id, move_direction, build_direction
+
+PLAYER_TYPES = {'human': HumanPlayer,
+                'random': RandomPlayer,
+                'heuristic': HeuristicPlayer,
+                'search': SearchPlayer,
+                'mcts': MCTSPlayer}
+
+WORKER_IDS = {'white': ['A', 'B'], 'blue': ['Y', 'Z']}
+
+def create_player(player_type, player_id, board, rng=None, tablebase=None,
+                  book=None, cache=None, root_processes=None, time_limit=None):
+    """
+    @brief Creates a player of the given type with its workers on their
+           start positions
+    @param player_type: A key of PLAYER_TYPES, e.g. human or heuristic
+    @param player_id: white or blue player
+    @param board: The board the workers stand on
+    @param rng: A random.Random for the player's choices, or None
+    @param tablebase: An endgame Tablebase for the player to use, or None
+    @param book: An OpeningBook for the player to use, or None
+    @param cache: A transposition table shared with other players, e.g. a
+                  SharedTable, for search players to use instead of their
+                  own, or None
+    @param root_processes: Processes search players split their root moves
+                           across, or None to search in one process
+    @param time_limit: Seconds each of the player's turns may take, or None
+                       to keep the player type's own limit
+    @return: The player, or None for an unknown type or ID
+    """
+    if player_type not in PLAYER_TYPES or player_id not in WORKER_IDS:
+        return None
+
+    positions = board.tables.start_positions
+    workers = {worker_id: Worker(worker_id, board, player_id,
+                                 positions[worker_id])
+               for worker_id in WORKER_IDS[player_id]}
+    player = PLAYER_TYPES[player_type](player_id, workers, rng=rng)
+    player.tablebase = tablebase
+    player.book = book
+    if cache is not None and isinstance(player, SearchPlayer):
+        player.table = cache
+    if isinstance(player, SearchPlayer):
+        player.root_processes = root_processes
+    if time_limit is not None:
+        player.time_limit = time_limit
+    return player
@@ -1,28 +1,42 @@
 from board import Board
+from bitboard import BitBoard
 from player import Player
 from worker import Worker
 from exceptions import *
+from tables import DEFAULT_SIZE, get_tables
 
 class Santorini:
-    def __init__(self):
+    def __init__(self, bitboard=False, size=DEFAULT_SIZE):
         """
         @brief: Initializes the Santorini game.
+        @param bitboard: True to store the board in the bitboard engine
+        @param size: The number of rows (and columns) of the board
         """
-        initial_positions = {'A': (3, 1), 'B': (1, 3), 'Y': (1, 1), 'Z': (3, 3)}
+        initial_positions = dict(get_tables(size).start_positions)
 
-        self.board = Board(initial_positions)
+        if bitboard:
+            self.board = BitBoard(initial_positions, size)
+        else:
+            self.board = Board(initial_positions, size)
 
         self.player_white = Player('white', {'A': Worker('A', self.board,
-                                                         'white', (3, 1)),
+                                                         'white',
+                                                         initial_positions['A']),
                                              'B': Worker('B', self.board,
-                                                         'white', (1, 3))})
+                                                         'white',
+                                                         initial_positions['B'])})
         self.player_blue = Player('blue', {'Y': Worker('Y', self.board,
-                                                       'blue', (1, 1)),
+                                                       'blue',
+                                                       initial_positions['Y']),
                                            'Z': Worker('Z', self.board,
-                                                       'blue', (3, 3))})
+                                                       'blue',
+                                                       initial_positions['Z'])})
 
         self.curr_player = self.player_white
 
+        # The board hash covers buildings and workers, this covers the side
+        self.side_hash = 0
+
     def get_board(self):
         """
         @brief: Get the current state of the board
@@ -30,6 +44,14 @@ class Santorini:
         """
         return self.board
 
+    def get_hash(self):
+        """
+        @brief: Get the Zobrist hash of the position, kept up to date by every
+                move, build and player switch so it can key caches
+        @return: A 64-bit int identifying the board and the side to move
+        """
+        return self.board.hash ^ self.side_hash
+
     def switch_player(self):
         """
         @brief: Takes turns and switches between the two players.
@@ -39,6 +61,7 @@ class Santorini:
             self.curr_player = self.player_blue
         else:
             self.curr_player = self.player_white
+        self.side_hash ^= self.board.keys.side
     
     def check_win(self):
         """
@@ -46,32 +69,18 @@ class Santorini:
         @param None
         @return player_id if they have won, false otherwise
         """
-        # Checks both players
-        for player in [self.player_white, self.player_blue]:
-            # Checks all workers of this player
-            for worker in player.workers.values():
-                row, col = worker.position
-                # Returns id of player if that player is in a level 3 building
-                if self.board.get_building_level(row, col) == 3:
-                    return player.player_id
-        return False
+        # The board notes the player of any worker that moves onto level 3
+        return self.board.winner or False
     
     def check_loss(self):
         """
         @brief: Checks if the current player loses because they're trapped
         @return: True if the current player loses, False otherwise.
         """
-        valid_dir = ['n', 'ne', 'e', 'se', 's', 'sw', 'w', 'nw']
-        
-        # If worker cannot move or buildin any direction, return false
-        for worker in self.curr_player.workers.values():
-            can_move = any(worker.can_move_in_direction(direction)
-                           for direction in valid_dir)
-            can_build = any(worker.can_build_in_direction(direction)
-                            for direction in valid_dir)
-            if can_move or can_build:
-                return False
-        return True
+        # A worker that can move can always build on the cell it left, so
+        # the player is only trapped when no worker can move; the board keeps
+        # every worker's move count up to date
+        return self.board.is_trapped(self.curr_player.player_id)
 
     def check_worker(self, worker_id, valid_directions):
         """
@@ -90,9 +99,8 @@ class Santorini:
                 else:
                     raise InvalidWorker()
             
-            # If all workers of this player can't move, raise error
-            if not any(self.curr_player.workers[worker_id].can_move_in_direction(direction)
-                       for direction in valid_directions):
+            # If this worker can't move, raise error
+            if not self.board.worker_moves(worker_id):
                 raise TrappedWorker()
             return True
         except InvalidWorker:
@@ -1,4 +1,4 @@
-from board import Board
+from board import Board, DIRECTIONS
 from exceptions import MoveError, BuildError, TrappedWorker
 
 class Worker:
@@ -20,35 +20,7 @@ class Worker:
         @param direction: The direction to be checked.
         @return True if the worker can move in the specified direction
         """
-        row, col = self.position
-        
-        # Checks if direction is not out of the board and is below level 4
-        if direction == 'n' and row - 1 > -1:
-            target_level = self.board.get_building_level(row - 1, col)
-            return (not self.board.is_position_occupied((row - 1, col))) and self.board.get_building_level(row - 1, col) < 4 and target_level <= self.board.get_building_level(row, col) + 1
-        elif direction == 'ne' and row - 1 > -1 and col + 1 < 5:
-            target_level = self.board.get_building_level(row - 1, col + 1)
-            return (not self.board.is_position_occupied((row - 1, col + 1))) and self.board.get_building_level(row - 1, col + 1) < 4 and target_level <= self.board.get_building_level(row, col) + 1
-        elif direction == 'e' and col + 1 < 5:
-            target_level = self.board.get_building_level(row, col + 1)
-            return (not self.board.is_position_occupied((row, col + 1))) and self.board.get_building_level(row, col + 1) < 4 and target_level <= self.board.get_building_level(row, col) + 1
-        elif direction == 'se' and row + 1 < 5 and col + 1 < 5:
-            target_level = self.board.get_building_level(row + 1, col + 1)
-            return (not self.board.is_position_occupied((row + 1, col + 1))) and self.board.get_building_level(row + 1, col + 1) < 4 and target_level <= self.board.get_building_level(row, col) + 1
-        elif direction == 's' and row + 1 < 5:
-            target_level = self.board.get_building_level(row + 1, col)
-            return (not self.board.is_position_occupied((row + 1, col))) and self.board.get_building_level(row + 1, col) < 4 and target_level <= self.board.get_building_level(row, col) + 1
-        elif direction == 'sw' and row + 1 < 5 and col - 1 > -1:
-            target_level = self.board.get_building_level(row + 1, col - 1)
-            return (not self.board.is_position_occupied((row + 1, col - 1))) and self.board.get_building_level(row + 1, col - 1) < 4 and target_level <= self.board.get_building_level(row, col) + 1
-        elif direction == 'w' and col - 1 > -1:
-            target_level = self.board.get_building_level(row, col - 1)
-            return (not self.board.is_position_occupied((row, col - 1))) and self.board.get_building_level(row, col - 1) < 4 and target_level <= self.board.get_building_level(row, col) + 1
-        elif direction == 'nw' and row - 1 > -1 and col - 1 > -1:
-            target_level = self.board.get_building_level(row - 1, col - 1)
-            return (not self.board.is_position_occupied((row - 1, col - 1))) and self.board.get_building_level(row - 1, col - 1) < 4 and target_level <= self.board.get_building_level(row, col) + 1
-        else:
-            return False
+        return self.board.can_move(self.position, direction)
     
     def can_build_in_direction(self, direction):
         """
@@ -56,50 +28,21 @@ class Worker:
         @param direction: The direction to be checked
         @return True if the worker can build in the specified direction
         """
-        row, col = self.position
-        target_position = None
-
-        # Checks if direction is not out of the board and is below level 4
-        if direction == 'n' and row - 1 > -1:
-            target_position = (row - 1, col)
-        elif direction == 'ne' and row - 1 > -1 and col + 1 < 5:
-            target_position = (row - 1, col + 1)
-        elif direction == 'e' and col + 1 < 5:
-            target_position = (row, col + 1)
-        elif direction == 'se' and row + 1 < 5 and col + 1 < 5:
-            target_position = (row + 1, col + 1)
-        elif direction == 's' and row + 1 < 5:
-            target_position = (row + 1, col)
-        elif direction == 'sw' and row + 1 < 5 and col - 1 > -1:
-            target_position = (row + 1, col - 1)
-        elif direction == 'w' and col - 1 > -1:
-            target_position = (row, col - 1)
-        elif direction == 'nw' and row - 1 > -1 and col - 1 > -1:
-            target_position = (row - 1, col - 1)
-
-        if target_position is None:
-            return False
-
-        return (
-            not self.board.is_position_occupied(target_position)
-            and self.board.get_building_level(*target_position) < 4
-        )
+        return self.board.can_build(self.position, direction)
 
     def get_possible_moves(self):
         """
         @brief Get a list of possible moves for the worker
         @return: A list of possible moves (directions) for the worker
         """
-        valid_dir = ['n', 'ne', 'e', 'se', 's', 'sw', 'w', 'nw']
-        return [dir for dir in valid_dir if self.can_move_in_direction(dir)]
+        return [dir for dir in DIRECTIONS if self.can_move_in_direction(dir)]
 
     def get_possible_builds(self):
         """
         @brief Get a list of possible build directions for the worker
         @return: A list of possible build directions for the worker
         """
-        valid_dir = ['n', 'ne', 'e', 'se', 's', 'sw', 'w', 'nw']
-        return [dir for dir in valid_dir if self.can_build_in_direction(dir)]
+        return [dir for dir in DIRECTIONS if self.can_build_in_direction(dir)]
 
     def move(self, direction):
             """
@@ -109,47 +52,13 @@ class Worker:
             @param new_col representing the column of the new position
             @return None
             """
-            valid_dir = ['n', 'ne', 'e', 'se', 's', 'sw', 'w', 'nw']
-            if not any(self.can_move_in_direction(dir) for dir in valid_dir):
-                raise TrappedWorker()
-            
-            row, col = self.position
-            new_position = None
-            
-            if direction == 'n' and row - 1 > -1:
-                target_level = self.board.get_building_level(row - 1, col)
-                new_position = (row - 1, col)
-            elif direction == 'ne' and row - 1 > -1 and col + 1 < 5:
-                target_level = self.board.get_building_level(row - 1, col + 1)
-                new_position = (row - 1, col + 1)
-            elif direction == 'e' and col + 1 < 5:
-                target_level = self.board.get_building_level(row, col + 1)
-                new_position = (row, col + 1)
-            elif direction == 'se' and row + 1 < 5 and col + 1 < 5:
-                target_level = self.board.get_building_level(row + 1, col + 1)
-                new_position = (row + 1, col + 1)
-            elif direction == 's' and row + 1 < 5:
-                target_level = self.board.get_building_level(row + 1, col)
-                new_position = (row + 1, col)
-            elif direction == 'sw' and row + 1 < 5 and col - 1 > -1:
-                target_level = self.board.get_building_level(row + 1, col - 1)
-                new_position = (row + 1, col - 1)
-            elif direction == 'w' and col - 1 > -1:
-                target_level = self.board.get_building_level(row, col - 1)
-                new_position = (row, col - 1)
-            elif direction == 'nw' and row - 1 > -1 and col -1 > -1:
-                target_level = self.board.get_building_level(row - 1, col - 1)
-                new_position = (row - 1, col - 1)
-            else:
-                raise MoveError(direction)
-            
-            if self.board.is_position_occupied(new_position):
-                raise MoveError(direction)
-            
-            if self.board.get_building_level(*new_position) == 4:
-                raise MoveError(direction)
-            
-            if target_level > self.board.get_building_level(row, col) + 1:
+            # Off-board, occupied, domed or too high targets are all invalid;
+            # a worker with no legal move at all is trapped
+            new_position = self.board.get_neighbour(self.position, direction)
+            if (new_position is None
+                    or not self.board.can_move(self.position, direction)):
+                if not self.board.worker_moves(self.worker_id):
+                    raise TrappedWorker()
                 raise MoveError(direction)
             
             self.position = new_position
@@ -162,39 +71,17 @@ class Worker:
             @param col representing column of the position to the building
             @return None
             """
-            row, col = self.position
-            target_position = None
-
             # Checking to see if build direction is a position within the board
-            if direction == 'n' and row - 1 > -1:
-                target_position = (row - 1, col)
-            elif direction == 'ne' and row - 1 > -1 and col + 1 < 5:
-                target_position = (row - 1, col + 1)
-            elif direction == 'e' and col + 1 < 5:
-                target_position = (row, col + 1)
-            elif direction == 'se' and row + 1 < 5 and col + 1 < 5:
-                target_position = (row + 1, col + 1)
-            elif direction == 's' and row + 1 < 5:
-                target_position = (row + 1, col)
-            elif direction == 'sw' and row + 1 < 5 and col - 1 > -1:
-                target_position = (row + 1, col - 1)
-            elif direction == 'w' and col - 1 > -1:
-                target_position = (row, col - 1)
-            elif direction == 'nw' and row - 1 > -1 and col -1 > -1:
-                target_position = (row - 1, col - 1)
-            else:
-                raise BuildError(direction)
-
-            # Checking to see if position is occupied
-            if self.board.is_position_occupied(target_position):
+            target_position = self.board.get_neighbour(self.position, direction)
+            if target_position is None:
                 raise BuildError(direction)
 
-            # Checking to see if position is already level 4
-            if self.board.get_building_level(*target_position) == 4:
+            # Checking to see if position is occupied or already level 4
+            if not self.board.can_build(self.position, direction):
                 raise BuildError(direction)
 
             # Else build at the position
-            self.board.grid[target_position[0]][target_position[1]] += 1
+            self.board.add_level(target_position)
             
     def set_position(self, new_position):
         """
@@ -0,0 +1,263 @@
+"""Audit of stored games: replays game records and flags blunders.
+
+Every turn of every game is checked against the rules engine and played on
+a bitboard. At each ply the mover's calculate_score terms are read off the
+board, and the position is searched to a fixed depth. The played turn's
+score is compared with the best score found, and a turn that loses at least
+the blunder threshold is flagged. Totals are kept per player type.
+
+Games are streamed from disk to a process pool with only a bounded number
+in flight, so an archive of any size is audited in constant memory.
+"""
+import argparse
+import collections
+import logging
+import multiprocessing
+import time
+
+from player import SCORE_WEIGHTS
+from record import SIDES, read_records
+from rules import decode_turn, legal_turns
+from santorini import Santorini
+from search import WIN, WIN_THRESHOLD, Searcher, TranspositionTable
+
+logger = logging.getLogger(__name__)
+
+PLAYER_IDS = ('white', 'blue')
+
+
+class PlayerStats:
+    """Totals of the plies played by one player type."""
+
+    def __init__(self):
+        """
+        @brief Makes empty totals
+        @return: None
+        """
+        self.games = 0
+        self.wins = 0
+        self.plies = 0
+        self.blunders = 0
+        # Sum of best score minus played score over the plies where neither
+        # is a forced result
+        self.loss = 0
+        self.scored_plies = 0
+        # Sums of the mover's (height, center, distance) before each turn
+        self.terms = [0, 0, 0]
+
+    def merge(self, other):
+        """
+        @brief Adds another set of totals to these
+        @param other: A PlayerStats
+        @return: None
+        """
+        self.games += other.games
+        self.wins += other.wins
+        self.plies += other.plies
+        self.blunders += other.blunders
+        self.loss += other.loss
+        self.scored_plies += other.scored_plies
+        for term in range(3):
+            self.terms[term] += other.terms[term]
+
+
+class GameAnalysis:
+    """Result of auditing one game."""
+
+    def __init__(self, index):
+        """
+        @brief Makes an empty analysis
+        @param index: The position of the game in the stream
+        @return: None
+        """
+        self.index = index
+        # Stats of white and blue
+        self.stats = (PlayerStats(), PlayerStats())
+        # (ply, worker_id, played score, best score) of each blunder
+        self.blunders = []
+        # Why the game could not be replayed to its end, or None
+        self.error = None
+
+
+def analyze_game(job):
+    """
+    @brief Pool entry point that replays and audits one game
+    @param job: (index in the stream, GameRecord, search depth, blunder
+                 threshold)
+    @return: A GameAnalysis
+    """
+    index, record, depth, threshold = job
+    analysis = GameAnalysis(index)
+    board = Santorini(True, record.size).board
+    searcher = Searcher(board, SIDES, SCORE_WEIGHTS, TranspositionTable(16))
+    board = searcher.board
+    steps = board.tables.steps
+
+    for side, player_stats in enumerate(analysis.stats):
+        player_stats.games = 1
+        player_stats.wins = int(record.winner == PLAYER_IDS[side])
+
+    for ply, encoded in enumerate(record.turns):
+        side = ply & 1
+        if encoded not in set(legal_turns(board, SIDES[side])):
+            analysis.error = f"illegal turn at ply {ply}"
+            break
+        slot, move_index, build_index = decode_turn(encoded)
+        worker_id = SIDES[side][slot]
+        target = steps[board.worker_cells[worker_id]][move_index]
+        turn = (worker_id, target, steps[target][build_index])
+
+        player_stats = analysis.stats[side]
+        player_stats.plies += 1
+        for term, value in enumerate(board.scores[PLAYER_IDS[side]]):
+            player_stats.terms[term] += value
+
+        best, _ = searcher.negamax(depth, 0, -WIN - 1, WIN + 1, side)
+        if board.heights[target] == 3:
+            played = WIN - 1
+        else:
+            origin = board.play_turn(turn)
+            try:
+                played = -searcher.negamax(depth - 1, 1, -WIN - 1, WIN + 1,
+                                           1 - side)[0]
+            finally:
+                board.undo_turn(turn, origin)
+
+        if abs(best) >= WIN_THRESHOLD or abs(played) >= WIN_THRESHOLD:
+            # Only a missed win or a walk into a forced loss is a blunder
+            # here; a slower win or a slower loss is not
+            blunder = ((best >= WIN_THRESHOLD) != (played >= WIN_THRESHOLD)
+                       or (best <= -WIN_THRESHOLD)
+                       != (played <= -WIN_THRESHOLD))
+        else:
+            loss = max(0, best - played)
+            player_stats.loss += loss
+            player_stats.scored_plies += 1
+            blunder = loss >= threshold
+        if blunder:
+            player_stats.blunders += 1
+            analysis.blunders.append((ply, worker_id, played, best))
+
+        board.play_turn(turn)
+    return analysis
+
+
+def analyze(paths, depth=2, threshold=30, processes=None, max_pending=None,
+            on_game=None):
+    """
+    @brief Audits every game of some record files across a process pool
+    @param paths: The record files to read
+    @param depth: The search depth each ply is checked at, at least 1
+    @param threshold: The score a turn must lose to count as a blunder
+    @param processes: Pool size, None for one process per CPU, or 1 to audit
+                      in this process
+    @param max_pending: The most games in flight at once, or None for four
+                        per process
+    @param on_game: Called with (path, GameRecord, GameAnalysis) as each
+                    game is done, or None
+    @return: Dictionary mapping player types to PlayerStats
+    """
+    def jobs():
+        index = 0
+        for path in paths:
+            for record in read_records(path):
+                yield path, record, (index, record, depth, threshold)
+                index += 1
+
+    totals = collections.defaultdict(PlayerStats)
+
+    def add(path, record, analysis):
+        for side, player_type in enumerate((record.white, record.blue)):
+            totals[player_type].merge(analysis.stats[side])
+        if on_game:
+            on_game(path, record, analysis)
+
+    start = time.perf_counter()
+    games = 0
+    if processes == 1:
+        for path, record, job in jobs():
+            add(path, record, analyze_game(job))
+            games += 1
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            # Pool.imap reads its whole input up front, so games are handed
+            # out through a bounded window of pending results instead
+            limit = max_pending or 4 * (processes
+                                        or multiprocessing.cpu_count())
+            pending = collections.deque()
+            for path, record, job in jobs():
+                pending.append((path, record,
+                                pool.apply_async(analyze_game, (job,))))
+                if len(pending) >= limit:
+                    path, record, result = pending.popleft()
+                    add(path, record, result.get())
+                    games += 1
+            while pending:
+                path, record, result = pending.popleft()
+                add(path, record, result.get())
+                games += 1
+
+    elapsed = time.perf_counter() - start
+    logger.info("%d games in %.1fs (%.1f games/sec)", games, elapsed,
+                games / elapsed if elapsed else 0.0)
+    return dict(totals)
+
+
+def report(totals):
+    """
+    @brief Formats the totals of each player type
+    @param totals: Dictionary mapping player types to PlayerStats
+    @return: A multi-line summary string
+    """
+    if not totals:
+        return "No games analyzed"
+
+    lines = []
+    for player_type in sorted(totals):
+        stats = totals[player_type]
+        plies = stats.plies or 1
+        height, center, distance = (term / plies for term in stats.terms)
+        lines.append(
+            f"{player_type}: {stats.games} games, {stats.wins} won, "
+            f"{stats.plies} plies, {stats.blunders} blunders "
+            f"({100 * stats.blunders / plies:.1f}%), mean loss "
+            f"{stats.loss / (stats.scored_plies or 1):.1f}, mean terms "
+            f"height {height:.2f} "
+            f"center {center:.2f} distance {distance:.2f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Audit stored games')
+    parser.add_argument('paths', nargs='+', metavar='PATH',
+                        help='game record files to read')
+    parser.add_argument('--depth', type=int, default=2,
+                        help='search depth each ply is checked at')
+    parser.add_argument('--threshold', type=int, default=30,
+                        help='score a turn must lose to count as a blunder '
+                             'when neither side has a forced result')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--pending', type=int, default=None,
+                        help='most games in flight at once')
+    parser.add_argument('--blunders', action='store_true',
+                        help='list every blunder and unreadable game')
+    parser.add_argument('--verbose', action='store_true',
+                        help='log games/sec')
+
+    args = parser.parse_args()
+    if args.verbose:
+        logging.basicConfig(level=logging.INFO)
+        logging.getLogger('search').setLevel(logging.WARNING)
+
+    def show(path, record, analysis):
+        if analysis.error:
+            print(f"{path} game {analysis.index}: {analysis.error}")
+        for ply, worker_id, played, best in analysis.blunders:
+            print(f"{path} game {analysis.index} ply {ply}: {worker_id} "
+                  f"played {played}, best {best}")
+
+    totals = analyze(args.paths, max(1, args.depth), args.threshold,
+                     args.processes, args.pending,
+                     show if args.blunders else None)
+    print(report(totals))
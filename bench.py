@@ -0,0 +1,291 @@
+"""Move generation benchmarks: perft counts and micro-benchmarks.
+
+perft counts the sequences of legal full turns (a move and a build) of a
+given length from a position, the way chess engines check their move
+generators. A turn that moves onto level 3 wins, so nothing follows it.
+Counts are checked against KNOWN_COUNTS, which every engine must match:
+
+- bitboard: BitBoard.legal_turns, play_turn and undo_turn, as the search uses
+- rules: the rules.legal_turns generator, as the heuristic player uses
+- worker: Worker.get_possible_moves, move and build on a Board, as the
+  human and random players use
+
+The micro-benchmarks time the single calls the game loop makes most.
+"""
+import argparse
+import time
+import timeit
+
+from rules import decode_turn, legal_turns
+from state import GameState
+from tables import DEFAULT_SIZE, DIRECTIONS, get_tables
+from zobrist import WORKER_IDS
+
+# Worker IDs of white and blue
+SIDES = [WORKER_IDS[:2], WORKER_IDS[2:]]
+
+# Fixed 5x5 positions as (building levels row by row, worker cells in
+# WORKER_IDS order, side to move); the start position is added per size
+POSITIONS = {
+    'midgame': (('01200',
+                 '12310',
+                 '02410',
+                 '11200',
+                 '00100'), (6, 17, 11, 3), 0),
+    'endgame': (('23432',
+                 '34243',
+                 '22330',
+                 '41324',
+                 '32124'), (7, 22, 0, 11), 1),
+}
+
+# perft counts of depths 1, 2, ... of each position on the 5x5 board, on
+# which all three engines agree
+KNOWN_COUNTS = {
+    'start': [80, 6176, 426384, 29096316],
+    'midgame': [60, 2372, 104844, 4005929],
+    'endgame': [29, 301, 2197, 37430, 190601],
+}
+
+ENGINES = ('bitboard', 'rules', 'worker')
+
+
+def position_state(name, size=DEFAULT_SIZE):
+    """
+    @brief Looks up a benchmark position
+    @param name: 'start' or a key of POSITIONS
+    @param size: The number of rows (and columns) of the board
+    @return: The position as a GameState
+    """
+    if name == 'start':
+        tables = get_tables(size)
+        cells = {worker_id: tables.cell_of(position) for worker_id, position
+                 in tables.start_positions.items()}
+        return GameState.pack([0] * tables.cells, cells, 0, size)
+    if size != DEFAULT_SIZE:
+        raise ValueError(f"position {name} is only defined for size "
+                         f"{DEFAULT_SIZE}")
+    rows, cells, side = POSITIONS[name]
+    heights = [int(level) for row in rows for level in row]
+    return GameState.pack(heights, dict(zip(WORKER_IDS, cells)), side, size)
+
+
+def perft_bitboard(board, side, depth):
+    """
+    @brief Counts turn sequences with the bitboard's own generator
+    @param board: A BitBoard, put back as it was when this returns
+    @param side: The side to move, 0 for white and 1 for blue
+    @param depth: The number of turns in each sequence, at least 1
+    @return: The number of sequences
+    """
+    turns = board.legal_turns(SIDES[side])
+    if depth == 1:
+        return len(turns)
+
+    heights = board.heights
+    nodes = 0
+    for turn in turns:
+        if heights[turn[1]] == 3:
+            continue
+        origin = board.play_turn(turn)
+        nodes += perft_bitboard(board, 1 - side, depth - 1)
+        board.undo_turn(turn, origin)
+    return nodes
+
+
+def perft_rules(board, side, depth):
+    """
+    @brief Counts turn sequences with the rules.legal_turns generator
+    @param board: A BitBoard, put back as it was when this returns
+    @param side: The side to move, 0 for white and 1 for blue
+    @param depth: The number of turns in each sequence, at least 1
+    @return: The number of sequences
+    """
+    worker_ids = SIDES[side]
+    if depth == 1:
+        return sum(1 for _ in legal_turns(board, worker_ids))
+
+    steps = board.tables.steps
+    heights = board.heights
+    nodes = 0
+    for encoded in list(legal_turns(board, worker_ids)):
+        slot, move_index, build_index = decode_turn(encoded)
+        worker_id = worker_ids[slot]
+        target = steps[board.worker_cells[worker_id]][move_index]
+        if heights[target] == 3:
+            continue
+        turn = (worker_id, target, steps[target][build_index])
+        origin = board.play_turn(turn)
+        nodes += perft_rules(board, 1 - side, depth - 1)
+        board.undo_turn(turn, origin)
+    return nodes
+
+
+def perft_worker(game, depth):
+    """
+    @brief Counts turn sequences through the Worker API
+    @param game: A Santorini, put back as it was when this returns
+    @param depth: The number of turns in each sequence, at least 1
+    @return: The number of sequences
+    """
+    board = game.board
+    nodes = 0
+    for worker in list(game.curr_player.workers.values()):
+        origin = worker.position
+        for move_direction in worker.get_possible_moves():
+            worker.move(move_direction)
+            row, col = worker.position
+            won = board.get_building_level(row, col) == 3
+            for build_direction in worker.get_possible_builds():
+                if depth == 1:
+                    nodes += 1
+                    continue
+                if won:
+                    continue
+                worker.build(build_direction)
+                game.switch_player()
+                nodes += perft_worker(game, depth - 1)
+                game.switch_player()
+                board.remove_level(board.get_neighbour(worker.position,
+                                                       build_direction))
+            worker.set_position(origin)
+    return nodes
+
+
+def perft(state, depth, engine='bitboard'):
+    """
+    @brief Counts turn sequences from a position
+    @param state: The position as a GameState
+    @param depth: The number of turns in each sequence, at least 1
+    @param engine: One of ENGINES
+    @return: (number of sequences, seconds taken)
+    """
+    start = time.perf_counter()
+    if engine == 'worker':
+        nodes = perft_worker(state.to_game(bitboard=False), depth)
+    elif engine == 'rules':
+        nodes = perft_rules(state.to_board(bitboard=True), state.side, depth)
+    else:
+        nodes = perft_bitboard(state.to_board(bitboard=True), state.side,
+                               depth)
+    return nodes, time.perf_counter() - start
+
+
+def micro_benchmarks(number=100000, bitboard=False):
+    """
+    @brief Times the calls the game loop makes most, on the midgame position
+    @param number: The number of calls timed for each benchmark
+    @param bitboard: True to time them on the bitboard engine
+    @return: Dictionary mapping benchmark names to seconds per call
+    """
+    game = position_state('midgame').to_game(bitboard)
+    board = game.board
+    player = game.curr_player
+    opponent_workers = game.player_blue.workers.values()
+    worker = player.workers['A']
+
+    # A move that can be taken straight back, so moves can run in pairs
+    for direction in DIRECTIONS:
+        back = DIRECTIONS[(DIRECTIONS.index(direction) + 4) % 8]
+        origin = worker.position
+        if worker.can_move_in_direction(direction):
+            worker.move(direction)
+            can_return = worker.can_move_in_direction(back)
+            worker.set_position(origin)
+            if can_return:
+                break
+    build_direction = next(
+        direction for direction in DIRECTIONS
+        if worker.can_build_in_direction(direction)
+        and board.get_height(board.get_neighbour(worker.position,
+                                                 direction)) < 3)
+    build_target = board.get_neighbour(worker.position, build_direction)
+
+    def move_pair():
+        worker.move(direction)
+        worker.move(back)
+
+    def build_pair():
+        worker.build(build_direction)
+        board.remove_level(build_target)
+
+    benchmarks = {
+        'Worker.can_move_in_direction':
+            (lambda: worker.can_move_in_direction('e'), 1),
+        'Worker.move': (move_pair, 2),
+        'Worker.build (with Board.remove_level)': (build_pair, 1),
+        'Santorini.check_loss': (game.check_loss, 1),
+        'Player.calculate_score':
+            (lambda: player.calculate_score(opponent_workers), 1),
+    }
+    return {name: timeit.timeit(call, number=number) / (number * per_call)
+            for name, (call, per_call) in benchmarks.items()}
+
+
+def check_counts(engines=ENGINES, max_depth=None):
+    """
+    @brief Runs every engine on every position with known counts
+    @param engines: The engines to check
+    @param max_depth: The deepest known count to check, or None for all
+    @return: A list of (position, depth, engine, expected, found) mismatches
+    """
+    mismatches = []
+    for name, counts in KNOWN_COUNTS.items():
+        state = position_state(name)
+        for depth, expected in enumerate(counts[:max_depth], 1):
+            for engine in engines:
+                found, _ = perft(state, depth, engine)
+                if found != expected:
+                    mismatches.append((name, depth, engine, expected, found))
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Perft counts and move generation micro-benchmarks')
+    parser.add_argument('-d', '--depth', type=int, default=3,
+                        help='number of turns to count sequences of')
+    parser.add_argument('-p', '--position', action='append',
+                        choices=['start'] + sorted(POSITIONS),
+                        help='position to count from (default: all)')
+    parser.add_argument('-e', '--engine', choices=ENGINES,
+                        default='bitboard',
+                        help='move generator to count with')
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE,
+                        help='number of rows and columns of the board')
+    parser.add_argument('--check', action='store_true',
+                        help='check every engine against the known counts '
+                             'up to --depth')
+    parser.add_argument('--micro', type=int, metavar='N', default=0,
+                        help='also time N calls of each micro-benchmark')
+
+    args = parser.parse_args()
+    if args.check:
+        mismatches = check_counts(max_depth=args.depth)
+        for name, depth, engine, expected, found in mismatches:
+            print(f"{name} depth {depth} ({engine}): expected {expected}, "
+                  f"found {found}")
+        print("perft counts " + ("FAILED" if mismatches else "OK"))
+    else:
+        names = args.position or (['start'] if args.size != DEFAULT_SIZE
+                                  else ['start'] + sorted(POSITIONS))
+        for name in names:
+            state = position_state(name, args.size)
+            known = KNOWN_COUNTS.get(name, []) if args.size == DEFAULT_SIZE \
+                else []
+            for depth in range(1, args.depth + 1):
+                nodes, elapsed = perft(state, depth, args.engine)
+                rate = nodes / elapsed if elapsed else 0.0
+                status = ''
+                if depth <= len(known):
+                    status = ('  ok' if nodes == known[depth - 1]
+                              else f"  MISMATCH, expected {known[depth - 1]}")
+                print(f"{name} depth {depth}: {nodes} nodes in "
+                      f"{elapsed:.3f}s ({rate:.0f} nodes/sec){status}")
+
+    if args.micro:
+        for bitboard in (False, True):
+            engine = 'bitboard' if bitboard else 'board'
+            for name, seconds in micro_benchmarks(args.micro,
+                                                  bitboard).items():
+                print(f"{engine} {name}: {seconds * 1e9:.0f} ns/call")
@@ -0,0 +1,309 @@
+"""Bitboard engine for the Santorini board.
+
+Cells are numbered row * size + col, so the whole board fits in one int.
+Buildings are kept as per-level masks and workers as one-bit masks, and move
+and build legality come from the neighbour masks in the shared BoardTables
+instead of per-direction bounds checks.
+"""
+from board import Board
+from tables import DEFAULT_SIZE, DIRECTION_INDEX, get_tables
+
+
+def iter_cells(mask):
+    """
+    @brief Yields the cell index of every set bit of a mask, lowest first
+    @param mask: A board mask
+    @return: A generator of cell indices
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BitBoard(Board):
+    """
+    Board whose buildings and workers are stored as bitmasks. It keeps the
+    public methods of Board, so Worker and Santorini can use it unchanged.
+    """
+
+    def __init__(self, worker_positions, size=DEFAULT_SIZE, owners=None):
+        """
+        @brief Sets up an empty board and the initial worker masks
+        @param worker_positions: Dictionary mapping worker IDs to positions
+        @param size: The number of rows (and columns) of the board
+        @param owners: Dictionary mapping worker IDs to player IDs
+        @return None
+        """
+        # The worker masks come first, Board.__init__ counts moves with them
+        cell_of = get_tables(size).cell_of
+        self.worker_cells = {worker_id: cell_of(position)
+                             for worker_id, position in worker_positions.items()}
+        self.occupied = 0
+        for cell in self.worker_cells.values():
+            self.occupied |= 1 << cell
+
+        # Board.__init__ fills in heights and below through the grid setter
+        super().__init__(worker_positions, size, owners)
+
+    @property
+    def grid(self):
+        """
+        @brief Builds a read-only copy of the heights as rows, for code
+               written against Board; use get_heights to scan the board
+        @return: A size x size tuple of tuples of building levels
+        """
+        size = self.size
+        return tuple(tuple(self.heights[row * size:(row + 1) * size])
+                     for row in range(size))
+
+    @grid.setter
+    def grid(self, grid):
+        """
+        @brief Loads every level mask from a list of lists of building levels
+        @param grid: A size x size list of building levels
+        @return: None
+        """
+        # below[k] holds the cells whose height is lower than k, so building
+        # on a cell of height h only clears its bit from below[h + 1]
+        self.heights = [level for row in grid for level in row]
+        self.below = [0] * 6
+        for cell, level in enumerate(self.heights):
+            for k in range(level + 1, 6):
+                self.below[k] |= 1 << cell
+
+    def level_mask(self, level):
+        """
+        @brief Obtains the mask of all cells at exactly the given level
+        @param level: A building level from 0 to 4
+        @return: The mask of cells at that level
+        """
+        return self.below[level + 1] & ~self.below[level]
+
+    def get_heights(self):
+        """
+        @brief Obtains the level of every cell without copying the board
+        @param None
+        @return: The board's own list of building levels indexed by cell,
+                 which callers must only read
+        """
+        return self.heights
+
+    def get_building_level(self, row, col):
+        """
+        @brief Obtains the level of the given building from the height table
+        @param row: The row of the building
+        @param col: The column of the building
+        @return: The level of the building
+        """
+        return self.heights[row * self.size + col]
+
+    def get_height(self, position):
+        """
+        @brief Obtains the height of the given cell from the height table
+        @param position: The position (row, col)
+        @return: The height of the cell
+        """
+        return self.heights[position[0] * self.size + position[1]]
+
+    def is_position_occupied(self, position):
+        """
+        @brief Checks the occupancy mask for a worker on the position
+        @param position: The position being checked
+        @return: True if the position is occupied, false otherwise
+        """
+        return bool(self.occupied >> self.tables.cell_of(position) & 1)
+
+    def update_worker_position(self, worker_id, new_position):
+        """
+        @brief Moves the worker's bit in the occupancy mask
+        @param worker_id: ID of the worker to be updated
+        @param new_position: The new position of the worker
+        @return: None
+        """
+        old_cell = self.worker_cells.get(worker_id)
+        if old_cell is not None:
+            self.occupied &= ~(1 << old_cell)
+
+        new_cell = self.tables.cell_of(new_position)
+        self.worker_cells[worker_id] = new_cell
+        self.occupied |= 1 << new_cell
+        super().update_worker_position(worker_id, new_position)
+
+    def move_targets(self, cell):
+        """
+        @brief Obtains every cell a worker standing on cell can move to
+        @param cell: The cell index of the worker
+        @return: A mask of free, undomed neighbours at most one level higher
+        """
+        climbable = self.below[min(self.heights[cell] + 2, 4)]
+        return self.tables.neighbours[cell] & climbable & ~self.occupied
+
+    def count_moves(self, cell):
+        """
+        @brief Counts the bits of the worker's move target mask
+        @param cell: The cell index of the worker
+        @return: (number of cells it can move to, number of those on level 3)
+        """
+        targets = self.move_targets(cell)
+        on_top = targets & self.below[4] & ~self.below[3]
+        return targets.bit_count(), on_top.bit_count()
+
+    def refresh_mobility(self):
+        """
+        @brief Counts the move target bits again of the workers on or next to
+               a cell that changed since the last count
+        @param None
+        @return: None
+        """
+        stale = self.stale
+        self.stale = 0
+        around = self.tables.around
+        neighbours = self.tables.neighbours
+        heights = self.heights
+        below = self.below
+        free = ~self.occupied
+        on_top = below[4] & ~below[3]
+        for worker_id, cell in self.worker_cells.items():
+            if around[cell] & stale:
+                targets = (neighbours[cell] & below[min(heights[cell] + 2, 4)]
+                           & free)
+                self.moves[worker_id] = targets.bit_count()
+                self.climbs[worker_id] = (targets & on_top).bit_count()
+
+    def build_targets(self, cell):
+        """
+        @brief Obtains every cell a worker standing on cell can build on
+        @param cell: The cell index of the worker
+        @return: A mask of free, undomed neighbours
+        """
+        return self.tables.neighbours[cell] & self.below[4] & ~self.occupied
+
+    def can_move(self, position, direction):
+        """
+        @brief Checks a move against the worker's move target mask
+        @param position: The position of the worker (row, col)
+        @param direction: The direction to be checked
+        @return: True if the worker can move in that direction
+        """
+        cell = self.tables.cell_of(position)
+        index = DIRECTION_INDEX.get(direction)
+        if index is None:
+            return False
+
+        target = self.tables.steps[cell][index]
+        return target >= 0 and bool(self.move_targets(cell) >> target & 1)
+
+    def can_build(self, position, direction):
+        """
+        @brief Checks a build against the worker's build target mask
+        @param position: The position of the worker (row, col)
+        @param direction: The direction to be checked
+        @return: True if the worker can build in that direction
+        """
+        cell = self.tables.cell_of(position)
+        index = DIRECTION_INDEX.get(direction)
+        if index is None:
+            return False
+
+        target = self.tables.steps[cell][index]
+        return target >= 0 and bool(self.build_targets(cell) >> target & 1)
+
+    def has_moves(self, position):
+        """
+        @brief Checks if the move target mask of the position is non-empty
+        @param position: The position of the worker (row, col)
+        @return: True if at least one direction is a legal move
+        """
+        return self.move_targets(self.tables.cell_of(position)) != 0
+
+    def add_level(self, position):
+        """
+        @brief Adds a level to the building, clearing its bit from one mask
+        @param position: The position of the building (row, col)
+        @return: None
+        """
+        cell = self.tables.cell_of(position)
+        level = self.heights[cell]
+        keys = self.keys.level[cell]
+        self.hash ^= keys[level] ^ keys[level + 1]
+        self.heights[cell] = level + 1
+        self.below[level + 1] &= ~(1 << cell)
+        self.stale |= 1 << cell
+
+    def remove_level(self, position):
+        """
+        @brief Takes back the top level of the building
+        @param position: The position of the building (row, col)
+        @return: None
+        """
+        cell = self.tables.cell_of(position)
+        level = self.heights[cell] - 1
+        keys = self.keys.level[cell]
+        self.hash ^= keys[level + 1] ^ keys[level]
+        self.heights[cell] = level
+        self.below[level + 1] |= 1 << cell
+        self.stale |= 1 << cell
+
+    @classmethod
+    def from_board(cls, board):
+        """
+        @brief Builds a bitboard copy of any board, e.g. for a search to play
+               moves on without touching the game's own board
+        @param board: The Board (or BitBoard) to copy
+        @return: A new BitBoard with the same buildings and workers
+        """
+        clone = cls(dict(board.worker_positions), board.size, board.owners)
+        heights = board.get_heights()
+        size = board.size
+        clone.grid = [heights[row * size:(row + 1) * size]
+                      for row in range(size)]
+        clone.hash = clone.compute_hash()
+        clone.compute_scores()
+        clone.compute_mobility()
+        return clone
+
+    def legal_turns(self, worker_ids):
+        """
+        @brief Lists every legal move and build of the given workers
+        @param worker_ids: The IDs of the workers of the side to move
+        @return: A list of (worker_id, move_cell, build_cell) turns
+        """
+        neighbours = self.tables.neighbours
+        buildable = self.below[4]
+
+        turns = []
+        for worker_id in worker_ids:
+            origin = self.worker_cells[worker_id]
+            for target in iter_cells(self.move_targets(origin)):
+                # Once the worker has moved its old cell is free to build on
+                occupied = self.occupied & ~(1 << origin) | (1 << target)
+                for build in iter_cells(neighbours[target] & buildable
+                                        & ~occupied):
+                    turns.append((worker_id, target, build))
+        return turns
+
+    def play_turn(self, turn):
+        """
+        @brief Moves a worker and builds without any legality checks
+        @param turn: (worker_id, move_cell, build_cell)
+        @return: The cell the worker moved from, for undo_turn
+        """
+        worker_id, target, build = turn
+        positions = self.tables.positions
+        origin = self.worker_cells[worker_id]
+        self.update_worker_position(worker_id, positions[target])
+        self.add_level(positions[build])
+        return origin
+
+    def undo_turn(self, turn, origin):
+        """
+        @brief Takes back a turn played by play_turn
+        @param turn: (worker_id, move_cell, build_cell)
+        @param origin: The cell the worker moved from
+        @return: None
+        """
+        worker_id, _, build = turn
+        positions = self.tables.positions
+        self.remove_level(positions[build])
+        self.update_worker_position(worker_id, positions[origin])
@@ -0,0 +1,217 @@
+"""Opening book for the fixed start position.
+
+Every game starts from the same worker layout, so the first turns can be
+searched once, offline and deeper than a player could afford, and looked up
+afterwards. The book covers every position in the first few plies where one
+side has only played book turns, whatever the other side did, so a book
+player stays in book against any opponent.
+
+A book file is a header followed by fixed-size records of (Zobrist hash of
+the position with the side to move, packed best turn), sorted by hash.
+"""
+import argparse
+import functools
+import logging
+import multiprocessing
+import struct
+import time
+
+from bitboard import BitBoard
+from player import SCORE_WEIGHTS
+from search import Searcher, TranspositionTable
+from santorini import Santorini
+from state import GameState
+from tables import DEFAULT_SIZE
+from zobrist import WORKER_IDS
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SANTBOOK'
+# Magic, board size, number of records
+HEADER = struct.Struct('<8sBxxxI')
+# Position key and its best turn: worker index, move cell, build cell
+RECORD = struct.Struct('<QI')
+
+# Worker IDs of side 0 and side 1
+SIDES = [WORKER_IDS[:2], WORKER_IDS[2:]]
+
+
+def pack_turn(turn):
+    """
+    @brief Packs a (worker_id, move_cell, build_cell) turn into an int
+    @param turn: The turn
+    @return: The packed turn
+    """
+    worker_id, target, build = turn
+    return WORKER_IDS.index(worker_id) << 16 | target << 8 | build
+
+
+def unpack_turn(value):
+    """
+    @brief Unpacks a turn written by pack_turn
+    @param value: The packed turn
+    @return: (worker_id, move_cell, build_cell)
+    """
+    return WORKER_IDS[value >> 16], value >> 8 & 0xFF, value & 0xFF
+
+
+def _search_position(job):
+    """
+    @brief Pool entry point that searches one book position
+    @param job: (packed GameState, size, depth, time limit or None)
+    @return: The best (worker_id, move_cell, build_cell) turn, or None
+    """
+    value, size, depth, time_limit = job
+    state = GameState(value, size)
+    searcher = Searcher(state.to_board(bitboard=True), SIDES, SCORE_WEIGHTS,
+                        TranspositionTable())
+    turn, _, _ = searcher.search(state.side, depth, time_limit)
+    return turn
+
+
+def build_book(plies=3, depth=4, time_limit=None, processes=None,
+               size=DEFAULT_SIZE):
+    """
+    @brief Searches every book position of the first plies of the game
+    @param plies: The number of plies the book covers
+    @param depth: The search depth of each book position, in plies
+    @param time_limit: Seconds to search each position for, or None
+    @param processes: Pool size, None for one process per CPU, or 1 to
+                      search in this process
+    @param size: The number of rows (and columns) of the board
+    @return: Dictionary mapping position keys to best turns
+    """
+    game = Santorini(True, size)
+    board = game.board
+    side_key = board.keys.side
+
+    # Each position remembers which sides have only played book turns
+    # getting there; only those sides need a book turn at it
+    level = {game.get_hash(): (board, 0, {0, 1})}
+    book = {}
+    pool = multiprocessing.Pool(processes) if processes != 1 else None
+    try:
+        for ply in range(plies):
+            keys = [key for key, (_, side, sides) in level.items()
+                    if side in sides]
+            jobs = [(GameState.from_board(level[key][0], level[key][1]).value,
+                     size, depth, time_limit) for key in keys]
+            turns = (pool.map(_search_position, jobs) if pool
+                     else map(_search_position, jobs))
+            for key, turn in zip(keys, turns):
+                if turn is not None:
+                    book[key] = turn
+            logger.info("ply %d: %d positions, %d searched", ply, len(level),
+                        len(keys))
+            if ply == plies - 1:
+                break
+
+            following = {}
+            for key, (board, side, sides) in level.items():
+                for turn in board.legal_turns(SIDES[side]):
+                    if board.heights[turn[1]] == 3:
+                        # The game is over after a winning move
+                        continue
+                    # A side leaving the book is no longer followed
+                    kept = sides if book.get(key) == turn else sides - {side}
+                    if not kept:
+                        continue
+                    child = BitBoard.from_board(board)
+                    child.play_turn(turn)
+                    child_key = child.hash ^ (0 if side else side_key)
+                    if child_key in following:
+                        following[child_key][2].update(kept)
+                    else:
+                        following[child_key] = (child, 1 - side, set(kept))
+            level = following
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return book
+
+
+def write_book(path, book, size=DEFAULT_SIZE):
+    """
+    @brief Writes a book as records sorted by position key
+    @param path: The file to write
+    @param book: Dictionary mapping position keys to best turns
+    @param size: The number of rows (and columns) of the board
+    @return: The number of bytes written
+    """
+    data = bytearray(HEADER.pack(MAGIC, size, len(book)))
+    for key in sorted(book):
+        data += RECORD.pack(key, pack_turn(book[key]))
+    with open(path, 'wb') as book_file:
+        book_file.write(data)
+    return len(data)
+
+
+class OpeningBook:
+    """Best turns of the book positions, read from a book file."""
+
+    def __init__(self, path):
+        """
+        @brief Reads a book file written by write_book
+        @param path: The file to read
+        @return: None
+        """
+        self.path = path
+        with open(path, 'rb') as book_file:
+            data = book_file.read()
+        magic, self.size, count = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an opening book file")
+        self.turns = {key: unpack_turn(value) for key, value
+                      in RECORD.iter_unpack(data[HEADER.size:])}
+
+    def __reduce__(self):
+        # Other processes read the same file
+        return (OpeningBook, (self.path,))
+
+    def lookup(self, board, side):
+        """
+        @brief Finds the book turn of a position
+        @param board: A Board or BitBoard
+        @param side: The side to move, 0 for white and 1 for blue
+        @return: A (worker_id, move_cell, build_cell) turn, or None if the
+                 position is not in the book
+        """
+        if board.size != self.size:
+            return None
+        return self.turns.get(board.hash ^ (board.keys.side if side else 0))
+
+
+@functools.lru_cache(maxsize=None)
+def open_book(path):
+    """
+    @brief Reads a book file once per process
+    @param path: The file to read
+    @return: The shared OpeningBook for that file
+    """
+    return OpeningBook(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build an opening book')
+    parser.add_argument('path', help='book file to write')
+    parser.add_argument('--plies', type=int, default=3,
+                        help='number of plies the book covers')
+    parser.add_argument('--depth', type=int, default=4,
+                        help='search depth of each book position')
+    parser.add_argument('--time', type=float, default=None,
+                        help='seconds to search each position for')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE,
+                        help='number of rows and columns of the board')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger('search').setLevel(logging.WARNING)
+    start = time.perf_counter()
+    book = build_book(args.plies, args.depth, args.time, args.processes,
+                      args.size)
+    written = write_book(args.path, book, args.size)
+    logger.info("%d positions, %d bytes in %.1fs", len(book), written,
+                time.perf_counter() - start)
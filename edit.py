@@ -1,60 +1,141 @@
-import copy
-from board import Board
+from array import array
 
 class Edit:
-    
+    """
+    Undo/redo history stored as one packed int per turn: the index of the
+    worker that moved, the cell it left, the cell it moved to and the cell
+    it built on. Undo and redo replay a single turn on the game's own board.
+    """
+
     def __init__(self):
-        self.board_hist = []
+        self.turns = array('I')
+        self._length = 0
+        self._undo_counter = 0
+        self._game = None
+
+    def _start(self, game):
+        """
+        @brief: Starts an empty history at the game's current position
+        @param game: an instance of Santorini
+        @return: None
+        """
+        board = game.get_board()
+        self._game = game
+        self._worker_ids = sorted(board.worker_positions)
+        self._bits = board.tables.cells.bit_length()
+        self._mask = (1 << self._bits) - 1
+        self.turns = array('I' if 2 + 3 * self._bits <= 32 else 'Q')
         self._length = 0
         self._undo_counter = 0
+        self._snapshot(board)
+
+    def _snapshot(self, board):
+        """
+        @brief: Remembers the cells and heights of the last recorded position,
+                which the next turn is compared against
+        @param board: The game's board
+        @return: None
+        """
+        cell_of = board.tables.cell_of
+        self._cells = [cell_of(board.worker_positions[worker_id])
+                       for worker_id in self._worker_ids]
+        self._heights = bytearray(board.get_building_level(row, col)
+                                  for row, col in board.tables.positions)
 
     def record_move(self, game):
         """
-        @brief: Creates a copy of the current board and worker positions
+        @brief: Records the turn played since the last call as a delta
         @param game: an instance of Santorini
         @return: None
         """
-        old_board = game.get_board()
-        new_board = copy.deepcopy(old_board)
-        self.board_hist.append((new_board, game.get_worker_positions()))
+        if game is not self._game:
+            self._start(game)
+        else:
+            board = game.get_board()
+            old_cells, old_heights = self._cells, self._heights
+            self._snapshot(board)
+
+            index = next(i for i, cell in enumerate(self._cells)
+                         if cell != old_cells[i])
+            build = next(cell for cell, height in enumerate(self._heights)
+                         if height != old_heights[cell])
+
+            bits = self._bits
+            self.turns.append((((index << bits | old_cells[index]) << bits
+                                | self._cells[index]) << bits) | build)
         self._length += 1
         self._undo_counter += 1
 
+    def _unpack(self, turn):
+        """
+        @brief: Splits a recorded turn into its fields
+        @param turn: A packed turn from self.turns
+        @return: (worker index, from cell, to cell, build cell)
+        """
+        bits, mask = self._bits, self._mask
+        return (turn >> 3 * bits, turn >> 2 * bits & mask,
+                turn >> bits & mask, turn & mask)
+
+    def _apply(self, worker, cell, build, level_change):
+        """
+        @brief: Puts a worker on a cell and raises or lowers one building on
+                the game's board, keeping the snapshot in step
+        @param worker: The index of the worker in self._worker_ids
+        @param cell: The cell the worker ends up on
+        @param build: The cell of the building to change
+        @param level_change: 1 to redo the build, -1 to take it back
+        @return: None
+        """
+        board = self._game.get_board()
+        positions = board.tables.positions
+        move = {self._worker_ids[worker]: positions[cell]}
+        # The built cell is empty after the move and before the move back,
+        # so the board's scores never see a building change under a worker
+        if level_change > 0:
+            self._game.set_worker_positions(move)
+            board.add_level(positions[build])
+        else:
+            board.remove_level(positions[build])
+            self._game.set_worker_positions(move)
+        self._cells[worker] = cell
+        self._heights[build] += level_change
+
     def undo_move(self):
         """
-        @brief: Undo a move and saves it to board_hist
+        @brief: Takes back the last turn on the game's board
         @param: None
-        @return: A deepcopy of the previous board
+        @return: True if a turn was taken back
         """
         if self._undo_counter > 1:
             self._undo_counter -= 1
-            board, worker_positions = self.board_hist[self._undo_counter - 1]
-            return copy.deepcopy((board, worker_positions))
-        
-        return copy.deepcopy(self.board_hist[0])
+            worker, origin, _, build = self._unpack(
+                self.turns[self._undo_counter - 1])
+            self._apply(worker, origin, build, -1)
+            return True
+        return False
 
     def redo_move(self):
         """
-        @brief: Redo a move and saves it to board_hist
+        @brief: Plays the next taken back turn again on the game's board
         @param: None
-        @Return: A deepcopy of the previous board
+        @Return: True if a turn was played again
         """
         if self._undo_counter < self._length:
+            worker, _, target, build = self._unpack(
+                self.turns[self._undo_counter - 1])
             self._undo_counter += 1
-            board, worker_positions = self.board_hist[self._undo_counter - 1]
-            return copy.deepcopy((board, worker_positions))
-
-        return copy.deepcopy(self.board_hist[self._length - 1])
+            self._apply(worker, target, build, 1)
+            return True
+        return False
 
     def next_move(self):
         """
         @brief: Get's next move, deleting later items in the history
         @param: None
-        @return: A deepcopy of the current board
+        @return: None
         """
-        del self.board_hist[self._undo_counter : self._length]
+        del self.turns[self._undo_counter - 1:]
         self._length = self._undo_counter
-        return copy.deepcopy(self.board_hist[self._length - 1])
 
     def get_move_num(self):
         """
@@ -62,4 +143,4 @@ class Edit:
         @param: None
         @return: Undo counter
         """
-        return self._undo_counter
\ No newline at end of file
+        return self._undo_counter
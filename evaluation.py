@@ -0,0 +1,58 @@
+"""Batched evaluation of candidate worker positions with NumPy.
+
+The heuristic score of a player is 3 * height + 2 * center + 1 * distance
+over its workers. Scoring every candidate move one at a time means moving the
+worker, recomputing the three sums and moving it back; here all candidates are
+scored in one pass over precomputed distance and centre arrays. NumPy is
+optional: without it HAVE_NUMPY is False and callers keep the scalar path.
+"""
+import functools
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from tables import get_tables
+
+HAVE_NUMPY = np is not None
+
+
+@functools.lru_cache(maxsize=None)
+def get_arrays(size):
+    """
+    @brief Obtains the distance and centre tables of a board size as arrays
+    @param size: The number of rows (and columns) of the board
+    @return: (cells x cells distance array, centre array)
+    """
+    tables = get_tables(size)
+    distance = np.array(tables.distance, dtype=np.int32)
+    centre = np.array(tables.centre, dtype=np.int32)
+    return distance, centre
+
+
+def score_positions(board, candidates, opponent_cells, weights):
+    """
+    @brief Scores many placements of one player's workers at once
+    @param board: The board whose building heights are used
+    @param candidates: One list of worker cells per candidate, all the same
+                       length, e.g. the moved worker's target cell and the
+                       cells of the player's other workers
+    @param opponent_cells: The cells of the opponent's workers
+    @param weights: (height, center, distance) weights
+    @return: An int array of weighted scores, one per candidate
+    """
+    distance, centre = get_arrays(board.size)
+    heights = np.array(board.get_heights(), dtype=np.int32)
+    cells = np.array(candidates, dtype=np.intp)
+    c1, c2, c3 = weights
+
+    height = heights[cells].sum(axis=1)
+    center = centre[cells].sum(axis=1)
+
+    # For every candidate and opponent worker, the nearest of the candidate's
+    # workers, summed over the opponent's workers
+    nearest = distance[cells][:, :, opponent_cells].min(axis=1).sum(axis=1)
+    spread = board.tables.distance_base - nearest
+
+    return c1 * height + c2 * center + c3 * spread
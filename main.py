@@ -1,76 +1,82 @@
 """Main interface for the Bank application."""
 import argparse
 import logging
+import random
 from exceptions import *
 
 from santorini import Santorini
-from player import HumanPlayer, RandomPlayer, HeuristicPlayer
-from worker import Worker
+from player import HumanPlayer, create_player
+from book import OpeningBook
 from edit import Edit
+from record import RecordWriter, encode_move
+from render import NULL_RENDERER, TEXT_RENDERER
+from stats import NOT_TIMED, TurnStats
+from tablebase import Tablebase
+from tables import DEFAULT_SIZE
 
 class SantoriniCLI:
     """Driver class for a command-line interface to the Santorini application"""
 
-    def __init__(self, white, blue, undo, score):
+    def __init__(self, white, blue, undo, score, bitboard=False,
+                 size=DEFAULT_SIZE, tablebase=None, book=None, record=None,
+                 seed=None, stats=False, stats_path=None, quiet=False,
+                 root_processes=None, ponder=False, time_limit=None):
         self.play_again = True
         self.white = white
         self.blue = blue
         self.undo = undo
         self.score = score
+        self.bitboard = bitboard
+        self.size = size
+        self.tablebase = tablebase
+        self.book = book
         self.edit = Edit() if undo == 'on' else None
+        # A RecordWriter the games are saved to, if any
+        self.record = record
+        self.seed = seed
+        # Record bytes of the turns undone, last undone at the end
+        self.undone = []
+        # Whether to time each phase of the turns, and the file to append
+        # each game's report to as JSON
+        self.stats_enabled = stats or stats_path is not None
+        self.stats_path = stats_path
+        self.stats = None
+        # Where the board, turns and moves are written
+        self.renderer = NULL_RENDERER if quiet else TEXT_RENDERER
+        # Processes the search players split their root moves across
+        self.root_processes = root_processes
+        # Whether AI players think while a human opponent picks a turn
+        self.ponder = ponder
+        # Seconds each AI turn may take, or None for the player types' own
+        # limits, and per player_id the turns timed against its player's
+        # limit and the turns over it
+        self.time_limit = time_limit
+        self.timed_turns = {}
+        self.misses = {}
     
     def create_player(self, player_type, player_id):
         """
         @brief Creates different types of players based on player input
-        @param player_type: Input can be human, random, or heuristic
+        @param player_type: Input can be human, random, heuristic, search,
+                            or mcts
         @param player_id: white or blue player
         @return: The type of player initialized
         """
-        if player_type == 'human':
-            if player_id == 'white':
-                return HumanPlayer('white', {'A': Worker('A',
-                                                         self.game.board,
-                                                         'white', (3, 1)),
-                                            'B': Worker('B',
-                                                        self.game.board,
-                                                        'white', (1, 3))})
-            elif player_id == 'blue':
-                return HumanPlayer('blue', {'Y': Worker('Y',
-                                                        self.game.board,
-                                                        'blue', (1, 1)),
-                                            'Z': Worker('Z',
-                                                        self.game.board,
-                                                        'blue', (3, 3))})
-        elif player_type == 'random':
-            if player_id == 'white':
-                return RandomPlayer('white', {'A': Worker('A',
-                                                          self.game.board,
-                                                          'white', (3, 1)),
-                                            'B': Worker('B',
-                                                        self.game.board,
-                                                        'white', (1, 3))})
-            elif player_id == 'blue':
-                return RandomPlayer('blue', {'Y': Worker('Y', 
-                                                         self.game.board,
-                                                         'blue', (1, 1)),
-                                            'Z': Worker('Z',
-                                                        self.game.board,
-                                                        'blue', (3, 3))})
-        elif player_type == 'heuristic':
-            if player_id == 'white':
-                return HeuristicPlayer('white', {'A': Worker('A',
-                                                             self.game.board,
-                                                             'white', (3, 1)),
-                                                'B': Worker('B',
-                                                            self.game.board,
-                                                            'white', (1, 3))})
-            elif player_id == 'blue':
-                return HeuristicPlayer('blue', {'Y': Worker('Y',
-                                                            self.game.board,
-                                                            'blue', (1, 1)),
-                                                'Z': Worker('Z',
-                                                            self.game.board,
-                                                            'blue', (3, 3))})
+        return create_player(player_type, player_id, self.game.board,
+                             self.rng, tablebase=self.tablebase,
+                             book=self.book,
+                             root_processes=self.root_processes,
+                             time_limit=self.time_limit)
+
+    def timed(self, phase):
+        """
+        @brief Times a phase of the game loop when stats are on
+        @param phase: A name from stats.TURN_PHASES
+        @return: A context manager to run the phase in
+        """
+        if self.stats is None:
+            return NOT_TIMED
+        return self.stats.phase(phase)
 
     def get_opponent_workers(self):
         """
@@ -89,17 +95,15 @@ class SantoriniCLI:
         @param: None
         @return: None
         """
-        turn = self.game.turn
-        id = self.game.curr_player.player_id
-        workers = list(self.game.curr_player.workers.keys())
-
-        opponent_workers = self.get_opponent_workers()
+        if not self.renderer.enabled:
+            return
 
-        score = self.game.curr_player.calculate_score(opponent_workers)
+        player = self.game.curr_player
+        score = None
         if self.score == 'on':
-            print(f"Turn: {turn}, {id} ({''.join(workers)}), {score}")
-        else:
-            print(f"Turn: {turn}, {id} ({''.join(workers)})")
+            score = player.calculate_score(self.get_opponent_workers())
+        self.renderer.turn(self.game.turn, player.player_id,
+                           list(player.workers.keys()), score)
 
     def handle_edit(self):
         """
@@ -111,30 +115,34 @@ class SantoriniCLI:
             while True:
                 user_input = input("undo, redo, or next\n")
                 if user_input == 'undo':
-                    if self.game.turn > 1:
-                        board, worker_positions = self.edit.undo_move()
-                        self.game.set_board(board)
-                        self.game.set_worker_positions(worker_positions)
+                    if self.edit.undo_move():
                         self.game.turn -= 1
                         self.game.switch_player()
-                    self.game.board.display_board()
+                        if self.record:
+                            self.undone.append(self.record.take_back())
+                    self.renderer.board(self.game.board)
                     self.display_turn()
                 elif user_input == 'redo':
-                    if self.game.turn < self.edit._length:
-                        board, worker_positions = self.edit.redo_move()
-                        self.game.set_board(board)
-                        self.game.set_worker_positions(worker_positions)
+                    if self.edit.redo_move():
                         self.game.turn += 1
                         self.game.switch_player()
-                    self.game.board.display_board()
+                        if self.record:
+                            self.record.add_turn(self.undone.pop())
+                    self.renderer.board(self.game.board)
                     self.display_turn()
                 elif user_input == 'next':
                     self.edit.next_move()
+                    self.undone.clear()
                     break
                 else:
                     raise Exception
 
     def human_move(self):
+        """
+        @brief Prompts for a worker, a move and a build until they are valid
+        @param None
+        @return: The (worker_id, move_direction, build_direction) played
+        """
         # Used to check for invalid directions
         valid_directions = ['n', 'ne', 'e', 'se', 's', 'sw', 'w', 'nw']
         
@@ -168,6 +176,29 @@ class SantoriniCLI:
                                            build_direction,
                                            self.score,
                                            opponent_workers)
+        return worker_id, move_direction, build_direction
+
+    def ai_move(self, opponent_workers):
+        """
+        @brief Plays an AI player's turn and notes whether it ran past the
+               time limit
+        @param opponent_workers: opponent player's workers
+        @return: The (worker_id, move_direction, build_direction) played
+        """
+        player = self.game.curr_player
+        turn, seconds, missed = player.timed_move(self.score,
+                                                  opponent_workers)
+        # Players have limits of their own without --move-time too
+        if player.time_limit is not None:
+            player_id = player.player_id
+            self.timed_turns[player_id] = self.timed_turns.get(player_id,
+                                                               0) + 1
+            self.misses[player_id] = self.misses.get(player_id, 0) + missed
+        if missed:
+            self.renderer.message(
+                f"{player.player_id} took {seconds * 1000:.1f} ms, over its "
+                f"{player.time_limit:.3f}s limit")
+        return turn
 
     def run(self):
         """
@@ -177,11 +208,27 @@ class SantoriniCLI:
         """
         # As long as client wants to play again, run the program
         while self.play_again:
-            self.game = Santorini()
+            self.game = Santorini(self.bitboard, self.size)
             self.game.turn = 1
+            # Each game gets its own seed, so a recorded game can be replayed
+            seed = (self.seed if self.seed is not None
+                    else random.getrandbits(64))
+            self.rng = random.Random(seed)
+            self.undone = []
+            self.timed_turns = {}
+            self.misses = {}
+            if self.record:
+                self.record.start_game(self.white, self.blue, seed, self.size)
 
             players = [self.create_player(self.white, 'white'),
                        self.create_player(self.blue, 'blue')]
+            self.stats = TurnStats() if self.stats_enabled else None
+            for player, opponent in zip(players, reversed(players)):
+                player.stats = self.stats
+                player.renderer = self.renderer
+                # Against another AI the threads would only slow both down
+                player.ponder = (self.ponder
+                                 and isinstance(opponent, HumanPlayer))
             
             self.game.player_white = players[0]
             self.game.player_blue = players[1]
@@ -191,53 +238,142 @@ class SantoriniCLI:
             while True:
                 # Save the state before making a move for undo/redo
                 if self.edit:
-                    self.edit.record_move(self.game)
+                    with self.timed('record_move'):
+                        self.edit.record_move(self.game)
 
-                self.game.board.display_board()
-                self.display_turn()
+                with self.timed('render'):
+                    self.renderer.board(self.game.board)
+                    self.display_turn()
 
                 # Shows edit options
                 self.handle_edit()
 
                 # Check for a win
-                if self.game.check_win():
-                    print(f"{self.game.check_win()} has won")
+                with self.timed('check_win'):
+                    winner = self.game.check_win()
+                if winner:
+                    self.renderer.message(f"{winner} has won")
                     break
                 
                 # Check for a loss
-                if self.game.check_loss():
+                with self.timed('check_loss'):
+                    lost = self.game.check_loss()
+                if lost:
                     self.game.switch_player()
-                    print(f"{self.game.curr_player.player_id} has won")
+                    winner = self.game.curr_player.player_id
+                    self.renderer.message(f"{winner} has won")
                     break
                 # print("undoed", self.game.board)
                 opponent_workers = self.get_opponent_workers()
 
                 # Implement move based on player type
-                if isinstance(self.game.curr_player, HumanPlayer):
-                    self.human_move()
-                elif isinstance(self.game.curr_player, RandomPlayer):
-                    self.game.curr_player.make_move(self.score,
-                                                    opponent_workers)
-                elif isinstance(self.game.curr_player, HeuristicPlayer):
-                    self.game.curr_player.make_move(self.score,
-                                                    opponent_workers)
+                with self.timed('make_move'):
+                    if isinstance(self.game.curr_player, HumanPlayer):
+                        turn = self.human_move()
+                    else:
+                        turn = self.ai_move(opponent_workers)
+                if self.record:
+                    self.record.add_turn(encode_move(*turn))
+                if self.stats:
+                    self.stats.end_turn()
 
                 # Switch player for the next turn
                 self.game.turn += 1
                 self.game.switch_player()
                     
+            for player in players:
+                player.stop_pondering()
+            if self.record:
+                self.record.end_game(winner)
+            for player in players:
+                turns = self.timed_turns.get(player.player_id)
+                # Without --move-time only misses of a player type's own
+                # limit are worth a line
+                if turns and (self.time_limit is not None
+                              or self.misses[player.player_id]):
+                    self.renderer.message(
+                        f"{player.player_id} missed its "
+                        f"{player.time_limit:.3f}s limit on "
+                        f"{self.misses[player.player_id]} of {turns} turns")
+            if self.stats:
+                print(self.stats.report())
+                if self.stats_path:
+                    self.stats.dump(self.stats_path, white=self.white,
+                                    blue=self.blue, winner=winner,
+                                    turns=self.game.turn - 1, seed=seed)
+
             again = input("Play again?\n")
             self.play_again = again == 'yes'
 
+def parse_seed(text):
+    """
+    @brief Reads a --seed, which game records store as an unsigned 64-bit
+           int so that every recorded game can be replayed
+    @param text: The argument as typed
+    @return: The seed
+    """
+    seed = int(text)
+    if not 0 <= seed < 1 << 64:
+        raise argparse.ArgumentTypeError(
+            f"{text} is not between 0 and 2**64 - 1")
+    return seed
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Santorini Game')
     parser.add_argument('white', nargs='?', default='human')
     parser.add_argument('blue', nargs='?', default='human')
     parser.add_argument('undo', nargs='?', default='off')
     parser.add_argument('score', nargs='?', default='off')
+    parser.add_argument('--bitboard', action='store_true',
+                        help='store the board in the bitboard engine')
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE,
+                        help='number of rows and columns of the board')
+    parser.add_argument('--tablebase', metavar='PATH',
+                        help='endgame tablebase file for the AI players')
+    parser.add_argument('--book', metavar='PATH',
+                        help='opening book file for the AI players')
+    parser.add_argument('--record', metavar='PATH',
+                        help='append the games to a binary game record file')
+    parser.add_argument('--seed', type=parse_seed, default=None,
+                        help='seed of the AI players\' choices '
+                             '(default: a new random seed per game)')
+    parser.add_argument('--stats', action='store_true',
+                        help='time each phase of the turns and print '
+                             'latency percentiles when a game ends')
+    parser.add_argument('--stats-json', metavar='PATH',
+                        help='also append each game\'s timings to PATH as '
+                             'a line of JSON')
+    parser.add_argument('--parallel', type=int, metavar='N', default=None,
+                        help='split the search players\' root moves across '
+                             'N processes')
+    parser.add_argument('--ponder', action='store_true',
+                        help='let the AI players think while a human '
+                             'opponent picks a turn')
+    parser.add_argument('--move-time', type=float, metavar='SECONDS',
+                        default=None,
+                        help='time limit of every AI turn; turns over it are '
+                             'reported')
+    parser.add_argument('--quiet', action='store_true',
+                        help='write nothing but the prompts, e.g. for '
+                             'bot-vs-bot games')
+    parser.add_argument('--verbose', action='store_true',
+                        help='log search statistics such as nodes/sec and playouts/sec')
 
     args = parser.parse_args()
+    if args.verbose:
+        logging.basicConfig(level=logging.INFO)
+    record = None
     try:
-        SantoriniCLI(args.white, args.blue, args.undo, args.score).run()
+        tablebase = Tablebase(args.tablebase) if args.tablebase else None
+        book = OpeningBook(args.book) if args.book else None
+        record = RecordWriter(args.record) if args.record else None
+        SantoriniCLI(args.white, args.blue, args.undo, args.score,
+                     args.bitboard, args.size, tablebase, book, record,
+                     args.seed, args.stats, args.stats_json,
+                     args.quiet, args.parallel, args.ponder,
+                     args.move_time).run()
     except Exception as e:
-        logging.error("%s: '%s'", type(e).__name__, str(e))
\ No newline at end of file
+        logging.error("%s: '%s'", type(e).__name__, str(e))
+    finally:
+        if record:
+            record.close()
\ No newline at end of file
@@ -0,0 +1,278 @@
+"""Monte Carlo Tree Search over full Santorini turns.
+
+Each tree node is the position after one (worker_id, move_cell, build_cell)
+turn. Selection uses UCT, leaves are scored by random playouts on a private
+BitBoard, and every node remembers its position hash so the subtree under the
+opponent's actual reply can be kept for the next search.
+"""
+import logging
+import math
+import random
+import time
+
+from bitboard import BitBoard, iter_cells
+
+logger = logging.getLogger(__name__)
+
+
+class Node:
+    """A position in the search tree and the statistics of its playouts."""
+
+    __slots__ = ('turn', 'parent', 'children', 'untried', 'visits', 'wins',
+                 'mover', 'key', 'winner')
+
+    def __init__(self, turn, parent, mover, key):
+        """
+        @brief Makes an unexpanded node
+        @param turn: The turn that leads here from parent, None at the root
+        @param parent: The parent Node, None at the root
+        @param mover: The side (0 white, 1 blue) that played turn
+        @param key: The Zobrist hash of the position, side to move included
+        @return: None
+        """
+        self.turn = turn
+        self.parent = parent
+        self.children = []
+        self.untried = None
+        self.visits = 0
+        # Playouts won by mover, so a parent picks the child best for it
+        self.wins = 0.0
+        self.mover = mover
+        self.key = key
+        # The side that has already won here, or None if play goes on
+        self.winner = None
+
+
+class MCTS:
+    """UCT search that keeps its tree between turns."""
+
+    def __init__(self, sides, exploration=1.4, rng=random):
+        """
+        @brief Sets up an empty tree
+        @param sides: [white worker IDs, blue worker IDs]
+        @param exploration: The UCT exploration constant
+        @param rng: The random number generator used for playouts
+        @return: None
+        """
+        self.sides = sides
+        self.exploration = exploration
+        self.rng = rng
+        self.root = None
+        self.board = None
+        self.playouts = 0
+        self.playouts_per_second = 0.0
+
+    def position_key(self, side):
+        """
+        @brief Hashes the search board with the side to move
+        @param side: The side to move, 0 for white and 1 for blue
+        @return: The 64-bit position hash
+        """
+        return self.board.hash ^ (self.board.keys.side if side else 0)
+
+    def ponder(self, side, stop_event, deadline):
+        """
+        @brief Grows the tree from the root until told to stop, e.g. in a
+               thread while the opponent picks a reply
+        @param side: The side to move at the root
+        @param stop_event: A threading.Event set when it should return
+        @param deadline: The perf_counter time to stop at regardless
+        @return: None
+        """
+        self.playouts = 0
+        while not stop_event.is_set() and time.perf_counter() < deadline:
+            self.iterate(side)
+
+    def set_root(self, board, side):
+        """
+        @brief Points the tree at the current game position, keeping the
+               subtree of the opponent's last turn when it was searched
+        @param board: The game's board, which is copied and left untouched
+        @param side: The side to move, 0 for white and 1 for blue
+        @return: True if an old subtree was reused
+        """
+        self.board = BitBoard.from_board(board)
+        key = self.position_key(side)
+
+        candidates = []
+        if self.root is not None:
+            candidates.append(self.root)
+            candidates.extend(self.root.children)
+        for node in candidates:
+            if node.key == key and node.mover != side:
+                node.parent = None
+                node.turn = None
+                self.root = node
+                return True
+
+        self.root = Node(None, None, 1 - side, key)
+        return False
+
+    def advance(self, turn):
+        """
+        @brief Moves the root down to the child reached by a turn
+        @param turn: The turn that was played from the root
+        @return: None
+        """
+        for child in self.root.children:
+            if child.turn == turn:
+                self.root = child
+                return
+        self.root = None
+
+    def expand(self, node, side):
+        """
+        @brief Adds one untried turn of node as a new child
+        @param node: A node with untried turns, its position on the board
+        @param side: The side to move at node
+        @return: (the new child, the cell its worker moved from); the
+                 child's position is now on the board
+        """
+        index = self.rng.randrange(len(node.untried))
+        turn = node.untried[index]
+        node.untried[index] = node.untried[-1]
+        node.untried.pop()
+
+        winner = side if self.board.heights[turn[1]] == 3 else None
+        origin = self.board.play_turn(turn)
+        child = Node(turn, node, side, self.position_key(1 - side))
+        child.winner = winner
+        node.children.append(child)
+        return child, origin
+
+    def select(self, node):
+        """
+        @brief Picks the child with the highest UCT value
+        @param node: A fully expanded node
+        @return: The selected child
+        """
+        log_visits = math.log(node.visits)
+        exploration = self.exploration
+        return max(node.children,
+                   key=lambda child: child.wins / child.visits
+                   + exploration * math.sqrt(log_visits / child.visits))
+
+    def playout(self, side):
+        """
+        @brief Plays uniformly random moves and builds from the board's
+               position until a side wins, then restores the position
+        @param side: The side to move
+        @return: The winning side
+        """
+        board = self.board
+        heights = board.heights
+        neighbours = board.tables.neighbours
+        choice = self.rng.choice
+        played = []
+
+        while True:
+            moves = [(worker_id, target)
+                     for worker_id in self.sides[side]
+                     for target in iter_cells(
+                         board.move_targets(board.worker_cells[worker_id]))]
+            if not moves:
+                winner = 1 - side
+                break
+
+            worker_id, target = choice(moves)
+            if heights[target] == 3:
+                winner = side
+                break
+
+            origin = board.worker_cells[worker_id]
+            occupied = board.occupied & ~(1 << origin) | (1 << target)
+            build = choice(list(iter_cells(neighbours[target] & board.below[4]
+                                           & ~occupied)))
+            turn = (worker_id, target, build)
+            played.append((turn, board.play_turn(turn)))
+            side = 1 - side
+
+        for turn, origin in reversed(played):
+            board.undo_turn(turn, origin)
+        return winner
+
+    def iterate(self, side):
+        """
+        @brief Runs one selection, expansion, playout and backup
+        @param side: The side to move at the root
+        @return: None
+        """
+        node = self.root
+        path = []
+
+        # Selection: walk down fully expanded nodes
+        while node.winner is None:
+            if node.untried is None:
+                node.untried = self.board.legal_turns(self.sides[side])
+            if node.untried or not node.children:
+                break
+            node = self.select(node)
+            path.append((node.turn, self.board.play_turn(node.turn)))
+            side = 1 - side
+
+        # Expansion and simulation
+        if node.winner is not None:
+            winner = node.winner
+        elif not node.untried:
+            # No legal turn: the side to move is trapped and loses
+            node.winner = winner = 1 - side
+        else:
+            node, origin = self.expand(node, side)
+            path.append((node.turn, origin))
+            winner = node.winner
+            if winner is None:
+                winner = self.playout(1 - side)
+
+        # Backup, then restore the root position
+        while node is not None:
+            node.visits += 1
+            if node.mover == winner:
+                node.wins += 1
+            node = node.parent
+        for turn, origin in reversed(path):
+            self.board.undo_turn(turn, origin)
+        self.playouts += 1
+
+    def search(self, board, side, playouts=None, time_limit=None):
+        """
+        @brief Grows the tree from the game position within a budget
+        @param board: The game's board, which is copied and left untouched
+        @param side: The side to move, 0 for white and 1 for blue
+        @param playouts: The number of playouts to run, or None
+        @param time_limit: Seconds to search for, or None
+        @return: The most visited root turn, or None if there is none
+        """
+        reused = self.set_root(board, side)
+        self.playouts = 0
+        start = time.perf_counter()
+        deadline = None if time_limit is None else start + time_limit
+
+        while True:
+            # The budget only counts once the root has a turn to return
+            if self.root.children or self.root.winner is not None:
+                if playouts is not None and self.playouts >= playouts:
+                    break
+                if deadline is not None and time.perf_counter() > deadline:
+                    break
+                if playouts is None and deadline is None and self.playouts:
+                    break
+            self.iterate(side)
+
+        elapsed = time.perf_counter() - start
+        self.playouts_per_second = self.playouts / elapsed if elapsed else 0.0
+        logger.info("%d playouts in %.3fs (%.0f playouts/sec), "
+                    "root visits %d%s", self.playouts, elapsed,
+                    self.playouts_per_second, self.root.visits,
+                    ", subtree reused" if reused else "")
+
+        return self.best_turn()
+
+    def best_turn(self):
+        """
+        @brief Picks the most visited turn from the root
+        @return: The turn, or None if the root has no children
+        """
+        if not self.root.children:
+            return None
+        best = max(self.root.children, key=lambda child: child.visits)
+        return best.turn
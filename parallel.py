@@ -0,0 +1,246 @@
+"""Parallel root search: the root moves of a search split across processes.
+
+The turns at the root are grouped by move (worker and target cell), and
+each group is one job: a worker process rebuilds the position from its
+GameState, searches the group's builds with a fresh transposition table and
+returns the best. At each depth the last depth's best move is searched
+first, on its own, and its score bounds the window of every other job, the
+way it would bound the rest of a sequential search.
+
+Jobs never share state, so a result depends only on the position and the
+depth. Merging keeps the highest score, ties going to the move searched
+first, so the same turn comes back whatever the number of processes.
+
+Every job measures the CPU time it used, so each search also measures its
+speedup: its jobs' CPU seconds added up, which is about what running them
+one after another in one process would take, over the seconds the search
+took.
+"""
+import argparse
+import concurrent.futures
+import functools
+import logging
+import time
+
+from search import (WIN, WIN_THRESHOLD, Searcher, SearchTimeout,
+                    TranspositionTable)
+from state import GameState
+
+logger = logging.getLogger(__name__)
+
+# log2 of the transposition table size of each job
+JOB_TABLE_BITS = 16
+
+
+def _search_move(job):
+    """
+    @brief Executor entry point that searches the turns of one root move
+    @param job: (packed GameState, size, sides, weights, depth, turns of the
+                 move, score to beat, time.time() to stop at or None)
+    @return: (best score or None if time ran out, best turn, nodes searched,
+             CPU seconds the job used); a score no higher than the score to beat
+             is only an upper bound
+    """
+    start = time.process_time()
+    value, size, sides, weights, depth, turns, alpha, deadline = job
+    state = GameState(value, size)
+    side = state.side
+    searcher = Searcher(state.to_board(bitboard=True), sides, weights,
+                        TranspositionTable(JOB_TABLE_BITS))
+    if deadline is not None:
+        # The wall clock is shared by every process, so a job that waited in
+        # the pool gets only what is left; the search itself uses
+        # perf_counter
+        searcher.deadline = time.perf_counter() + deadline - time.time()
+    board = searcher.board
+
+    # Each build only needs to beat the best so far
+    best_score, best_turn = None, None
+    try:
+        for turn in turns:
+            origin = board.play_turn(turn)
+            try:
+                score = -searcher.negamax(depth - 1, 1, -WIN - 1, -alpha,
+                                          1 - side)[0]
+            finally:
+                board.undo_turn(turn, origin)
+            if best_score is None or score > best_score:
+                best_score, best_turn = score, turn
+            alpha = max(alpha, score)
+    except SearchTimeout:
+        return None, None, searcher.nodes, time.process_time() - start
+    return (best_score, best_turn, searcher.nodes,
+            time.process_time() - start)
+
+
+@functools.lru_cache(maxsize=None)
+def shared_executor(processes):
+    """
+    @brief Starts one process pool per size and keeps it for the process
+    @param processes: The pool size, or None for one process per CPU
+    @return: The ProcessPoolExecutor
+    """
+    return concurrent.futures.ProcessPoolExecutor(processes)
+
+
+class ParallelSearcher:
+    """Iterative deepening search whose root moves run in parallel."""
+
+    def __init__(self, board, sides, weights, processes=None):
+        """
+        @brief Sets up a search of a snapshot of the board
+        @param board: The game's board, which is copied and left untouched
+        @param sides: [white worker IDs, blue worker IDs]
+        @param weights: (height, center, distance) weights of the evaluation
+        @param processes: Pool size, None for one process per CPU, or 1 to
+                          run the jobs in this process
+        @return: None
+        """
+        # Only generates the root turns, so a small table is enough
+        self.root = Searcher(board, sides, weights, TranspositionTable(4))
+        self.sides = sides
+        self.weights = weights
+        self.processes = processes
+        self.nodes = 0
+        self.elapsed = 0.0
+        self.nodes_per_second = 0.0
+        # CPU seconds the last search's jobs used added up, and those over
+        # its elapsed time
+        self.job_seconds = 0.0
+        self.speedup = 0.0
+
+    def run_jobs(self, jobs):
+        """
+        @brief Runs jobs in the pool, or in this process for one process
+        @param jobs: A list of _search_move jobs
+        @return: Their results, in job order
+        """
+        if self.processes == 1:
+            return list(map(_search_move, jobs))
+        return list(shared_executor(self.processes).map(_search_move, jobs))
+
+    def search(self, side, max_depth, time_limit=None):
+        """
+        @brief Deepens the search one ply at a time until max_depth is done
+               or time_limit runs out, keeping the last finished result
+        @param side: The side to move, 0 for white and 1 for blue
+        @param max_depth: The deepest search to run, in plies
+        @param time_limit: Seconds to search for, or None for no limit
+        @return: (best turn or None, its score, deepest completed depth)
+        """
+        start = time.perf_counter()
+        # Jobs run in other processes, so the deadline is on the wall clock
+        deadline = None if time_limit is None else time.time() + time_limit
+        board = self.root.board
+        self.nodes = 0
+        self.job_seconds = 0.0
+
+        turns = self.root.generate(side)
+        if not turns:
+            return None, -WIN, 0
+        for turn in turns:
+            if board.heights[turn[1]] == 3:
+                return turn, WIN - 1, 1
+
+        # Group the builds of each move, in the sequential search's order
+        moves = {}
+        for turn in turns:
+            moves.setdefault(turn[:2], []).append(turn)
+        order = list(moves)
+        value = GameState.from_board(board, side).value
+
+        best_turn, best_score, completed = None, 0, 0
+        for depth in range(1, max_depth + 1):
+            if deadline is not None and time.time() >= deadline:
+                break
+
+            def job(move, alpha):
+                return (value, board.size, self.sides, self.weights, depth,
+                        moves[move], alpha, deadline)
+
+            first = self.run_jobs([job(order[0], -WIN - 1)])
+            if first[0][0] is None:
+                self.nodes += first[0][2]
+                self.job_seconds += first[0][3]
+                break
+            results = first
+            if first[0][0] < WIN_THRESHOLD:
+                if deadline is not None and time.time() >= deadline:
+                    self.nodes += first[0][2]
+                    self.job_seconds += first[0][3]
+                    break
+                results += self.run_jobs([job(move, first[0][0])
+                                          for move in order[1:]])
+            self.nodes += sum(nodes for _, _, nodes, _ in results)
+            self.job_seconds += sum(seconds for _, _, _, seconds in results)
+            if any(score is None for score, _, _, _ in results):
+                break
+
+            # Only a higher score replaces a move searched earlier
+            score, turn, _, _ = results[0]
+            for result_score, result_turn, _, _ in results[1:]:
+                if result_score > score:
+                    score, turn = result_score, result_turn
+            best_turn, best_score, completed = turn, score, depth
+            if abs(score) >= WIN_THRESHOLD:
+                # A forced result will not change with more depth
+                break
+
+            # The best move is searched first at the next depth
+            order.remove(turn[:2])
+            order.insert(0, turn[:2])
+
+        if best_turn is None:
+            # Not even depth 1 finished in time, so play the best guess
+            best_turn = turns[0]
+
+        self.elapsed = time.perf_counter() - start
+        self.nodes_per_second = (self.nodes / self.elapsed
+                                 if self.elapsed else 0.0)
+        self.speedup = (self.job_seconds / self.elapsed
+                        if self.elapsed else 0.0)
+        logger.info("parallel depth %d, score %d: %d nodes in %d jobs on %s "
+                    "processes, %.3fs (%.0f nodes/sec, %.2fx speedup)",
+                    completed, best_score, self.nodes, len(moves),
+                    self.processes or 'all', self.elapsed,
+                    self.nodes_per_second, self.speedup)
+        return best_turn, best_score, completed
+
+
+if __name__ == "__main__":
+    import bench
+    from player import SCORE_WEIGHTS
+    from zobrist import WORKER_IDS
+
+    parser = argparse.ArgumentParser(
+        description='Speedup of the parallel root search over one process')
+    parser.add_argument('-d', '--depth', type=int, default=4,
+                        help='depth to search each position to')
+    parser.add_argument('-j', '--processes', type=int, nargs='+',
+                        default=[1, 2, 4],
+                        help='process counts to time, 1 being the baseline')
+    parser.add_argument('-p', '--position', action='append',
+                        choices=['start'] + sorted(bench.POSITIONS),
+                        help='position to search (default: all)')
+
+    args = parser.parse_args()
+    sides = [WORKER_IDS[:2], WORKER_IDS[2:]]
+    names = args.position or ['start'] + sorted(bench.POSITIONS)
+    counts = sorted(set(args.processes) | {1})
+    for name in names:
+        state = bench.position_state(name)
+        board = state.to_board(bitboard=True)
+        baseline = None
+        for processes in counts:
+            searcher = ParallelSearcher(board, sides, SCORE_WEIGHTS,
+                                        processes)
+            if processes != 1:
+                # Start the pool before timing
+                shared_executor(processes).submit(int).result()
+            turn, score, _ = searcher.search(state.side, args.depth)
+            if baseline is None:
+                baseline = searcher.elapsed
+            speedup = baseline / searcher.elapsed if searcher.elapsed else 1.0
+            print(f"{name} depth {args.depth}, {processes} processes: "
+                  f"{turn} score {score}, {searcher.nodes} nodes in "
+                  f"{searcher.elapsed:.2f}s, speedup {speedup:.2f}x")
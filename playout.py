@@ -0,0 +1,230 @@
+"""Lockstep random playouts of many games at once with NumPy.
+
+G games are held as arrays, heights shaped (G, size, size) and worker cells
+shaped (G, 4) in WORKER_IDS order, and every step plays one uniformly random
+legal turn in each unfinished game. The turns are the same ones
+rules.legal_turns yields, a worker standing on level 3 wins as in
+Santorini.check_win, and a side with no legal turn loses as in check_loss.
+"""
+import argparse
+import logging
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from tables import DEFAULT_SIZE, get_tables
+from zobrist import WORKER_IDS
+
+logger = logging.getLogger(__name__)
+
+# Moves per worker times builds per move, one slot per encoded rules turn
+TURNS_PER_SIDE = 2 * 8 * 8
+
+
+class LockstepPlayouts:
+    """A batch of games that all advance one random turn per step."""
+
+    def __init__(self, heights, cells, side, size=DEFAULT_SIZE, seed=None):
+        """
+        @brief Sets up a batch from arrays of positions
+        @param heights: Building levels, shaped (G, size, size)
+        @param cells: Worker cells in WORKER_IDS order, shaped (G, 4)
+        @param side: The side to move in each game, 0 for white and 1 for
+                     blue, shaped (G,)
+        @param size: The number of rows (and columns) of the board
+        @param seed: The seed of the batch's NumPy random generator
+        @return: None
+        """
+        if np is None:
+            raise ImportError("lockstep playouts need NumPy")
+
+        tables = get_tables(size)
+        cells_count = tables.cells
+        games = len(cells)
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+
+        # Off-board steps point at an extra cell that holds a dome, so they
+        # fail the same height checks as a domed cell
+        steps = np.array(tables.steps, dtype=np.intp)
+        steps[steps < 0] = cells_count
+        self.steps = np.vstack([steps, np.full((1, 8), cells_count,
+                                               dtype=np.intp)])
+
+        self.flat = np.full((games, cells_count + 1), 4, dtype=np.int8)
+        self.flat[:, :cells_count] = np.asarray(heights).reshape(games, -1)
+        self.cells = np.array(cells, dtype=np.intp)
+        self.side = np.array(side, dtype=np.int8)
+        self.turns = np.zeros(games, dtype=np.int32)
+        # The winning side of each game, or -1 while it goes on
+        self.winner = np.full(games, -1, dtype=np.int8)
+        self.playouts_per_second = 0.0
+
+        # A worker already on level 3 has won, checked white first
+        rows = np.arange(games)
+        on_top = self.flat[rows[:, None], self.cells] == 3
+        for side_id in (1, 0):
+            won = on_top[:, 2 * side_id:2 * side_id + 2].any(axis=1)
+            self.winner[won] = side_id
+
+    @property
+    def heights(self):
+        """
+        @brief Obtains the building levels of every game
+        @return: An array shaped (G, size, size)
+        """
+        size = self.size
+        return self.flat[:, :size * size].reshape(-1, size, size)
+
+    @classmethod
+    def from_board(cls, board, side, games, seed=None):
+        """
+        @brief Sets up G copies of one position, e.g. to roll it out
+        @param board: A Board or BitBoard, which is only read
+        @param side: The side to move, 0 for white and 1 for blue
+        @param games: The number of copies
+        @param seed: The seed of the batch's NumPy random generator
+        @return: A new LockstepPlayouts
+        """
+        cell_of = board.tables.cell_of
+        cells = [cell_of(board.worker_positions[worker_id])
+                 for worker_id in WORKER_IDS]
+        heights = np.array(board.get_heights()).reshape(board.size,
+                                                        board.size)
+        return cls(np.broadcast_to(heights, (games, board.size, board.size)),
+                   np.tile(cells, (games, 1)), np.full(games, side),
+                   board.size, seed)
+
+    @classmethod
+    def from_states(cls, states, seed=None):
+        """
+        @brief Sets up one game per GameState
+        @param states: A non-empty list of GameStates of the same size
+        @param seed: The seed of the batch's NumPy random generator
+        @return: A new LockstepPlayouts
+        """
+        heights = [state.heights for state in states]
+        cells = [[state.worker_cells[worker_id] for worker_id in WORKER_IDS]
+                 for state in states]
+        return cls(np.array(heights), cells, [state.side for state in states],
+                   states[0].size, seed)
+
+    def legal_mask(self, games):
+        """
+        @brief Finds every legal turn of the side to move in some games
+        @param games: Indices of the games to look at
+        @return: (bool array shaped (n, 128) indexed by the rules turn
+                 encoding, move targets shaped (n, 2, 8), build cells
+                 shaped (n, 2, 8, 8))
+        """
+        count = len(games)
+        rows = np.arange(count)
+        flat = self.flat[games]
+        cells = self.cells[games]
+        own = cells[rows[:, None],
+                    2 * self.side[games, None].astype(np.intp) + [0, 1]]
+
+        # Moves: on the board, free, not domed, at most one level up
+        targets = self.steps[own]
+        target_heights = flat[rows[:, None, None], targets]
+        free = (targets[..., None] != cells[:, None, None, :]).all(axis=-1)
+        own_heights = flat[rows[:, None], own]
+        can_move = (free & (target_heights < 4)
+                    & (target_heights <= own_heights[..., None] + 1))
+
+        # Builds: on the board, not domed, and free once the worker has left
+        builds = self.steps[targets]
+        build_heights = flat[rows[:, None, None, None], builds]
+        taken = (builds[..., None] == cells[:, None, None, None, :]).any(axis=-1)
+        taken &= builds != own[:, :, None, None]
+        can_build = (build_heights < 4) & ~taken & can_move[..., None]
+
+        return can_build.reshape(count, TURNS_PER_SIDE), targets, builds
+
+    def step(self):
+        """
+        @brief Plays one random legal turn in every unfinished game
+        @return: The number of games that were still going
+        """
+        games = np.flatnonzero(self.winner < 0)
+        count = len(games)
+        if not count:
+            return 0
+
+        legal, targets, builds = self.legal_mask(games)
+        side = self.side[games]
+
+        # A side without a legal turn is trapped and loses
+        trapped = ~legal.any(axis=1)
+        self.winner[games[trapped]] = 1 - side[trapped]
+
+        # argmax of random keys over the legal turns is a uniform choice
+        keys = self.rng.random((count, TURNS_PER_SIDE))
+        keys[~legal] = -1.0
+        turn = keys.argmax(axis=1)
+        slot, move, build = turn >> 6, turn >> 3 & 7, turn & 7
+
+        rows = np.arange(count)
+        target = targets[rows, slot, move]
+        build_cell = builds[rows, slot, move, build]
+        playing = ~trapped
+        moved = games[playing]
+
+        # Moving onto level 3 wins; the build never lands under the worker
+        won = self.flat[games, target] == 3
+        self.winner[games[playing & won]] = side[playing & won]
+
+        self.cells[moved, 2 * side[playing].astype(np.intp) + slot[playing]] = \
+            target[playing]
+        self.flat[moved, build_cell[playing]] += 1
+        self.turns[moved] += 1
+        self.side[games] = 1 - side
+        return count
+
+    def run(self, max_turns=None):
+        """
+        @brief Plays every game to the end
+        @param max_turns: Steps to stop after, or None to play on until all
+                          games are over
+        @return: The winner array, 0 for white, 1 for blue and -1 for games
+                 stopped by max_turns
+        """
+        games = len(self.winner)
+        start = time.perf_counter()
+        steps = 0
+        while (max_turns is None or steps < max_turns) and self.step():
+            steps += 1
+
+        elapsed = time.perf_counter() - start
+        self.playouts_per_second = games / elapsed if elapsed else 0.0
+        logger.info("%d playouts in %d steps, %.3fs (%.0f playouts/sec)",
+                    games, steps, elapsed, self.playouts_per_second)
+        return self.winner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Lockstep random playouts from the starting position')
+    parser.add_argument('-n', '--games', type=int, default=10000,
+                        help='number of games to play at once')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random generator')
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE,
+                        help='number of rows and columns of the board')
+
+    args = parser.parse_args()
+    start = get_tables(args.size).start_positions
+    cell_of = get_tables(args.size).cell_of
+    cells = [cell_of(start[worker_id]) for worker_id in WORKER_IDS]
+    playouts = LockstepPlayouts(
+        np.zeros((args.games, args.size, args.size), dtype=np.int8),
+        np.tile(cells, (args.games, 1)), np.zeros(args.games), args.size,
+        args.seed)
+    winners = playouts.run()
+    print(f"{args.games} playouts: white won {(winners == 0).sum()}, "
+          f"blue won {(winners == 1).sum()}, mean "
+          f"{playouts.turns.mean():.1f} turns, "
+          f"{playouts.playouts_per_second:.0f} playouts/sec")
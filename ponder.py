@@ -0,0 +1,60 @@
+"""Pondering: a player thinking on the opponent's time.
+
+After an AI player moves, it can keep searching in a background thread
+while a human opponent picks a reply. The thread works on its own copy of
+the board and stops as soon as the player's next make_move starts, which
+then reuses whatever matches the reply actually played. Python threads share
+one interpreter lock, so pondering only pays off while the other side is
+waiting on input, not against another AI in the same process.
+"""
+import threading
+import time
+
+# The longest a player thinks on the opponent's time, in seconds
+PONDER_LIMIT = 60.0
+
+
+class Ponderer:
+    """Runs one pondering function at a time in a daemon thread."""
+
+    def __init__(self):
+        """
+        @brief Makes an idle ponderer
+        @return: None
+        """
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.started = 0.0
+        # Seconds spent by the last pondering thread
+        self.elapsed = 0.0
+
+    def start(self, target, *args):
+        """
+        @brief Stops any running thread and starts target in a new one
+        @param target: The function to run, called with args, then an Event
+                       that is set when it should return, then its deadline
+                       as a perf_counter time
+        @param args: The arguments to pass before the Event
+        @return: None
+        """
+        self.stop()
+        self.stop_event = threading.Event()
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(
+            target=target,
+            args=args + (self.stop_event, self.started + PONDER_LIMIT),
+            name='ponder', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        @brief Asks the running thread to return and waits for it
+        @return: True if a thread was running
+        """
+        if self.thread is None:
+            return False
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        self.elapsed = time.perf_counter() - self.started
+        return True
@@ -0,0 +1,245 @@
+"""Compact binary game records.
+
+A record file is a stream of games. Each game is a header, one byte per
+turn and one closing byte:
+
+- header: the magic b'SG', the board size, the 64-bit seed and the white and
+  blue player types, each as a length byte and ASCII text;
+- turns: the rules.encode_turn value of each turn, below 0x80, with the
+  worker slot counted in the mover's own worker list;
+- closing byte: 0x80 if white won, 0x81 if blue won, 0x82 if the game was
+  stopped.
+
+Turns are written as they are played and games are read back one at a
+time, so neither side ever holds more than one game in memory.
+"""
+import re
+import struct
+
+from rules import decode_turn, encode_turn
+from santorini import Santorini
+from tables import DIRECTIONS, DIRECTION_INDEX
+from zobrist import WORKER_IDS
+
+MAGIC = b'SG'
+HEADER = struct.Struct('<2sBQ')
+
+END = 0x80
+RESULTS = {'white': 0, 'blue': 1, None: 2}
+WINNERS = {value: player_id for player_id, value in RESULTS.items()}
+
+# Worker IDs of white and blue, the side that moves first being white
+SIDES = [WORKER_IDS[:2], WORKER_IDS[2:]]
+
+# Matches the closing byte that ends a game's turns
+_END_BYTE = re.compile(rb'[\x80-\xff]')
+
+
+def encode_move(worker_id, move_direction, build_direction):
+    """
+    @brief Packs a played turn into its record byte
+    @param worker_id: The worker that moved
+    @param move_direction: The direction it moved in
+    @param build_direction: The direction it built in
+    @return: The turn byte, below 0x80
+    """
+    side = SIDES[0] if worker_id in SIDES[0] else SIDES[1]
+    return encode_turn(side.index(worker_id), DIRECTION_INDEX[move_direction],
+                       DIRECTION_INDEX[build_direction])
+
+
+class GameRecord:
+    """One game read from a record file."""
+
+    __slots__ = ('white', 'blue', 'seed', 'size', 'turns', 'winner')
+
+    def __init__(self, white, blue, seed, size, turns, winner):
+        """
+        @brief Holds the parts of a record
+        @param white: The player type of white
+        @param blue: The player type of blue
+        @param seed: The seed the game's players were given
+        @param size: The number of rows (and columns) of the board
+        @param turns: bytes, one per turn
+        @param winner: 'white', 'blue', or None if the game was stopped
+        @return: None
+        """
+        self.white = white
+        self.blue = blue
+        self.seed = seed
+        self.size = size
+        self.turns = turns
+        self.winner = winner
+
+    def moves(self):
+        """
+        @brief Spells out the turns the way the players display them
+        @return: A generator of (worker_id, move_direction, build_direction)
+        """
+        for ply, turn in enumerate(self.turns):
+            slot, move_index, build_index = decode_turn(turn)
+            yield (SIDES[ply & 1][slot], DIRECTIONS[move_index],
+                   DIRECTIONS[build_index])
+
+    def replay(self, bitboard=True):
+        """
+        @brief Plays the game again from the start position
+        @param bitboard: True to play on the bitboard engine
+        @return: A generator of the game after each turn; the same Santorini
+                 object is yielded every time
+        """
+        game = Santorini(bitboard, self.size)
+        for worker_id, move_direction, build_direction in self.moves():
+            worker = game.curr_player.workers[worker_id]
+            worker.move(move_direction)
+            worker.build(build_direction)
+            game.switch_player()
+            yield game
+
+
+class RecordWriter:
+    """Appends games to a record file one turn at a time."""
+
+    def __init__(self, path):
+        """
+        @brief Opens a record file for appending
+        @param path: The file to write
+        @return: None
+        """
+        self.file = open(path, 'ab')
+        self.playing = False
+
+    def close(self):
+        """
+        @brief Closes the file, marking an unfinished game as stopped
+        @return: None
+        """
+        if self.playing:
+            self.end_game(None)
+        self.file.close()
+
+    def start_game(self, white, blue, seed, size):
+        """
+        @brief Writes the header of a new game
+        @param white: The player type of white
+        @param blue: The player type of blue
+        @param seed: The seed the game's players were given
+        @param size: The number of rows (and columns) of the board
+        @return: None
+        """
+        if self.playing:
+            self.end_game(None)
+        data = bytearray(HEADER.pack(MAGIC, size, seed))
+        for player_type in (white, blue):
+            name = player_type.encode('ascii')
+            data.append(len(name))
+            data += name
+        self.file.write(data)
+        self.playing = True
+
+    def add_turn(self, turn):
+        """
+        @brief Writes one turn of the current game
+        @param turn: The turn byte from encode_move
+        @return: None
+        """
+        self.file.write(bytes((turn,)))
+        self.file.flush()
+
+    def take_back(self):
+        """
+        @brief Removes the last turn written, e.g. when it is undone
+        @return: The turn byte removed
+        """
+        self.file.flush()
+        end = self.file.tell()
+        self.file.seek(end - 1)
+        with open(self.file.name, 'rb') as reader:
+            reader.seek(end - 1)
+            turn = reader.read(1)[0]
+        self.file.truncate(end - 1)
+        self.file.seek(0, 2)
+        return turn
+
+    def end_game(self, winner):
+        """
+        @brief Writes the closing byte of the current game
+        @param winner: 'white', 'blue', or None if the game was stopped
+        @return: None
+        """
+        self.file.write(bytes((END | RESULTS[winner],)))
+        self.file.flush()
+        self.playing = False
+
+    def write_game(self, white, blue, seed, size, turns, winner):
+        """
+        @brief Writes a whole game at once
+        @param white: The player type of white
+        @param blue: The player type of blue
+        @param seed: The seed the game's players were given
+        @param size: The number of rows (and columns) of the board
+        @param turns: bytes, one per turn
+        @param winner: 'white', 'blue', or None if the game was stopped
+        @return: None
+        """
+        self.start_game(white, blue, seed, size)
+        self.file.write(turns)
+        self.end_game(winner)
+
+
+def read_records(path, chunk_size=1 << 16):
+    """
+    @brief Reads the games of a record file one at a time
+    @param path: The file to read
+    @param chunk_size: The number of bytes read from disk at once
+    @return: A generator of GameRecords; a last game cut off by the end of
+             the file is yielded as stopped, or skipped if it is cut off
+             before both player types
+    """
+    with open(path, 'rb') as record_file:
+        buf = b''
+        pos = 0
+        eof = False
+
+        def fill(count):
+            """Makes sure count unread bytes are buffered, if the file has them"""
+            nonlocal buf, pos, eof
+            while len(buf) - pos < count and not eof:
+                chunk = record_file.read(chunk_size)
+                eof = not chunk
+                buf = buf[pos:] + chunk
+                pos = 0
+            return len(buf) - pos >= count
+
+        while fill(HEADER.size):
+            magic, size, seed = HEADER.unpack_from(buf, pos)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a game record file")
+            pos += HEADER.size
+
+            names = []
+            for _ in range(2):
+                if not fill(1) or not fill(1 + buf[pos]):
+                    # Cut off before its players are known, so no game
+                    return
+                length = buf[pos]
+                names.append(buf[pos + 1:pos + 1 + length].decode('ascii'))
+                pos += 1 + length
+
+            # Turns run up to the first byte with the high bit set
+            turns = bytearray()
+            while True:
+                match = _END_BYTE.search(buf, pos)
+                if match:
+                    turns += buf[pos:match.start()]
+                    winner = WINNERS.get(buf[match.start()] & ~END)
+                    pos = match.start() + 1
+                    break
+                turns += buf[pos:]
+                pos = len(buf)
+                if not fill(1):
+                    winner = None
+                    break
+
+            yield GameRecord(names[0], names[1], seed, size, bytes(turns),
+                             winner)
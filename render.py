@@ -0,0 +1,122 @@
+"""Output of the game loop: the board, the turn header and each move.
+
+TextRenderer builds every frame as one string and writes it with a single
+call. NullRenderer writes nothing, and its enabled flag lets callers skip
+work such as scoring that only feeds the output, so headless games pay
+nothing for it.
+"""
+import sys
+
+
+def format_board(board):
+    """
+    @brief Draws a board as text, one row of cells between separators
+    @param board: A Board or BitBoard
+    @return: The frame, ending with a newline
+    """
+    separator = "+--" * board.size + "+"
+    # One lookup per cell instead of a search of every worker
+    workers = {position: worker_id
+               for worker_id, position in board.worker_positions.items()}
+    heights = board.get_heights()
+    size = board.size
+    lines = [separator]
+    for row in range(size):
+        lines.append("|" + "|".join(
+            f"{heights[row * size + col]}{workers.get((row, col), ' ')}"
+            for col in range(size)) + "|")
+        lines.append(separator)
+    lines.append("")
+    return "\n".join(lines)
+
+
+class TextRenderer:
+    """Writes the game to a text stream, one write per frame."""
+
+    enabled = True
+
+    def __init__(self, stream=None):
+        """
+        @brief Makes a renderer
+        @param stream: The stream to write to, or None for whatever
+                       sys.stdout is at the time of each write
+        @return: None
+        """
+        self.stream = stream
+
+    def write(self, text):
+        """
+        @brief Writes text as it is
+        @param text: The text
+        @return: None
+        """
+        (self.stream or sys.stdout).write(text)
+
+    def board(self, board):
+        """
+        @brief Draws the board
+        @param board: A Board or BitBoard
+        @return: None
+        """
+        self.write(format_board(board))
+
+    def turn(self, turn, player_id, worker_ids, score=None):
+        """
+        @brief Writes the header of a turn
+        @param turn: The turn number
+        @param player_id: The player to move
+        @param worker_ids: The IDs of that player's workers
+        @param score: The player's (height, center, distance) score, or None
+                      to leave it out
+        @return: None
+        """
+        text = f"Turn: {turn}, {player_id} ({''.join(worker_ids)})"
+        if score is not None:
+            text += f", {score}"
+        self.write(text + "\n")
+
+    def move(self, worker_id, move_direction, build_direction, score=None):
+        """
+        @brief Writes a move and build
+        @param worker_id: The worker that moved
+        @param move_direction: The direction it moved in
+        @param build_direction: The direction it built in
+        @param score: The mover's score after the turn, or None to leave it
+                      out
+        @return: None
+        """
+        text = f"{worker_id},{move_direction},{build_direction}"
+        if score is not None:
+            text += f" {score}"
+        self.write(text + "\n")
+
+    def message(self, text):
+        """
+        @brief Writes a line such as the result of the game
+        @param text: The line without its newline
+        @return: None
+        """
+        self.write(text + "\n")
+
+
+class NullRenderer:
+    """Renderer for headless games, which writes nothing."""
+
+    enabled = False
+
+    def board(self, board):
+        pass
+
+    def turn(self, turn, player_id, worker_ids, score=None):
+        pass
+
+    def move(self, worker_id, move_direction, build_direction, score=None):
+        pass
+
+    def message(self, text):
+        pass
+
+
+# Shared instances; neither holds any per-game state
+TEXT_RENDERER = TextRenderer()
+NULL_RENDERER = NullRenderer()
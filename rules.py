@@ -0,0 +1,70 @@
+"""Legal turn generation that never raises and never touches the board.
+
+A turn is encoded in one small int: the worker's slot in the worker ID list
+the turns were generated for, shifted left by 6, the index in DIRECTIONS of
+the move, shifted left by 3, and the index of the build direction seen from
+the cell the worker moved to. Seven bits cover every turn of a player.
+"""
+from tables import DIRECTIONS
+
+
+def encode_turn(slot, move_index, build_index):
+    """
+    @brief Packs a turn into an int
+    @param slot: The index of the worker in the worker ID list
+    @param move_index: The index in DIRECTIONS of the move
+    @param build_index: The index in DIRECTIONS of the build, seen from the
+                        cell the worker moved to
+    @return: The encoded turn
+    """
+    return slot << 6 | move_index << 3 | build_index
+
+
+def decode_turn(turn):
+    """
+    @brief Unpacks an encoded turn
+    @param turn: The encoded turn
+    @return: (slot, move_index, build_index)
+    """
+    return turn >> 6, turn >> 3 & 7, turn & 7
+
+
+def turn_directions(turn, worker_ids):
+    """
+    @brief Spells out an encoded turn the way the players display it
+    @param turn: The encoded turn
+    @param worker_ids: The worker ID list the turn was generated for
+    @return: (worker_id, move_direction, build_direction)
+    """
+    slot, move_index, build_index = decode_turn(turn)
+    return worker_ids[slot], DIRECTIONS[move_index], DIRECTIONS[build_index]
+
+
+def legal_turns(board, worker_ids):
+    """
+    @brief Lazily yields every legal move and build of the given workers,
+           in worker, move direction, build direction order
+    @param board: A Board or BitBoard, which is only read
+    @param worker_ids: The IDs of the workers of the side to move
+    @return: A generator of encoded turns
+    """
+    tables = board.tables
+    steps = tables.steps
+    cell_of = tables.cell_of
+    heights = board.get_heights()
+    occupied = {cell_of(position)
+                for position in board.worker_positions.values()}
+
+    for slot, worker_id in enumerate(worker_ids):
+        origin = cell_of(board.worker_positions[worker_id])
+        highest = min(heights[origin] + 1, 3)
+        for move_index, target in enumerate(steps[origin]):
+            if target < 0 or target in occupied or heights[target] > highest:
+                continue
+            for build_index, build in enumerate(steps[target]):
+                # The cell the worker left is free to build on
+                if build < 0 or heights[build] == 4:
+                    continue
+                if build in occupied and build != origin:
+                    continue
+                yield slot << 6 | move_index << 3 | build_index
@@ -0,0 +1,266 @@
+"""Negamax alpha-beta search over full Santorini turns.
+
+A turn is a (worker_id, move_cell, build_cell) triple and one ply is one
+player's whole turn. The search plays turns on its own BitBoard copy of the
+game, deepens one ply at a time until it runs out of time or depth, and keeps
+results in a bounded transposition table keyed by the board's Zobrist hash.
+"""
+import logging
+import time
+
+from bitboard import BitBoard
+
+logger = logging.getLogger(__name__)
+
+# Scores at or above WIN_THRESHOLD mean a forced win, WIN - plies to get there
+WIN = 100000
+WIN_THRESHOLD = WIN - 1000
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# Player IDs of side 0 and side 1
+PLAYER_IDS = ('white', 'blue')
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when its time limit runs out."""
+    pass
+
+
+class TranspositionTable:
+    """
+    Fixed-size table of search results indexed by the low bits of the
+    position hash. A slot is replaced by a deeper search of any position or
+    by any result from a newer search.
+    """
+
+    def __init__(self, size_bits=18):
+        """
+        @brief Allocates 2 ** size_bits empty slots
+        @param size_bits: log2 of the number of slots
+        @return: None
+        """
+        self.mask = (1 << size_bits) - 1
+        self.slots = [None] * (1 << size_bits)
+        self.generation = 0
+
+    def new_search(self):
+        """
+        @brief Marks every stored entry as older than the next search's
+        @return: None
+        """
+        self.generation += 1
+
+    def probe(self, key):
+        """
+        @brief Looks up a position
+        @param key: The 64-bit position hash
+        @return: (depth, score, flag, turn) or None if it is not stored
+        """
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry[1:5]
+        return None
+
+    def store(self, key, depth, score, flag, turn):
+        """
+        @brief Stores a search result unless it would evict a deeper result
+               from the current search
+        @param key: The 64-bit position hash
+        @param depth: The depth searched below the position
+        @param score: The score found
+        @param flag: EXACT, LOWER (score is a lower bound) or UPPER
+        @param turn: The best turn found, or None
+        @return: None
+        """
+        index = key & self.mask
+        old = self.slots[index]
+        if (old is None or old[0] == key or old[5] != self.generation
+                or depth >= old[1]):
+            self.slots[index] = (key, depth, score, flag, turn,
+                                 self.generation)
+
+
+class Searcher:
+    """Iterative deepening negamax search with alpha-beta pruning."""
+
+    def __init__(self, board, sides, weights, table=None):
+        """
+        @brief Sets up a search over a private copy of the board
+        @param board: The game's board, which is copied and left untouched
+        @param sides: [white worker IDs, blue worker IDs]
+        @param weights: (height, center, distance) weights of the evaluation
+        @param table: A TranspositionTable to reuse between searches
+        @return: None
+        """
+        self.board = BitBoard.from_board(board)
+        self.tables = self.board.tables
+        self.sides = sides
+        self.weights = weights
+        self.table = table if table is not None else TranspositionTable()
+        self.side_keys = (0, self.board.keys.side)
+        self.nodes = 0
+        self.deadline = None
+        # A threading.Event that stops the search when set, e.g. to end
+        # pondering, or None
+        self.stop_event = None
+
+    def generate(self, side):
+        """
+        @brief Lists every legal turn of a side, best guesses first
+        @param side: 0 for white, 1 for blue
+        @return: A list of (worker_id, move_cell, build_cell) turns
+        """
+        heights = self.board.heights
+        centre = self.tables.centre
+        turns = self.board.legal_turns(self.sides[side])
+        # Climbing and central moves first; sort is stable for equal keys
+        turns.sort(key=lambda turn: heights[turn[1]] * 4 + centre[turn[1]],
+                   reverse=True)
+        return turns
+
+    def evaluate(self, side):
+        """
+        @brief Scores the position for the side to move with the heuristic
+               player's height, center and distance weights
+        @param side: 0 for white, 1 for blue
+        @return: The side's weighted score minus its opponent's
+        """
+        # The board keeps both players' score terms up to date
+        c1, c2, c3 = self.weights
+        totals = []
+        for player_id in (PLAYER_IDS[side], PLAYER_IDS[1 - side]):
+            height, center, spread = self.board.scores[player_id]
+            totals.append(c1 * height + c2 * center + c3 * spread)
+        return totals[0] - totals[1]
+
+    def negamax(self, depth, ply, alpha, beta, side):
+        """
+        @brief Searches the position to a fixed depth
+        @param depth: Plies left to search
+        @param ply: Plies played since the root
+        @param alpha: Lower bound of the search window
+        @param beta: Upper bound of the search window
+        @param side: The side to move, 0 for white and 1 for blue
+        @return: (score for the side to move, best turn)
+        """
+        self.nodes += 1
+        # Interior nodes generate every turn, next to which reading the
+        # clock is free; leaves only read it every 64 nodes
+        if depth or not self.nodes & 63:
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                raise SearchTimeout()
+            if self.stop_event is not None and self.stop_event.is_set():
+                raise SearchTimeout()
+
+        key = self.board.hash ^ self.side_keys[side]
+        entry = self.table.probe(key)
+        tt_turn = None
+        if entry is not None:
+            entry_depth, score, flag, tt_turn = entry
+            if entry_depth >= depth and ply > 0:
+                # Win scores are stored relative to the stored position
+                if score >= WIN_THRESHOLD:
+                    score -= ply
+                elif score <= -WIN_THRESHOLD:
+                    score += ply
+                if (flag == EXACT or (flag == LOWER and score >= beta)
+                        or (flag == UPPER and score <= alpha)):
+                    return score, tt_turn
+
+        if depth == 0:
+            # The board keeps the move counts, so leaves skip generating
+            player_id = PLAYER_IDS[side]
+            if self.board.is_trapped(player_id):
+                return -(WIN - ply), None
+            if self.board.can_win(player_id):
+                return WIN - ply - 1, None
+            return self.evaluate(side), None
+
+        turns = self.generate(side)
+        if not turns:
+            # A side that cannot move loses
+            return -(WIN - ply), None
+
+        heights = self.board.heights
+        for turn in turns:
+            if heights[turn[1]] == 3:
+                # Moving up onto level 3 wins at once
+                return WIN - ply - 1, turn
+
+        if tt_turn in turns:
+            turns.remove(tt_turn)
+            turns.insert(0, tt_turn)
+
+        original_alpha = alpha
+        best_score = -WIN - 1
+        best_turn = turns[0]
+        for turn in turns:
+            origin = self.board.play_turn(turn)
+            try:
+                score = -self.negamax(depth - 1, ply + 1, -beta, -alpha,
+                                      1 - side)[0]
+            finally:
+                self.board.undo_turn(turn, origin)
+
+            if score > best_score:
+                best_score = score
+                best_turn = turn
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+
+        if best_score <= original_alpha:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+
+        stored = best_score
+        if stored >= WIN_THRESHOLD:
+            stored += ply
+        elif stored <= -WIN_THRESHOLD:
+            stored -= ply
+        self.table.store(key, depth, stored, flag, best_turn)
+        return best_score, best_turn
+
+    def search(self, side, max_depth, time_limit=None):
+        """
+        @brief Deepens the search one ply at a time until max_depth is done
+               or time_limit runs out, keeping the last finished result
+        @param side: The side to move, 0 for white and 1 for blue
+        @param max_depth: The deepest search to run, in plies
+        @param time_limit: Seconds to search for, or None for no limit
+        @return: (best turn or None, its score, deepest completed depth)
+        """
+        self.table.new_search()
+        self.nodes = 0
+        start = time.perf_counter()
+        deadline = None if time_limit is None else start + time_limit
+
+        best_turn, best_score, completed = None, 0, 0
+        self.deadline = deadline
+        for depth in range(1, max_depth + 1):
+            try:
+                score, turn = self.negamax(depth, 0, -WIN - 1, WIN + 1, side)
+            except SearchTimeout:
+                break
+            best_turn, best_score, completed = turn, score, depth
+            if abs(score) >= WIN_THRESHOLD:
+                # A forced result will not change with more depth
+                break
+
+        if best_turn is None:
+            # Not even depth 1 finished in time, so play the best guess
+            turns = self.generate(side)
+            best_turn = turns[0] if turns else None
+            best_score = 0 if turns else -WIN
+
+        self.elapsed = time.perf_counter() - start
+        self.nodes_per_second = self.nodes / self.elapsed if self.elapsed else 0.0
+        logger.info("depth %d, score %d: %d nodes in %.3fs (%.0f nodes/sec)",
+                    completed, best_score, self.nodes, self.elapsed,
+                    self.nodes_per_second)
+        return best_turn, best_score, completed
@@ -0,0 +1,446 @@
+"""Asyncio game server: many concurrent Santorini games over TCP.
+
+Each connection is a session that plays one game after another over a line
+protocol. Human turns are awaited on the connection, so a waiting player
+costs nothing, and AI turns run in a process pool from a GameState, so a
+long search never stalls the event loop.
+
+Protocol, one message per line:
+
+    client: new <white type> <blue type> [seed]
+    server: game <seed> <board size>
+    server: moved <worker> <move direction> <build direction>  (every turn)
+    server: turn <player_id>       (waiting for a human turn)
+    client: move <worker> <move direction> <build direction>
+    server: error <message>        (then the request is repeated)
+    server: won <player_id>        (the game is over)
+    client: quit
+
+A human player type means the client plays that side. Running this module
+with --load-test starts a server in the same process and has that many
+clients play human turns against it, reporting the turn latency they see.
+With --move-time every AI turn gets that budget, and a turn that runs past
+it by more than player.DEADLINE_GRACE is logged as a miss.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import logging
+import random
+import time
+
+from player import HumanPlayer, PLAYER_TYPES
+from book import open_book
+from render import NULL_RENDERER
+from rules import encode_turn, legal_turns, turn_directions
+from santorini import Santorini
+from state import GameState
+from stats import PERCENTILES, percentile
+from tables import DEFAULT_SIZE, DIRECTION_INDEX
+from tablebase import open_tablebase
+
+logger = logging.getLogger(__name__)
+
+PLAYER_IDS = ('white', 'blue')
+
+
+def _ai_turn(job):
+    """
+    @brief Executor entry point that picks an AI player's turn
+    @param job: (packed GameState, size, player type, seed of the player's
+                 random.Random, tablebase path or None, book path or None,
+                 seconds the turn may take or None)
+    @return: (the (worker_id, move_direction, build_direction) picked, or
+             None if the side to move has no legal turn, seconds make_move
+             took, True if the turn ran past the time limit)
+    """
+    value, size, player_type, seed, tablebase, book, time_limit = job
+    state = GameState(value, size)
+    game = state.to_game(bitboard=True)
+    if state.side:
+        workers, opponent = game.player_blue.workers, game.player_white
+    else:
+        workers, opponent = game.player_white.workers, game.player_blue
+
+    player = PLAYER_TYPES[player_type](PLAYER_IDS[state.side], workers,
+                                       rng=random.Random(seed))
+    player.tablebase = open_tablebase(tablebase) if tablebase else None
+    player.book = open_book(book) if book else None
+    player.renderer = NULL_RENDERER
+    if time_limit is not None:
+        player.time_limit = time_limit
+    return player.timed_move('off', opponent.workers.values())
+
+
+def parse_turn(game, words):
+    """
+    @brief Checks a human turn against the rules
+    @param game: The Santorini being played
+    @param words: The words after 'move'
+    @return: (worker_id, move_direction, build_direction), or None if the
+             words are not a legal turn of the side to move
+    """
+    if len(words) != 3:
+        return None
+    worker_id, move_direction, build_direction = words
+    worker_ids = list(game.curr_player.workers)
+    if (worker_id not in worker_ids or move_direction not in DIRECTION_INDEX
+            or build_direction not in DIRECTION_INDEX):
+        return None
+    turn = encode_turn(worker_ids.index(worker_id),
+                       DIRECTION_INDEX[move_direction],
+                       DIRECTION_INDEX[build_direction])
+    if turn not in set(legal_turns(game.board, worker_ids)):
+        return None
+    return worker_id, move_direction, build_direction
+
+
+def play_turn(game, turn):
+    """
+    @brief Plays a legal turn and passes the move to the other side
+    @param game: The Santorini being played
+    @param turn: (worker_id, move_direction, build_direction)
+    @return: None
+    """
+    worker_id, move_direction, build_direction = turn
+    worker = game.curr_player.workers[worker_id]
+    worker.move(move_direction)
+    worker.build(build_direction)
+    game.switch_player()
+
+
+class GameServer:
+    """Hosts one session per connection."""
+
+    def __init__(self, executor, size=DEFAULT_SIZE, tablebase=None,
+                 book=None, time_limit=None):
+        """
+        @brief Sets up a server that has not started listening yet
+        @param executor: The concurrent.futures executor AI turns run in
+        @param size: The number of rows (and columns) of the boards
+        @param tablebase: Path of an endgame tablebase for the AI players,
+                          or None
+        @param book: Path of an opening book for the AI players, or None
+        @param time_limit: Seconds each AI turn may take, or None for the
+                           player types' own limits
+        @return: None
+        """
+        self.executor = executor
+        self.size = size
+        self.tablebase = tablebase
+        self.book = book
+        self.time_limit = time_limit
+        self.sessions = 0
+        self.games = 0
+        # AI turns timed against time_limit, and those that ran past it
+        self.timed_turns = 0
+        self.misses = 0
+
+    async def start(self, host='127.0.0.1', port=0):
+        """
+        @brief Starts listening
+        @param host: The address to listen on
+        @param port: The port to listen on, 0 for any free port
+        @return: The asyncio Server
+        """
+        return await asyncio.start_server(self.handle, host, port,
+                                          backlog=4096)
+
+    async def handle(self, reader, writer):
+        """
+        @brief Runs one session until the client quits or disconnects
+        @param reader: The connection's StreamReader
+        @param writer: The connection's StreamWriter
+        @return: None
+        """
+        self.sessions += 1
+        try:
+            while True:
+                words = await self.read_words(reader)
+                if words is None or words[0] == 'quit':
+                    break
+                if words[0] != 'new' or len(words) not in (3, 4):
+                    await self.send(writer, "error expected new <white> "
+                                            "<blue> [seed] or quit")
+                    continue
+                if not await self.play(reader, writer, *words[1:]):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    @staticmethod
+    async def read_words(reader):
+        """
+        @brief Reads one line of the protocol
+        @param reader: The connection's StreamReader
+        @return: The line's words, or None once the client has gone
+        """
+        while True:
+            line = await reader.readline()
+            if not line:
+                return None
+            words = line.decode('ascii', 'replace').split()
+            if words:
+                return words
+
+    @staticmethod
+    async def send(writer, line):
+        """
+        @brief Writes one line of the protocol
+        @param writer: The connection's StreamWriter
+        @param line: The line without its newline
+        @return: None
+        """
+        writer.write(line.encode('ascii') + b"\n")
+        await writer.drain()
+
+    async def play(self, reader, writer, white, blue, seed=None):
+        """
+        @brief Plays one game of a session
+        @param reader: The connection's StreamReader
+        @param writer: The connection's StreamWriter
+        @param white: The player type of white
+        @param blue: The player type of blue
+        @param seed: The game's seed as text, or None for a random one
+        @return: False if the client went away during the game
+        """
+        if white not in PLAYER_TYPES or blue not in PLAYER_TYPES:
+            await self.send(writer, "error unknown player type")
+            return True
+        try:
+            seed = int(seed) if seed is not None else random.getrandbits(64)
+        except ValueError:
+            await self.send(writer, "error seed must be an integer")
+            return True
+
+        loop = asyncio.get_running_loop()
+        rng = random.Random(seed)
+        types = (white, blue)
+        game = Santorini(True, self.size)
+        await self.send(writer, f"game {seed} {self.size}")
+
+        # Same order of checks as SantoriniCLI.run
+        while True:
+            winner = game.check_win()
+            if winner:
+                break
+            if game.check_loss():
+                game.switch_player()
+                winner = game.curr_player.player_id
+                break
+
+            side = 0 if game.curr_player is game.player_white else 1
+            player_type = types[side]
+            if PLAYER_TYPES[player_type] is HumanPlayer:
+                turn = None
+                while turn is None:
+                    await self.send(writer, f"turn {PLAYER_IDS[side]}")
+                    words = await self.read_words(reader)
+                    if words is None or words[0] == 'quit':
+                        return False
+                    if words[0] == 'move':
+                        turn = parse_turn(game, words[1:])
+                    if turn is None:
+                        await self.send(writer, "error not a legal turn")
+            else:
+                job = (GameState.from_game(game).value, self.size,
+                       player_type, rng.getrandbits(64), self.tablebase,
+                       self.book, self.time_limit)
+                turn, seconds, missed = await loop.run_in_executor(
+                    self.executor, _ai_turn, job)
+                if self.time_limit is not None:
+                    self.timed_turns += 1
+                    self.misses += missed
+                if missed:
+                    logger.warning("%s (%s) took %.1f ms, over its time "
+                                   "limit", PLAYER_IDS[side], player_type,
+                                   seconds * 1000)
+
+            play_turn(game, turn)
+            await self.send(writer, "moved " + " ".join(turn))
+
+        self.games += 1
+        await self.send(writer, f"won {winner}")
+        return True
+
+
+async def load_client(host, port, games, opponent, seed, latencies):
+    """
+    @brief Plays random human turns as white against an AI, timing each
+           wait for the server
+    @param host: The server's address
+    @param port: The server's port
+    @param games: The number of games to play
+    @param opponent: The player type of blue
+    @param seed: The seed of the client's turns and of its games
+    @param latencies: A list each wait, in seconds, is appended to
+    @return: None
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    rng = random.Random(seed)
+    try:
+        for _ in range(games):
+            sent = time.perf_counter()
+            await GameServer.send(writer, f"new human {opponent} "
+                                          f"{rng.getrandbits(32)}")
+            game = None
+            while True:
+                words = await GameServer.read_words(reader)
+                if words is None:
+                    raise ConnectionError("server closed the connection")
+                if words[0] == 'game':
+                    game = Santorini(True, int(words[2]))
+                elif words[0] == 'moved':
+                    play_turn(game, words[1:])
+                elif words[0] == 'turn':
+                    latencies.append(time.perf_counter() - sent)
+                    worker_ids = list(game.curr_player.workers)
+                    turn = turn_directions(
+                        rng.choice(list(legal_turns(game.board, worker_ids))),
+                        worker_ids)
+                    sent = time.perf_counter()
+                    await GameServer.send(writer, "move " + " ".join(turn))
+                elif words[0] == 'won':
+                    break
+                else:
+                    raise ValueError(" ".join(words))
+        await GameServer.send(writer, "quit")
+    finally:
+        writer.close()
+        with contextlib.suppress(ConnectionError):
+            await writer.wait_closed()
+
+
+async def load_test(clients, games, opponent='random', processes=None,
+                    size=DEFAULT_SIZE, seed=0, host=None, port=None,
+                    time_limit=None):
+    """
+    @brief Has many clients play at once and measures the turn latency
+    @param clients: The number of concurrent connections
+    @param games: The number of games each client plays
+    @param opponent: The AI player type the clients play against
+    @param processes: The AI process pool size of the local server, or None
+                      for one per CPU
+    @param size: The number of rows (and columns) of the local server's
+                 boards
+    @param seed: The seed of the clients' turns
+    @param host: The address of a running server, or None to start one
+    @param port: The port of a running server
+    @param time_limit: Seconds each AI turn of the local server may take,
+                       or None
+    @return: A multi-line report
+    """
+    game_server = None
+    server = None
+    executor = None
+    if host is None:
+        executor = concurrent.futures.ProcessPoolExecutor(processes)
+        game_server = GameServer(executor, size, time_limit=time_limit)
+        server = await game_server.start()
+        host, port = server.sockets[0].getsockname()[:2]
+
+    latencies = []
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(load_client(host, port, games, opponent,
+                                           seed * 1000003 + client,
+                                           latencies)
+                               for client in range(clients)))
+    finally:
+        if server:
+            server.close()
+            await server.wait_closed()
+            executor.shutdown()
+    elapsed = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    lines = [f"{clients} clients x {games} games against {opponent}: "
+             f"{clients * games} games, {len(ordered)} turns in "
+             f"{elapsed:.2f}s ({clients * games / elapsed:.1f} games/sec, "
+             f"{len(ordered) / elapsed:.0f} turns/sec)"]
+    if ordered:
+        lines.append("turn latency: " + ", ".join(
+            f"p{percent} {1000 * percentile(ordered, percent):.1f} ms"
+            for percent in PERCENTILES)
+            + f", max {1000 * ordered[-1]:.1f} ms")
+    if game_server is not None and time_limit is not None:
+        lines.append(f"{opponent} missed the {time_limit:.3f}s limit on "
+                     f"{game_server.misses} of {game_server.timed_turns} "
+                     f"turns")
+    return "\n".join(lines)
+
+
+async def serve(host, port, processes=None, size=DEFAULT_SIZE,
+                tablebase=None, book=None, time_limit=None):
+    """
+    @brief Runs a server until it is cancelled
+    @param host: The address to listen on
+    @param port: The port to listen on
+    @param processes: The AI process pool size, or None for one per CPU
+    @param size: The number of rows (and columns) of the boards
+    @param tablebase: Path of an endgame tablebase for the AI players, or None
+    @param book: Path of an opening book for the AI players, or None
+    @param time_limit: Seconds each AI turn may take, or None
+    @return: None
+    """
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        server = await GameServer(executor, size, tablebase, book,
+                                  time_limit).start(host, port)
+        logger.info("listening on %s", ", ".join(
+            str(sock.getsockname()) for sock in server.sockets))
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    ai_types = sorted(player_type for player_type, player_class
+                      in PLAYER_TYPES.items() if player_class is not HumanPlayer)
+
+    parser = argparse.ArgumentParser(description='Santorini game server')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to listen on, or of the server to '
+                             'load test with --connect')
+    parser.add_argument('--port', type=int, default=7531,
+                        help='port to listen on or connect to')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='AI worker processes (default: one per CPU)')
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE,
+                        help='number of rows and columns of the boards')
+    parser.add_argument('--tablebase', metavar='PATH',
+                        help='endgame tablebase file for the AI players')
+    parser.add_argument('--book', metavar='PATH',
+                        help='opening book file for the AI players')
+    parser.add_argument('--move-time', type=float, metavar='SECONDS',
+                        default=None,
+                        help='time limit of every AI turn; turns over it are '
+                             'logged')
+    parser.add_argument('--load-test', type=int, metavar='CLIENTS',
+                        help='run a load test with this many clients '
+                             'instead of serving')
+    parser.add_argument('--games', type=int, default=1,
+                        help='games each load test client plays')
+    parser.add_argument('--opponent', choices=ai_types, default='random',
+                        help='AI player type the load test clients play')
+    parser.add_argument('--connect', action='store_true',
+                        help='load test the server at --host and --port '
+                             'instead of a server in this process')
+    parser.add_argument('--verbose', action='store_true',
+                        help='log server events')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    if args.load_test:
+        print(asyncio.run(load_test(
+            args.load_test, args.games, args.opponent, args.processes,
+            args.size, host=args.host if args.connect else None,
+            port=args.port, time_limit=args.move_time)))
+    else:
+        with contextlib.suppress(KeyboardInterrupt):
+            asyncio.run(serve(args.host, args.port, args.processes, args.size,
+                              args.tablebase, args.book, args.move_time))
@@ -0,0 +1,165 @@
+"""Search result cache shared by every game process of a machine.
+
+SharedTable has the probe/store interface of search.TranspositionTable but
+keeps its slots in multiprocessing.shared_memory, so processes read and
+write the same table directly instead of pickling results to each other.
+
+Each 16-byte slot holds (key XOR data, data). There are no locks: a reader
+accepts a slot only if the XOR of its two words gives back the probed key,
+so a slot torn by two processes writing at once just reads as a miss.
+A slot is replaced by any result of the same position, or by a result of
+another position searched at least as deep.
+"""
+import functools
+import struct
+from multiprocessing import shared_memory
+
+from zobrist import WORKER_IDS
+
+SLOT = struct.Struct('<QQ')
+
+# Scores are stored with this offset, so the data word is never 0
+SCORE_OFFSET = 1 << 31
+
+
+def pack_entry(depth, score, flag, turn):
+    """
+    @brief Packs a search result into a 64-bit word
+    @param depth: The depth searched, below 256
+    @param score: The score found
+    @param flag: EXACT, LOWER or UPPER
+    @param turn: The best (worker_id, move_cell, build_cell) turn, or None
+    @return: The packed word
+    """
+    data = (score + SCORE_OFFSET) | depth << 32 | flag << 40
+    if turn is not None:
+        worker_id, target, build = turn
+        data |= (1 << 42 | WORKER_IDS.index(worker_id) << 43
+                 | target << 45 | build << 53)
+    return data
+
+
+def unpack_entry(data):
+    """
+    @brief Unpacks a word written by pack_entry
+    @param data: The packed word
+    @return: (depth, score, flag, turn)
+    """
+    turn = None
+    if data >> 42 & 1:
+        turn = (WORKER_IDS[data >> 43 & 3], data >> 45 & 0xFF,
+                data >> 53 & 0xFF)
+    return (data >> 32 & 0xFF, (data & 0xFFFFFFFF) - SCORE_OFFSET,
+            data >> 40 & 3, turn)
+
+
+class SharedTable:
+    """Fixed-size transposition table in shared memory."""
+
+    def __init__(self, size_bits=18, name=None):
+        """
+        @brief Creates a new table, or attaches to an existing one by name
+        @param size_bits: log2 of the number of slots of a new table
+        @param name: The shared memory name of an existing table, or None
+        @return: None
+        """
+        if name is None:
+            # New shared memory is zero filled, so every slot starts empty
+            self.memory = shared_memory.SharedMemory(
+                create=True, size=SLOT.size << size_bits)
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        # Some platforms round the memory up to whole pages
+        slots = len(self.memory.buf) // SLOT.size
+        self.mask = (1 << (slots.bit_length() - 1)) - 1
+        self.buf = self.memory.buf
+
+        # Counters of this process only
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    @property
+    def name(self):
+        """
+        @brief Obtains the name other processes attach with
+        @return: The shared memory name
+        """
+        return self.memory.name
+
+    def __reduce__(self):
+        # Other processes attach to the same memory instead of copying it
+        return (SharedTable, (0, self.name))
+
+    def close(self):
+        """
+        @brief Detaches this process, and frees the memory if it created it
+        @return: None
+        """
+        self.buf = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def new_search(self):
+        """
+        @brief Kept for the TranspositionTable interface; entries are only
+               replaced by depth, so there is nothing to age
+        @return: None
+        """
+        pass
+
+    def probe(self, key):
+        """
+        @brief Looks up a position
+        @param key: The 64-bit position hash
+        @return: (depth, score, flag, turn) or None if it is not stored
+        """
+        self.probes += 1
+        check, data = SLOT.unpack_from(self.buf, (key & self.mask) * SLOT.size)
+        if data and check ^ data == key:
+            self.hits += 1
+            return unpack_entry(data)
+        return None
+
+    def store(self, key, depth, score, flag, turn):
+        """
+        @brief Stores a search result unless it would evict a deeper result
+               of another position
+        @param key: The 64-bit position hash
+        @param depth: The depth searched below the position
+        @param score: The score found
+        @param flag: EXACT, LOWER (score is a lower bound) or UPPER
+        @param turn: The best turn found, or None
+        @return: None
+        """
+        index = key & self.mask
+        offset = index * SLOT.size
+        check, data = SLOT.unpack_from(self.buf, offset)
+        old_key = check ^ data
+        # A slot whose key does not belong here was torn, so it is free
+        if (data and old_key != key and old_key & self.mask == index
+                and depth < data >> 32 & 0xFF):
+            return
+        data = pack_entry(depth, score, flag, turn)
+        SLOT.pack_into(self.buf, offset, key ^ data, data)
+        self.stores += 1
+
+    def stats(self):
+        """
+        @brief Obtains this process's counters
+        @return: (probes, hits, stores)
+        """
+        return self.probes, self.hits, self.stores
+
+
+@functools.lru_cache(maxsize=None)
+def open_cache(name):
+    """
+    @brief Attaches to a shared table once per process
+    @param name: The shared memory name of the table
+    @return: The SharedTable
+    """
+    return SharedTable(name=name)
@@ -0,0 +1,201 @@
+"""Immutable, hashable snapshot of a Santorini position.
+
+A GameState packs everything needed to resume a game into one int: the side
+to move in bit 0, the cell of each worker in WORKER_IDS order above it, then
+three bits per cell for the building heights. A 5x5 position takes 96 bits,
+so millions of them fit in sets, caches and files without a dict per object.
+"""
+from board import Board
+from bitboard import BitBoard
+from tables import DEFAULT_SIZE, get_tables
+from zobrist import WORKER_IDS
+
+HEIGHT_BITS = 3
+
+
+class GameState:
+    """A packed position: buildings, worker cells and the side to move."""
+
+    __slots__ = ('size', 'value')
+
+    def __init__(self, value, size=DEFAULT_SIZE):
+        """
+        @brief Wraps an already packed position
+        @param value: The packed int
+        @param size: The number of rows (and columns) of the board
+        @return: None
+        """
+        object.__setattr__(self, 'size', size)
+        object.__setattr__(self, 'value', value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GameState is immutable")
+
+    def __eq__(self, other):
+        return (isinstance(other, GameState) and self.value == other.value
+                and self.size == other.size)
+
+    def __hash__(self):
+        return hash((self.value, self.size))
+
+    def __repr__(self):
+        return f"GameState({self.value:#x}, {self.size})"
+
+    def __reduce__(self):
+        return (GameState, (self.value, self.size))
+
+    @staticmethod
+    def cell_bits(size):
+        """
+        @brief Obtains the number of bits that hold one worker cell
+        @param size: The number of rows (and columns) of the board
+        @return: The bit width of a cell index
+        """
+        return (size * size - 1).bit_length()
+
+    @classmethod
+    def pack(cls, heights, worker_cells, side, size=DEFAULT_SIZE):
+        """
+        @brief Packs the parts of a position
+        @param heights: The building level of every cell, in cell order
+        @param worker_cells: Dictionary mapping worker IDs to cells
+        @param side: The side to move, 0 for white and 1 for blue
+        @param size: The number of rows (and columns) of the board
+        @return: A new GameState
+        """
+        value = 0
+        for level in reversed(heights):
+            value = value << HEIGHT_BITS | level
+
+        bits = cls.cell_bits(size)
+        for worker_id in reversed(WORKER_IDS):
+            value = value << bits | worker_cells[worker_id]
+        return cls(value << 1 | side, size)
+
+    @classmethod
+    def from_board(cls, board, side):
+        """
+        @brief Snapshots a board
+        @param board: A Board or BitBoard
+        @param side: The side to move, 0 for white and 1 for blue
+        @return: A new GameState
+        """
+        cell_of = board.tables.cell_of
+        heights = board.get_heights()
+        worker_cells = {worker_id: cell_of(position)
+                        for worker_id, position in board.worker_positions.items()}
+        return cls.pack(heights, worker_cells, side, board.size)
+
+    @classmethod
+    def from_game(cls, game):
+        """
+        @brief Snapshots a game
+        @param game: An instance of Santorini
+        @return: A new GameState
+        """
+        side = 0 if game.curr_player is game.player_white else 1
+        return cls.from_board(game.board, side)
+
+    @property
+    def side(self):
+        """
+        @brief Obtains the side to move
+        @return: 0 for white, 1 for blue
+        """
+        return self.value & 1
+
+    @property
+    def worker_cells(self):
+        """
+        @brief Unpacks the worker cells
+        @return: Dictionary mapping worker IDs to cells
+        """
+        bits = self.cell_bits(self.size)
+        mask = (1 << bits) - 1
+        value = self.value >> 1
+        cells = {}
+        for worker_id in WORKER_IDS:
+            cells[worker_id] = value & mask
+            value >>= bits
+        return cells
+
+    @property
+    def heights(self):
+        """
+        @brief Unpacks the building heights
+        @return: A list of building levels in cell order
+        """
+        value = self.value >> 1 + len(WORKER_IDS) * self.cell_bits(self.size)
+        mask = (1 << HEIGHT_BITS) - 1
+        heights = []
+        for _ in range(self.size * self.size):
+            heights.append(value & mask)
+            value >>= HEIGHT_BITS
+        return heights
+
+    def to_board(self, bitboard=False):
+        """
+        @brief Builds a board holding the position
+        @param bitboard: True to build a BitBoard
+        @return: A new Board or BitBoard
+        """
+        size = self.size
+        positions = get_tables(size).positions
+        worker_positions = {worker_id: positions[cell]
+                            for worker_id, cell in self.worker_cells.items()}
+        heights = self.heights
+
+        board = (BitBoard if bitboard else Board)(worker_positions, size)
+        board.grid = [heights[row * size:(row + 1) * size]
+                      for row in range(size)]
+        board.hash = board.compute_hash()
+        board.compute_scores()
+        board.compute_mobility()
+        return board
+
+    def to_game(self, bitboard=False):
+        """
+        @brief Builds a game at the position, with plain players
+        @param bitboard: True to store the board in the bitboard engine
+        @return: A new Santorini
+        """
+        # Imported here because the players, which santorini imports, use
+        # GameState to hand positions to other processes
+        from santorini import Santorini
+
+        game = Santorini(bitboard, self.size)
+        board = self.to_board(bitboard)
+        game.set_board(board)
+        for player in (game.player_white, game.player_blue):
+            for worker_id, worker in player.workers.items():
+                worker.position = board.worker_positions[worker_id]
+        if self.side:
+            game.switch_player()
+        return game
+
+    def byte_length(self):
+        """
+        @brief Obtains the number of bytes to_bytes writes for this size
+        @return: The length in bytes, the same for every position of a size
+        """
+        size = self.size
+        bits = (1 + len(WORKER_IDS) * self.cell_bits(size)
+                + HEIGHT_BITS * size * size)
+        return (bits + 7) // 8
+
+    def to_bytes(self):
+        """
+        @brief Serializes the position to a fixed number of bytes
+        @return: bytes of length byte_length()
+        """
+        return self.value.to_bytes(self.byte_length(), 'little')
+
+    @classmethod
+    def from_bytes(cls, data, size=DEFAULT_SIZE):
+        """
+        @brief Reads a position written by to_bytes
+        @param data: The bytes
+        @param size: The number of rows (and columns) of the board
+        @return: A new GameState
+        """
+        return cls(int.from_bytes(data, 'little'), size)
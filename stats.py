@@ -0,0 +1,199 @@
+"""Per-turn timers and counters for the game loop.
+
+A TurnStats holds one reusable Phase timer per phase name, so timing a
+phase costs two perf_counter_ns calls and a list append. The phases the
+game loop runs one after another make up the turn; phases a player times
+inside make_move (move generation, evaluation, book and tablebase lookups)
+are reported on their own.
+"""
+import contextlib
+import json
+import time
+
+# Phases of the game loop, whose times add up to the turn
+TURN_PHASES = ('record_move', 'render', 'check_win', 'check_loss',
+               'make_move')
+# Phases timed inside make_move
+MOVE_PHASES = ('lookup', 'generate', 'evaluate')
+
+PERCENTILES = (50, 95, 99)
+
+# Counters reported as a rate: (name, counter, counter it is divided by,
+# scale, format); search times are counted in microseconds
+RATES = (('search nodes/sec', 'search_nodes', 'search_us', 1e6, '{:.0f}'),
+         ('parallel nodes/sec', 'parallel_nodes', 'parallel_search_us', 1e6,
+          '{:.0f}'),
+         ('parallel speedup', 'parallel_cpu_us', 'parallel_search_us', 1.0,
+          '{:.2f}x'))
+
+# Shared stand-in for a Phase when stats are off
+NOT_TIMED = contextlib.nullcontext()
+
+
+def percentile(ordered, percent):
+    """
+    @brief Picks the nearest-rank percentile of sorted samples
+    @param ordered: A non-empty sorted list
+    @param percent: The percentile, from 0 to 100
+    @return: The sample at that percentile
+    """
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[rank - 1]
+
+
+def rates(counters):
+    """
+    @brief Works out the RATES of counters, e.g. the speedup of the
+           parallel searches
+    @param counters: Dictionary mapping counter names to values
+    @return: A list of "name: value" strings, one per rate whose counters
+             were counted
+    """
+    return [f"{name}: {text.format(counters[counter] * scale / counters[per])}"
+            for name, counter, per, scale, text in RATES
+            if counters.get(per)]
+
+
+class Phase:
+    """Context manager that adds the time spent inside it to a phase."""
+
+    __slots__ = ('stats', 'samples', 'in_turn', 'start')
+
+    def __init__(self, stats, samples, in_turn):
+        """
+        @brief Makes a timer for one phase
+        @param stats: The TurnStats it belongs to
+        @param samples: The list of nanosecond samples of the phase
+        @param in_turn: True if the phase counts towards the turn time
+        @return: None
+        """
+        self.stats = stats
+        self.samples = samples
+        self.in_turn = in_turn
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter_ns() - self.start
+        self.samples.append(elapsed)
+        if self.in_turn:
+            self.stats.turn_ns += elapsed
+        return False
+
+
+class TurnStats:
+    """Timings and counters of the turns of one game."""
+
+    def __init__(self):
+        """
+        @brief Makes empty stats
+        @return: None
+        """
+        # samples[phase] lists the nanoseconds of each time it ran
+        self.samples = {phase: [] for phase in
+                        TURN_PHASES + MOVE_PHASES + ('turn',)}
+        self.phases = {phase: Phase(self, self.samples[phase],
+                                    phase in TURN_PHASES)
+                       for phase in TURN_PHASES + MOVE_PHASES}
+        self.counters = {}
+        self.turn_ns = 0
+
+    def phase(self, name):
+        """
+        @brief Obtains the timer of a phase, to use in a with statement
+        @param name: A name from TURN_PHASES or MOVE_PHASES
+        @return: The Phase
+        """
+        return self.phases[name]
+
+    def count(self, name, amount=1):
+        """
+        @brief Adds to a counter
+        @param name: The counter's name, e.g. turns_generated
+        @param amount: The amount to add
+        @return: None
+        """
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def end_turn(self):
+        """
+        @brief Records the time of the turn that just ended
+        @return: None
+        """
+        self.samples['turn'].append(self.turn_ns)
+        self.turn_ns = 0
+
+    def summary(self):
+        """
+        @brief Sums up every phase that ran
+        @return: Dictionary mapping phase names to dictionaries of count,
+                 total_ms, p50_us, p95_us, p99_us and max_us
+        """
+        summary = {}
+        for phase, samples in self.samples.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            entry = {'count': len(ordered), 'total_ms': sum(ordered) / 1e6}
+            for percent in PERCENTILES:
+                entry[f'p{percent}_us'] = percentile(ordered, percent) / 1e3
+            entry['max_us'] = ordered[-1] / 1e3
+            summary[phase] = entry
+        return summary
+
+    def histogram(self, phase='turn'):
+        """
+        @brief Buckets the samples of a phase by powers of two
+        @param phase: The phase name
+        @return: A list of (lower bound in microseconds, count) of the
+                 non-empty buckets, shortest first
+        """
+        buckets = {}
+        for sample in self.samples[phase]:
+            bucket = (sample // 1000).bit_length()
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+        return [(0 if bucket == 0 else 1 << (bucket - 1), buckets[bucket])
+                for bucket in sorted(buckets)]
+
+    def report(self):
+        """
+        @brief Formats the percentiles of every phase and a histogram of the
+               turn times
+        @return: A multi-line string
+        """
+        lines = [f"{'phase':<12}{'count':>7}{'total ms':>11}{'p50 us':>10}"
+                 f"{'p95 us':>10}{'p99 us':>10}{'max us':>10}"]
+        for phase, entry in self.summary().items():
+            lines.append(f"{phase:<12}{entry['count']:>7}"
+                         f"{entry['total_ms']:>11.1f}{entry['p50_us']:>10.1f}"
+                         f"{entry['p95_us']:>10.1f}{entry['p99_us']:>10.1f}"
+                         f"{entry['max_us']:>10.1f}")
+
+        histogram = self.histogram()
+        if histogram:
+            lines.append("turn time histogram:")
+            widest = max(count for _, count in histogram)
+            for low, count in histogram:
+                bar = '#' * max(1, 40 * count // widest)
+                lines.append(f"{f'>= {low} us':>14} {bar} {count}")
+
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name}: {value}")
+        lines.extend(rates(self.counters))
+        return "\n".join(lines)
+
+    def dump(self, path, **extra):
+        """
+        @brief Appends the summary to a file as one line of JSON
+        @param path: The file to append to
+        @param extra: More fields to write, e.g. the winner
+        @return: None
+        """
+        report = dict(extra, phases=self.summary(),
+                      turn_histogram=self.histogram(),
+                      counters=self.counters)
+        with open(path, 'a') as report_file:
+            report_file.write(json.dumps(report) + "\n")
@@ -0,0 +1,341 @@
+"""Endgame tablebase: exact results of late-game positions, stored on disk.
+
+A late-game position is one with only a few cells below level 3 left, so
+most cells are already domed or at level 3. Every turn adds a level, so the
+game graph below such a position is acyclic. The generator walks it from
+seed positions and solves each position after all of its successors, from
+the positions where the game ends back up to the seeds.
+
+The table file is an open-addressing hash table keyed by the Zobrist hash
+of the position and the side to move, read through mmap so a lookup only
+touches the pages it probes.
+"""
+import argparse
+import functools
+import logging
+import mmap
+import random
+import struct
+import time
+
+from bitboard import BitBoard
+from tables import DEFAULT_SIZE, get_tables
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SANTBASE'
+# Magic, board size, log2 of the slot count, most cells below level 3 of a
+# seed, number of positions
+HEADER = struct.Struct('<8sBBBxI')
+# Position key and its result, 0 for an empty slot
+SLOT = struct.Struct('<QH')
+
+# Player IDs and worker IDs of side 0 and side 1
+SIDES = [['A', 'B'], ['Y', 'Z']]
+
+
+def open_cells(board):
+    """
+    @brief Counts the cells a worker could still climb from or build up
+    @param board: A BitBoard
+    @return: The number of cells below level 3
+    """
+    return sum(1 for level in board.heights if level < 3)
+
+
+def encode_result(win, plies):
+    """
+    @brief Packs a result into a slot value
+    @param win: True if the side to move wins
+    @param plies: Turns until the game ends with best play
+    @return: The slot value, never 0
+    """
+    return (plies << 1 | win) + 1
+
+
+def decode_result(value):
+    """
+    @brief Unpacks a slot value
+    @param value: A non-zero slot value
+    @return: (True if the side to move wins, turns until the game ends)
+    """
+    value -= 1
+    return bool(value & 1), value >> 1
+
+
+class SolveLimit(Exception):
+    """Raised inside the solver when a seed has too many positions below it."""
+    pass
+
+
+class Solver:
+    """Solves every position reachable from late-game seed positions."""
+
+    def __init__(self, size=DEFAULT_SIZE, max_positions=None):
+        """
+        @brief Sets up an empty set of results
+        @param size: The number of rows (and columns) of the board
+        @param max_positions: The most positions to solve, or None
+        @return: None
+        """
+        self.size = size
+        self.max_positions = max_positions
+        # results[key] is the encoded result of the position with that key
+        self.results = {}
+
+    def solve(self, board, side):
+        """
+        @brief Solves a position and everything below it
+        @param board: A BitBoard, put back as it was when this returns
+        @param side: The side to move, 0 for white and 1 for blue
+        @return: The encoded result for the side to move
+        """
+        key = board.hash ^ (board.keys.side if side else 0)
+        result = self.results.get(key)
+        if result is not None:
+            return result
+
+        if (self.max_positions is not None
+                and len(self.results) >= self.max_positions):
+            raise SolveLimit()
+
+        heights = board.heights
+        turns = board.legal_turns(SIDES[side])
+        if not turns:
+            # A side that cannot move loses at once
+            result = encode_result(False, 0)
+        elif any(heights[turn[1]] == 3 for turn in turns):
+            result = encode_result(True, 1)
+        else:
+            fastest_win = None
+            slowest_loss = 0
+            for turn in turns:
+                origin = board.play_turn(turn)
+                try:
+                    child_win, child_plies = decode_result(
+                        self.solve(board, 1 - side))
+                finally:
+                    board.undo_turn(turn, origin)
+
+                if not child_win:
+                    if fastest_win is None or child_plies < fastest_win:
+                        fastest_win = child_plies
+                else:
+                    slowest_loss = max(slowest_loss, child_plies)
+
+            if fastest_win is not None:
+                result = encode_result(True, fastest_win + 1)
+            else:
+                result = encode_result(False, slowest_loss + 1)
+
+        self.results[key] = result
+        return result
+
+
+def random_seeds(count, max_open, size=DEFAULT_SIZE, seed=0):
+    """
+    @brief Finds late-game positions by playing random turns that never
+           climb onto level 3, until at most max_open cells are below level 3
+    @param count: The number of seed positions to find
+    @param max_open: The most cells below level 3 a late-game board may have
+    @param size: The number of rows (and columns) of the board
+    @param seed: The seed of the random turns
+    @return: A list of (BitBoard, side to move) positions
+    """
+    rng = random.Random(seed)
+    start = get_tables(size).start_positions
+    seeds = []
+    while len(seeds) < count:
+        board = BitBoard(dict(start), size)
+        side = 0
+        # Games where a side gets trapped first are thrown away
+        while open_cells(board) > max_open:
+            turns = [turn for turn in board.legal_turns(SIDES[side])
+                     if board.heights[turn[1]] != 3]
+            if not turns:
+                break
+            board.play_turn(rng.choice(turns))
+            side = 1 - side
+        else:
+            seeds.append((board, side))
+    return seeds
+
+
+def write_table(path, results, max_open, size=DEFAULT_SIZE):
+    """
+    @brief Writes solved positions as an open-addressing hash table
+    @param path: The file to write
+    @param results: Dictionary mapping position keys to encoded results
+    @param max_open: The most cells below level 3 of the seed positions
+    @param size: The number of rows (and columns) of the board
+    @return: The number of bytes written
+    """
+    # At most half the slots are used, so probe runs stay short
+    bits = max(4, (2 * len(results)).bit_length())
+    slots = 1 << bits
+    mask = slots - 1
+    table = bytearray(HEADER.size + slots * SLOT.size)
+    HEADER.pack_into(table, 0, MAGIC, size, bits, max_open, len(results))
+
+    for key, value in results.items():
+        index = key & mask
+        while SLOT.unpack_from(table, HEADER.size + index * SLOT.size)[1]:
+            index = (index + 1) & mask
+        SLOT.pack_into(table, HEADER.size + index * SLOT.size, key, value)
+
+    with open(path, 'wb') as table_file:
+        table_file.write(table)
+    return len(table)
+
+
+class Tablebase:
+    """Read-only view of a table file through mmap."""
+
+    def __init__(self, path):
+        """
+        @brief Maps a table file written by write_table
+        @param path: The file to read
+        @return: None
+        """
+        self.path = path
+        with open(path, 'rb') as table_file:
+            self.map = mmap.mmap(table_file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        (magic, self.size, bits, self.max_open,
+         self.count) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a tablebase file")
+        self.mask = (1 << bits) - 1
+
+    def __reduce__(self):
+        # Other processes map the same file instead of copying the table
+        return (Tablebase, (self.path,))
+
+    def close(self):
+        """
+        @brief Unmaps the file
+        @return: None
+        """
+        self.map.close()
+
+    def covers(self, board):
+        """
+        @brief Cheaply rules out positions too early in the game to be in
+               the table
+        @param board: A Board or BitBoard
+        @return: True if the position may be in the table
+        """
+        return board.size == self.size and sum(
+            1 for level in board.get_heights() if level < 3) <= self.max_open
+
+    def probe(self, key):
+        """
+        @brief Looks up a position
+        @param key: The Zobrist hash of the position, side to move included
+        @return: (True if the side to move wins, turns until the game ends),
+                 or None if the position is not in the table
+        """
+        index = key & self.mask
+        while True:
+            slot_key, value = SLOT.unpack_from(
+                self.map, HEADER.size + index * SLOT.size)
+            if not value:
+                return None
+            if slot_key == key:
+                return decode_result(value)
+            index = (index + 1) & self.mask
+
+    def best_turn(self, board, sides, side):
+        """
+        @brief Picks the turn that wins fastest, or loses slowest, in a
+               position covered by the table
+        @param board: A BitBoard, put back as it was when this returns
+        @param sides: [white worker IDs, blue worker IDs]
+        @param side: The side to move, 0 for white and 1 for blue
+        @return: A (worker_id, move_cell, build_cell) turn, or None if the
+                 position is not in the table or has no legal turn
+        """
+        side_key = board.keys.side
+        if not self.covers(board) or self.probe(
+                board.hash ^ (side_key if side else 0)) is None:
+            return None
+
+        best_turn, best_rank = None, None
+        for turn in board.legal_turns(sides[side]):
+            if board.heights[turn[1]] == 3:
+                return turn
+
+            origin = board.play_turn(turn)
+            child = self.probe(board.hash ^ (0 if side else side_key))
+            board.undo_turn(turn, origin)
+            if child is None:
+                continue
+
+            # Rank a win for us by its speed, above every loss by its length
+            child_win, child_plies = child
+            rank = -child_plies if not child_win else child_plies - 1000
+            if best_rank is None or rank > best_rank:
+                best_turn, best_rank = turn, rank
+        return best_turn
+
+
+@functools.lru_cache(maxsize=None)
+def open_tablebase(path):
+    """
+    @brief Maps a table file once per process
+    @param path: The file to read
+    @return: The shared Tablebase for that file
+    """
+    return Tablebase(path)
+
+
+def generate(path, seeds=200, max_open=10, max_positions=100000,
+             size=DEFAULT_SIZE, seed=0):
+    """
+    @brief Solves the positions below random late-game seeds and writes them
+    @param path: The table file to write
+    @param seeds: The number of seed positions
+    @param max_open: The most cells below level 3 a seed board may have
+    @param max_positions: The most positions to solve below one seed; a
+                          seed over the limit is dropped, but the positions
+                          solved before it ran out are kept
+    @param size: The number of rows (and columns) of the board
+    @param seed: The seed of the random seed positions
+    @return: The number of positions written
+    """
+    start = time.perf_counter()
+    solver = Solver(size)
+    dropped = 0
+    for board, side in random_seeds(seeds, max_open, size, seed):
+        solver.max_positions = len(solver.results) + max_positions
+        try:
+            solver.solve(board, side)
+        except SolveLimit:
+            dropped += 1
+
+    written = write_table(path, solver.results, max_open, size)
+    logger.info("%d positions from %d seeds (%d dropped), %d bytes in %.1fs",
+                len(solver.results), seeds, dropped, written,
+                time.perf_counter() - start)
+    return len(solver.results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build an endgame tablebase')
+    parser.add_argument('path', help='table file to write')
+    parser.add_argument('-n', '--seeds', type=int, default=200,
+                        help='number of late-game seed positions')
+    parser.add_argument('--open', type=int, default=10, dest='max_open',
+                        help='most cells below level 3 a seed may have')
+    parser.add_argument('--positions', type=int, default=100000,
+                        dest='max_positions',
+                        help='most positions to solve below one seed')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random seed positions')
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE,
+                        help='number of rows and columns of the board')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    generate(args.path, args.seeds, args.max_open, args.max_positions,
+             args.size, args.seed)
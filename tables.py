@@ -0,0 +1,114 @@
+"""Lookup tables for a given board size.
+
+Every board of the same size shares one BoardTables instance, so the
+neighbour, distance and centre tables are built once per size and every
+move afterwards is a table lookup.
+"""
+import functools
+import math
+
+DIRECTIONS = ['n', 'ne', 'e', 'se', 's', 'sw', 'w', 'nw']
+
+DIRECTION_OFFSETS = {'n': (-1, 0), 'ne': (-1, 1), 'e': (0, 1), 'se': (1, 1),
+                     's': (1, 0), 'sw': (1, -1), 'w': (0, -1), 'nw': (-1, -1)}
+
+DIRECTION_INDEX = {direction: i for i, direction in enumerate(DIRECTIONS)}
+
+DEFAULT_SIZE = 5
+
+# The player each worker belongs to
+WORKER_OWNERS = {'A': 'white', 'B': 'white', 'Y': 'blue', 'Z': 'blue'}
+
+
+class BoardTables:
+    """
+    Read-only tables for a size x size board. Cells are numbered
+    row * size + col.
+    """
+
+    def __init__(self, size):
+        """
+        @brief Builds every table for the given board size
+        @param size: The number of rows (and columns) of the board
+        @return: None
+        """
+        self.size = size
+        self.cells = size * size
+        self.full = (1 << self.cells) - 1
+        self.positions = [divmod(cell, size) for cell in range(self.cells)]
+
+        # steps[cell][i] is the cell reached from cell in DIRECTIONS[i], or -1
+        self.steps = []
+        # neighbours[cell] is the mask of the cells adjacent to cell
+        self.neighbours = []
+        # around[cell] is neighbours[cell] with cell itself added
+        self.around = []
+        # neighbour[(position, direction)] is the adjacent position, if any
+        self.neighbour = {}
+
+        for cell, (row, col) in enumerate(self.positions):
+            steps = []
+            mask = 0
+            for direction in DIRECTIONS:
+                d_row, d_col = DIRECTION_OFFSETS[direction]
+                if 0 <= row + d_row < size and 0 <= col + d_col < size:
+                    target = (row + d_row) * size + col + d_col
+                    steps.append(target)
+                    mask |= 1 << target
+                    self.neighbour[((row, col), direction)] = (row + d_row,
+                                                               col + d_col)
+                else:
+                    steps.append(-1)
+            self.steps.append(tuple(steps))
+            self.neighbours.append(mask)
+            self.around.append(mask | 1 << cell)
+
+        # The truncated Euclidean distance used by the distance score
+        self.distance = [[int(math.sqrt((r1 - r2)**2 + (c1 - c2)**2))
+                          for (r2, c2) in self.positions]
+                         for (r1, c1) in self.positions]
+
+        # The centre score grows by one per ring away from the edge
+        self.centre = [min(row, col, size - 1 - row, size - 1 - col)
+                       for (row, col) in self.positions]
+
+        # The distance score is this minus the summed opponent distances
+        self.distance_base = 2 * (size - 1)
+
+        self.start_positions = {'A': (size - 2, 1), 'B': (1, size - 2),
+                                'Y': (1, 1), 'Z': (size - 2, size - 2)}
+
+    def cell_of(self, position):
+        """
+        @brief Converts a (row, col) position to a cell index
+        @param position: The position (row, col)
+        @return: The cell index
+        """
+        return position[0] * self.size + position[1]
+
+    def direction_between(self, cell, target):
+        """
+        @brief Finds the direction that steps from one cell to an adjacent one
+        @param cell: The starting cell index
+        @param target: An adjacent cell index
+        @return: The direction (n, ne, e, se, s, sw, w, nw)
+        """
+        return DIRECTIONS[self.steps[cell].index(target)]
+
+    def __deepcopy__(self, memo):
+        # Tables are never mutated, so copied boards keep sharing them
+        return self
+
+    def __reduce__(self):
+        # Unpickling in another process reuses that process's tables
+        return (get_tables, (self.size,))
+
+
+@functools.lru_cache(maxsize=None)
+def get_tables(size=DEFAULT_SIZE):
+    """
+    @brief Obtains the shared tables for a board size, building them once
+    @param size: The number of rows (and columns) of the board
+    @return: The BoardTables for that size
+    """
+    return BoardTables(size)
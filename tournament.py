@@ -0,0 +1,354 @@
+"""Headless batch runner for bot-vs-bot Santorini games.
+
+Plays N games between two AI player types across a process pool, without
+prompts or board output, and reports win rates, game lengths and games/sec.
+Every game gets its own random.Random seeded from the run's seed and the
+game's index, so any single game can be replayed exactly.
+
+With a per-move time limit every player gets that budget for each turn,
+and every player stops at it; a make_move that still runs past it by more
+than player.DEADLINE_GRACE counts as a miss in the report.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import time
+
+from player import HumanPlayer, PLAYER_TYPES, create_player
+from book import open_book
+from record import RecordWriter, encode_move
+from render import NULL_RENDERER
+from santorini import Santorini
+from shared_cache import SharedTable, open_cache
+from stats import TurnStats, rates
+from tablebase import open_tablebase
+from tables import DEFAULT_SIZE
+
+def game_seed(seed, index):
+    """
+    @brief Derives the seed of one game of a run
+    @param seed: The seed of the whole run
+    @param index: The index of the game in the run
+    @return: An int seed for that game's random.Random
+    """
+    return random.Random(seed * 1000003 + index).getrandbits(64)
+
+
+def play_game(white, blue, seed, size=DEFAULT_SIZE, bitboard=True,
+              tablebase=None, book=None, cache=None, moves=None,
+              time_limit=None, move_times=None, root_processes=None,
+              counters=None):
+    """
+    @brief Plays one game between two AI player types without any output
+    @param white: The player type of white, e.g. random or heuristic
+    @param blue: The player type of blue
+    @param seed: The seed of the game's random.Random
+    @param size: The number of rows (and columns) of the board
+    @param bitboard: True to play on the bitboard engine
+    @param tablebase: Path of an endgame tablebase for both players, or None
+    @param book: Path of an opening book for both players, or None
+    @param cache: Name of a SharedTable for both players' searches, or None
+    @param moves: A bytearray the record byte of each turn is appended to,
+                  or None
+    @param time_limit: Seconds each turn may take, or None for the player
+                       types' own limits
+    @param move_times: A list the (side, seconds, missed) of each turn is
+                       appended to, side being 0 for white and 1 for blue
+                       and missed True for a turn that ran past the time
+                       limit, or None
+    @param root_processes: Processes search players split their root moves
+                           across, or None to search in one process
+    @param counters: A list the counters of white's and then blue's
+                     TurnStats are appended to, or None
+    @return: (winning player_id, number of turns played)
+    """
+    game = Santorini(bitboard, size)
+    rng = random.Random(seed)
+    table = open_tablebase(tablebase) if tablebase else None
+    book = open_book(book) if book else None
+    cache = open_cache(cache) if cache else None
+    game.player_white = create_player(white, 'white', game.board, rng, table,
+                                      book, cache, root_processes,
+                                      time_limit)
+    game.player_blue = create_player(blue, 'blue', game.board, rng, table,
+                                     book, cache, root_processes, time_limit)
+    game.curr_player = game.player_white
+    game.player_white.renderer = NULL_RENDERER
+    game.player_blue.renderer = NULL_RENDERER
+    if counters is not None:
+        game.player_white.stats = TurnStats()
+        game.player_blue.stats = TurnStats()
+
+    turns = 0
+    # Same order of checks as SantoriniCLI.run
+    while True:
+        winner = game.check_win()
+        if winner:
+            break
+        if game.check_loss():
+            game.switch_player()
+            winner = game.curr_player.player_id
+            break
+
+        side = 0 if game.curr_player == game.player_white else 1
+        if side == 0:
+            opponent_workers = game.player_blue.workers.values()
+        else:
+            opponent_workers = game.player_white.workers.values()
+        turn, seconds, missed = game.curr_player.timed_move('off',
+                                                            opponent_workers)
+        if move_times is not None:
+            move_times.append((side, seconds, missed))
+        if moves is not None:
+            moves.append(encode_move(*turn))
+
+        turns += 1
+        game.switch_player()
+
+    if counters is not None:
+        counters.extend([game.player_white.stats.counters,
+                         game.player_blue.stats.counters])
+    return winner, turns
+
+
+def _play_indexed(job):
+    """
+    @brief Pool entry point that unpacks one game's arguments
+    @param job: (white, blue, seed, size, bitboard, tablebase, book, cache,
+                 root processes or None, seconds per turn or None, True to
+                 record the turns, True to count the players' stats)
+    @return: (winning player_id, number of turns played, (probes, hits) of
+             the shared cache during the game, (seed, record bytes of the
+             turns) or None, the (side, seconds, missed) of each turn,
+             [white's, blue's] stats counters or None)
+    """
+    cache, root_processes, time_limit, record, stats = job[-5:]
+    moves = bytearray() if record else None
+    # Every turn is timed, since players have limits of their own too
+    move_times = []
+    counters = [] if stats else None
+    before = open_cache(cache).stats() if cache else (0, 0, 0)
+    winner, turns = play_game(*job[:-4], moves=moves, time_limit=time_limit,
+                              move_times=move_times,
+                              root_processes=root_processes,
+                              counters=counters)
+    after = open_cache(cache).stats() if cache else (0, 0, 0)
+    return (winner, turns, (after[0] - before[0], after[1] - before[1]),
+            None if moves is None else (job[2], bytes(moves)), move_times,
+            counters)
+
+
+class TournamentResult:
+    """Totals of a batch of games."""
+
+    def __init__(self, white, blue, time_limit=None):
+        """
+        @brief Makes an empty result
+        @param white: The player type of white
+        @param blue: The player type of blue
+        @param time_limit: Seconds each turn may take, or None
+        @return: None
+        """
+        self.white = white
+        self.blue = blue
+        self.time_limit = time_limit
+        self.wins = {'white': 0, 'blue': 0}
+        self.lengths = []
+        self.elapsed = 0.0
+        self.cache_probes = 0
+        self.cache_hits = 0
+        # Per side: turns timed, turns over the limit, slowest turn
+        self.timed_turns = [0, 0]
+        self.misses = [0, 0]
+        self.slowest = [0.0, 0.0]
+        # Per side: the stats counters of its players added up
+        self.counters = [{}, {}]
+
+    def add(self, winner, turns, cache_stats=(0, 0), move_times=None,
+            counters=None):
+        """
+        @brief Counts one finished game
+        @param winner: The winning player_id
+        @param turns: The number of turns the game took
+        @param cache_stats: (probes, hits) of the shared cache in the game
+        @param move_times: The (side, seconds, missed) of each turn, or None
+        @param counters: [white's, blue's] stats counters, or None
+        @return: None
+        """
+        self.wins[winner] += 1
+        self.lengths.append(turns)
+        self.cache_probes += cache_stats[0]
+        self.cache_hits += cache_stats[1]
+        for side, seconds, missed in move_times or ():
+            self.timed_turns[side] += 1
+            self.misses[side] += missed
+            self.slowest[side] = max(self.slowest[side], seconds)
+        for side, side_counters in enumerate(counters or ()):
+            totals = self.counters[side]
+            for name, value in side_counters.items():
+                totals[name] = totals.get(name, 0) + value
+
+    def report(self):
+        """
+        @brief Formats win rates, game lengths and throughput
+        @return: A multi-line summary string
+        """
+        games = len(self.lengths)
+        if not games:
+            return "No games played"
+
+        lengths = sorted(self.lengths)
+        rate = games / self.elapsed if self.elapsed else 0.0
+        extra = []
+        if self.cache_probes:
+            extra.append(f"shared cache: {self.cache_probes} probes, "
+                         f"{100 * self.cache_hits / self.cache_probes:.1f}% "
+                         f"hits")
+        for side, (player_id, player_type) in enumerate(
+                (('white', self.white), ('blue', self.blue))):
+            # Without --move-time only a player type's own limit can be
+            # missed, so sides that never missed it are left out
+            if self.time_limit is None and not self.misses[side]:
+                continue
+            limit = ("its time limit" if self.time_limit is None
+                     else f"the {self.time_limit:.3f}s limit")
+            extra.append(
+                f"{player_id} ({player_type}) missed {limit} on "
+                f"{self.misses[side]} of {self.timed_turns[side]} turns, "
+                f"slowest {self.slowest[side] * 1000:.1f} ms")
+        for side, (player_id, player_type) in enumerate(
+                (('white', self.white), ('blue', self.blue))):
+            counters = self.counters[side]
+            if counters:
+                values = [f"{name}: {value}"
+                          for name, value in sorted(counters.items())]
+                extra.append(f"{player_id} ({player_type}) stats: "
+                             + ", ".join(values + rates(counters)))
+        return "\n".join([
+            f"{games} games, white {self.white} vs blue {self.blue}",
+            f"white ({self.white}) won {self.wins['white']} "
+            f"({100 * self.wins['white'] / games:.1f}%)",
+            f"blue ({self.blue}) won {self.wins['blue']} "
+            f"({100 * self.wins['blue'] / games:.1f}%)",
+            f"turns per game: mean {sum(lengths) / games:.1f}, "
+            f"median {lengths[games // 2]}, min {lengths[0]}, "
+            f"max {lengths[-1]}",
+            f"{self.elapsed:.2f}s, {rate:.1f} games/sec",
+        ] + extra)
+
+
+def run_tournament(white, blue, games, processes=None, seed=0,
+                   size=DEFAULT_SIZE, bitboard=True, tablebase=None,
+                   book=None, cache_bits=None, record=None, time_limit=None,
+                   root_processes=None, stats=False):
+    """
+    @brief Plays a batch of games across a process pool
+    @param white: The player type of white
+    @param blue: The player type of blue
+    @param games: The number of games to play
+    @param processes: Pool size, or None for one process per CPU
+    @param seed: The seed of the whole run
+    @param size: The number of rows (and columns) of the board
+    @param bitboard: True to play on the bitboard engine
+    @param tablebase: Path of an endgame tablebase for both players, or None
+    @param book: Path of an opening book for both players, or None
+    @param cache_bits: log2 of the slots of a search cache shared by every
+                       game process, or None for a table per player
+    @param record: Path of a game record file the games are appended to, or
+                   None
+    @param time_limit: Seconds each turn may take, or None for the player
+                       types' own limits
+    @param root_processes: Processes search players split their root moves
+                           across, or None to search in one process
+    @param stats: True to add up the players' stats counters, e.g. search
+                  nodes and parallel speedup, in the report
+    @return: A TournamentResult
+    """
+    for player_type in (white, blue):
+        if PLAYER_TYPES.get(player_type) in (None, HumanPlayer):
+            raise ValueError(f"{player_type} is not an AI player type")
+    if root_processes is not None and processes != 1:
+        # Pool workers are daemons, which cannot start a pool of their own
+        raise ValueError("root processes need the games in one process")
+
+    cache = SharedTable(cache_bits) if cache_bits else None
+    jobs = [(white, blue, game_seed(seed, index), size, bitboard, tablebase,
+             book, cache and cache.name, root_processes, time_limit,
+             record is not None, stats)
+            for index in range(games)]
+    result = TournamentResult(white, blue, time_limit)
+    writer = RecordWriter(record) if record else None
+
+    def add(winner, turns, cache_stats, moves, move_times, counters):
+        result.add(winner, turns, cache_stats, move_times, counters)
+        if writer:
+            played_seed, played_turns = moves
+            writer.write_game(white, blue, played_seed, size, played_turns,
+                              winner)
+
+    start = time.perf_counter()
+    try:
+        if processes == 1:
+            for outcome in map(_play_indexed, jobs):
+                add(*outcome)
+        else:
+            with multiprocessing.Pool(processes) as pool:
+                chunksize = max(1, games // (4 * (processes
+                                                  or os.cpu_count())))
+                for outcome in pool.imap_unordered(_play_indexed, jobs,
+                                                   chunksize):
+                    add(*outcome)
+    finally:
+        if cache:
+            cache.close()
+        if writer:
+            writer.close()
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+if __name__ == "__main__":
+    ai_types = sorted(player_type for player_type, player_class
+                      in PLAYER_TYPES.items() if player_class is not HumanPlayer)
+
+    parser = argparse.ArgumentParser(description='Santorini bot tournament')
+    parser.add_argument('white', choices=ai_types)
+    parser.add_argument('blue', choices=ai_types)
+    parser.add_argument('-n', '--games', type=int, default=100,
+                        help='number of games to play')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed the per-game seeds are derived from')
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE,
+                        help='number of rows and columns of the board')
+    parser.add_argument('--tablebase', metavar='PATH',
+                        help='endgame tablebase file for both players')
+    parser.add_argument('--book', metavar='PATH',
+                        help='opening book file for both players')
+    parser.add_argument('--cache-bits', type=int, default=None,
+                        help='share one search cache of 2**N slots '
+                             'between all game processes')
+    parser.add_argument('--record', metavar='PATH',
+                        help='append the games to a binary game record file')
+    parser.add_argument('--move-time', type=float, metavar='SECONDS',
+                        default=None,
+                        help='time limit of every turn; turns over it are '
+                             'reported as misses')
+    parser.add_argument('--parallel', type=int, metavar='N', default=None,
+                        help='split the search players\' root moves across '
+                             'N processes; needs -j 1')
+    parser.add_argument('--stats', action='store_true',
+                        help='report the players\' counters, e.g. search '
+                             'nodes/sec and parallel speedup')
+
+    args = parser.parse_args()
+    print(run_tournament(args.white, args.blue, args.games, args.processes,
+                         args.seed, args.size,
+                         tablebase=args.tablebase, book=args.book,
+                         cache_bits=args.cache_bits,
+                         record=args.record,
+                         time_limit=args.move_time,
+                         root_processes=args.parallel,
+                         stats=args.stats).report())
@@ -0,0 +1,54 @@
+"""Zobrist keys for hashing Santorini positions.
+
+A position hash is the XOR of one random 64-bit key per (cell, level) pair,
+one per (worker, cell) pair and one for blue to move. Moving a worker or
+building a level changes the hash by XORing two keys in and out, so it can be
+kept up to date in O(1) instead of rehashing the grid.
+"""
+import functools
+import random
+
+# Keys come from a fixed seed so hashes are stable across runs and processes,
+# which lets them be stored in files and shared between workers
+ZOBRIST_SEED = 0x53414E54
+
+WORKER_IDS = ['A', 'B', 'Y', 'Z']
+
+
+class ZobristKeys:
+    """Read-only random keys for a size x size board."""
+
+    def __init__(self, size):
+        """
+        @brief Draws every key for the given board size
+        @param size: The number of rows (and columns) of the board
+        @return: None
+        """
+        self.size = size
+        rng = random.Random(ZOBRIST_SEED * 31 + size)
+        cells = size * size
+
+        # Level 0 hashes to 0, so an empty board only hashes its workers
+        self.level = [[0] + [rng.getrandbits(64) for _ in range(4)]
+                      for _ in range(cells)]
+        self.worker = {worker_id: [rng.getrandbits(64) for _ in range(cells)]
+                       for worker_id in WORKER_IDS}
+        self.side = rng.getrandbits(64)
+
+    def __deepcopy__(self, memo):
+        # Keys are never mutated, so copied boards keep sharing them
+        return self
+
+    def __reduce__(self):
+        # Unpickling in another process draws the same keys from the seed
+        return (get_keys, (self.size,))
+
+
+@functools.lru_cache(maxsize=None)
+def get_keys(size):
+    """
+    @brief Obtains the shared Zobrist keys for a board size
+    @param size: The number of rows (and columns) of the board
+    @return: The ZobristKeys for that size
+    """
+    return ZobristKeys(size)